@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Generate synthetic PIRATA, PNBOIA
+#            and EN4 files with the layout of
+#            the real ones, to benchmark the
+#            download scripts offline
+
+import os
+import gzip
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# PIRATA variables as file prefix keys and
+# (header kind, levels in meters, column name,
+# units line) as values
+PIRATA_VARIABLES = {
+    'sst': (
+        'Depth',
+        (1,),
+        'SST',
+        'Sea Surface Temperature (C), -99.9 = missing'
+    ),
+    't': (
+        'Depth',
+        (1, 20, 40, 60, 80, 100, 120, 140, 180, 300, 500),
+        'TEMP',
+        'Ocean Temperature (C), -9.999 = missing'
+    ),
+    'airt': (
+        'Height',
+        (3,),
+        'AIRT',
+        'Air Temperature (C), -99.9 = missing'
+    ),
+    'rh': (
+        'Height',
+        (3,),
+        'RH',
+        'Relative Humidity (%), -99.9 = missing'
+    ),
+}
+
+# Data path suffixes tested by the PNBOIA script
+PNBOIA_SUFFIXES = ['', '1', '_0', '_1']
+
+# Columns of PNBOIA files besides the datetime
+PNBOIA_COLUMNS = [
+    'Lat', 'Lon', 'Battery', 'Wspd', 'Wdir', 'Gust', 'Atmp',
+    'Pres', 'Dewp', 'Humi', 'Wtmp', 'Cvel1', 'Cdir1', 'Wvht',
+    'Dpd', 'Mwd', 'Spred', 'Arad',
+]
+
+def make_pirata_file(
+    filepath,
+    variable='t',
+    blocks=3,
+    rows=1000,
+    start='2000-01-01',
+    instrument=True,
+    seed=0):
+    '''
+    Write a gzip PIRATA hourly file.
+
+    Blocks alternate between all levels of the variable and a part of them, as real files do when sensors are lost, and are separated by a gap. About 5% of the values are missing.
+
+    Parameters
+    ----------
+    filepath: string
+        Path of the .gz file
+    variable: string
+        One of the PIRATA_VARIABLES keys
+    blocks: integer
+        Number of data blocks
+    rows: integer
+        Hourly rows of each block
+    start: string
+        First time step
+    instrument: bool
+        If True an instrument (ID) column is written
+    seed: integer
+        Seed of the random values
+
+    Returns
+    -------
+    filepath: string
+    '''
+    rng = np.random.default_rng(seed)
+    kind, levels, name, units = PIRATA_VARIABLES[variable]
+    nan = units.split(', ')[1].split(' = ')[0]
+    total = blocks * rows
+
+    lines = [
+        ' Location:  0N 23W  {0} to {1} (index 1 to {2}, {2} times)'.format(
+            pd.Timestamp(start).strftime('%d %b %Y'),
+            (pd.Timestamp(start) + pd.Timedelta(hours=total)).strftime('%d %b %Y'),
+            total
+        ),
+        ' Units: ' + units,
+    ]
+    time = pd.Timestamp(start)
+    index = 1
+
+    for block in range(blocks):
+        times = pd.date_range(
+            time,
+            periods=rows,
+            freq='H'
+        )
+        block_levels = levels
+
+        if block % 2 and len(levels) > 1:
+            block_levels = levels[::2]
+
+        n = len(block_levels)
+        lines += [
+            ' Time: {0} to {1} (index {2} to {3}, {4} times)'.format(
+                times[0].strftime('%H%M %d %b %Y'),
+                times[-1].strftime('%H%M %d %b %Y'),
+                index,
+                index + rows - 1,
+                rows
+            ),
+            ' Index: 1 to {0}'.format(n),
+            ' {0} (M): {1}'.format(
+                kind,
+                ''.join('{0:7d}'.format(level) for level in block_levels)
+            ),
+            ' YYYYMMDD HHMM  ' + ' '.join(
+                [name] * n +
+                ['Q' * n, 'S' * n] +
+                (['ID' * n] if instrument else [])
+            ),
+        ]
+
+        values = np.round(
+            rng.uniform(0, 30, (rows, n)),
+            3
+        )
+        missing = rng.random((rows, n)) < 0.05
+        values[missing] = np.nan
+
+        # One code digit per level
+        quality = rng.choice(list('12345'), (rows, n))
+        quality[missing] = '0'
+
+        data = pd.DataFrame(dict(
+            # Rows start with a blank
+            blank='',
+            date=times.strftime('%Y%m%d'),
+            time=times.strftime('%H%M'),
+        ))
+        for j in range(n):
+            data[j] = values[:, j]
+
+        data['Q'] = quality.view('<U{0}'.format(n)).ravel()
+        data['S'] = '1' * n
+
+        if instrument:
+            data['ID'] = ''.join(
+                '{0:04d}'.format(1000 + k) for k in range(n)
+            )
+
+        lines.append(data.to_csv(
+            sep=' ',
+            header=False,
+            index=False,
+            na_rep=nan,
+            lineterminator='\n'
+        ).rstrip('\n'))
+
+        time = times[-1] + pd.Timedelta(days=3)
+        index += rows
+
+    with gzip.open(filepath, 'wt', compresslevel=6) as fh:
+        fh.write('\n'.join(lines) + '\n')
+
+    return filepath
+
+def make_pirata_buoys(
+    directory,
+    buoys,
+    variables=('sst', 't', 'airt', 'rh'),
+    blocks=3,
+    rows=1000):
+    '''
+    Write the PIRATA files of many buoys, named as in the PMEL server (e.g. t0n23w_hr.ascii.gz).
+
+    Returns
+    -------
+    filepaths: list
+        Paths of the written files
+    '''
+    os.makedirs(directory, exist_ok=True)
+    filepaths = list()
+
+    for i, buoy in enumerate(buoys):
+        for j, variable in enumerate(variables):
+            filepaths.append(make_pirata_file(
+                os.path.join(
+                    directory,
+                    '{0}{1}_hr.ascii.gz'.format(variable, buoy)
+                ),
+                variable,
+                blocks,
+                rows,
+                seed=i * len(variables) + j
+            ))
+
+    return filepaths
+
+def make_pnboia_file(filepath, rows=1000, start='2015-01-01', seed=0):
+    '''
+    Write a PNBOIA csv file, with a Datetime column and -9999 as missing value.
+
+    Returns
+    -------
+    filepath: string
+    '''
+    rng = np.random.default_rng(seed)
+    values = np.round(
+        rng.uniform(0, 100, (rows, len(PNBOIA_COLUMNS))),
+        2
+    )
+    values[rng.random(values.shape) < 0.05] = -9999
+
+    df = pd.DataFrame(
+        values,
+        columns=PNBOIA_COLUMNS,
+        index=pd.date_range(
+            start,
+            periods=rows,
+            freq='H',
+            name='Datetime'
+    ))
+    df.to_csv(filepath)
+
+    return filepath
+
+def make_pnboia_buoys(directory, buoys, rows=1000):
+    '''
+    Write the files of many PNBOIA buoys (see pnboia_stations).
+
+    Returns
+    -------
+    filepaths: list
+        Paths of the written files
+    '''
+    os.makedirs(directory, exist_ok=True)
+    filepaths = list()
+
+    for i in range(buoys):
+        suffix = PNBOIA_SUFFIXES[i % len(PNBOIA_SUFFIXES)]
+
+        filepaths.append(make_pnboia_file(
+            os.path.join(
+                directory,
+                'buoy{0}{1}.csv'.format(i, suffix)
+            ),
+            rows,
+            seed=i
+        ))
+
+    return filepaths
+
+def pnboia_stations(base_url, buoys):
+    '''
+    Catalogue rows of the buoys written by make_pnboia_buoys.
+
+    Each buoy uses one of PNBOIA_SUFFIXES, so the script has to probe the other ones first, and half of the buoys have just an operational data path.
+
+    Parameters
+    ----------
+    base_url: string
+        Address of the buoys folder in the HTTP server
+    buoys: integer
+        Number of buoys
+
+    Returns
+    -------
+    database: pandas.DataFrame
+        Rows with the ocean fixed stations columns
+    '''
+    stations = list()
+
+    for i in range(buoys):
+        path = '[{0}/buoy{1}.csv]'.format(base_url, i)
+
+        stations.append(dict(
+            short_name='buoy{0}'.format(i),
+            responsible='PNBOIA',
+            lon=-45. + i % 10,
+            lat=-25. + i // 10,
+            historical_data_path=path if i % 2 == 0 else '[]',
+            operational_data_path=path if i % 2 else '[]',
+        ))
+
+    return pd.DataFrame(stations)
+
+def _chars(values, width):
+    # Fixed width strings as netCDF char arrays
+    return np.array(
+        [list(value.ljust(width)[:width]) for value in values],
+        dtype='S1'
+    )
+
+def make_en4_month(filepath, ym, profiles=2000, levels=100, seed=0):
+    '''
+    Write an EN4 monthly profiles file, with the dimensions and the variables used by the argo script.
+
+    About 60% of the profiles are ARGO. Positions are spread over the globe and times over the month.
+
+    Returns
+    -------
+    filepath: string
+    '''
+    import netCDF4
+
+    rng = np.random.default_rng(seed)
+
+    with netCDF4.Dataset(filepath, 'w') as nc:
+        for dim, size in (
+            ('N_PROF', profiles),
+            ('N_LEVELS', levels),
+            ('STRING4', 4),
+            ('STRING8', 8),
+            ('STRING64', 64),
+            ('N_HISTORY', None)):
+
+            nc.createDimension(dim, size)
+
+        project = nc.createVariable(
+            'PROJECT_NAME',
+            'S1',
+            ('N_PROF', 'STRING64')
+        )
+        project[:] = _chars(
+            rng.choice(['ARGO', 'ARGO', 'ARGO', 'WOD', 'GTSPP'], profiles),
+            64
+        )
+        platform = nc.createVariable(
+            'PLATFORM_NUMBER',
+            'S1',
+            ('N_PROF', 'STRING8')
+        )
+        platform[:] = _chars(
+            ['{0:07d}'.format(n) for n in rng.integers(0, 10**7, profiles)],
+            8
+        )
+
+        first = pd.Timestamp(ym + '01')
+        juld = nc.createVariable('JULD', 'f8', ('N_PROF',))
+        juld.units = 'days since 1950-01-01 00:00:00 utc'
+        juld[:] = np.sort(
+            (first - pd.Timestamp('1950-01-01')).days +
+            rng.random(profiles) * first.days_in_month
+        )
+        nc.createVariable('LATITUDE', 'f4', ('N_PROF',))[:] = rng.uniform(-80, 80, profiles)
+        nc.createVariable('LONGITUDE', 'f4', ('N_PROF',))[:] = rng.uniform(-180, 180, profiles)
+
+        for name in (
+            'DEPH_CORRECTED',
+            'POTM_CORRECTED',
+            'PSAL_CORRECTED',
+            'TEMP'):
+
+            variable = nc.createVariable(
+                name,
+                'f4',
+                ('N_PROF', 'N_LEVELS'),
+                fill_value=99999.
+            )
+            variable[:] = rng.uniform(0, 30, (profiles, levels))
+
+        qc = nc.createVariable(
+            'POTM_CORRECTED_QC',
+            'S1',
+            ('N_PROF', 'N_LEVELS')
+        )
+        qc[:] = np.full((profiles, levels), b'1')
+
+        nc.createVariable(
+            'HISTORY_INSTITUTION',
+            'S1',
+            ('N_HISTORY', 'N_PROF', 'STRING4')
+        )
+
+    return filepath
+
+def make_en4_year(
+    directory,
+    year,
+    months,
+    zip_filename,
+    month_filename,
+    profiles=2000,
+    levels=100):
+    '''
+    Write an EN4 yearly zip file with the given months.
+
+    Parameters
+    ----------
+    directory: string
+        Folder of the zip file. The monthly files are also kept there, to benchmark the extraction without the zip.
+    year: integer
+    months: list
+        Months (1 to 12) inside the zip file
+    zip_filename, month_filename: function
+        Names of the zip and monthly files (en4_zip_filename and en4_month_filename of the argo script)
+    profiles, levels: integer
+        Size of each monthly file
+
+    Returns
+    -------
+    zip_filepath: string
+    month_filepaths: list
+    '''
+    os.makedirs(directory, exist_ok=True)
+    zip_filepath = os.path.join(
+        directory,
+        zip_filename(year)
+    )
+    month_filepaths = list()
+
+    with zipfile.ZipFile(zip_filepath, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for month in months:
+            ym = '{0}{1:02d}'.format(year, month)
+            filepath = make_en4_month(
+                os.path.join(directory, month_filename(ym)),
+                ym,
+                profiles,
+                levels,
+                seed=year * 100 + month
+            )
+            archive.write(
+                filepath,
+                month_filename(ym)
+            )
+            month_filepaths.append(filepath)
+
+    return zip_filepath, month_filepaths
@@ -0,0 +1,678 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Time the download scripts offline,
+#            on synthetic files served locally,
+#            and compare the times with a saved
+#            baseline to catch regressions
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import platform
+import statistics
+
+import numpy as np
+import pandas as pd
+
+from contextlib import ExitStack
+
+import fixtures
+import servers
+
+# Make the download scripts importable
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)
+    )),
+    'download_data'
+))
+
+from pipeline import load_source
+from ponto_utils.frames import join_frames
+
+# Size of the synthetic inputs of each
+# benchmark size
+SIZES = {
+    'small': dict(
+        pirata_buoys=2,
+        pirata_blocks=3,
+        pirata_rows=2000,
+        pnboia_buoys=4,
+        pnboia_rows=5000,
+        en4_months=2,
+        en4_profiles=2000,
+        en4_levels=100,
+    ),
+    'medium': dict(
+        pirata_buoys=4,
+        pirata_blocks=4,
+        pirata_rows=10000,
+        pnboia_buoys=8,
+        pnboia_rows=50000,
+        en4_months=3,
+        en4_profiles=8000,
+        en4_levels=200,
+    ),
+    'large': dict(
+        pirata_buoys=8,
+        pirata_blocks=6,
+        pirata_rows=40000,
+        pnboia_buoys=16,
+        pnboia_rows=200000,
+        en4_months=4,
+        en4_profiles=20000,
+        en4_levels=400,
+    ),
+}
+
+# Path of the PIRATA files in the FTP stand-in,
+# as in the PMEL server
+PIRATA_FTP_PATH = 'high_resolution/ascii/hr'
+EN4_YEAR = 2020
+
+def pirata_buoy_names(count):
+    '''
+    Names like the PIRATA buoys ones (e.g. 0n23w).
+    '''
+    return [
+        '{0}n{1}w'.format(i % 4 * 4, 10 + i // 4 * 5)
+        for i in range(count)
+    ]
+
+def build_fixtures(directory, size):
+    '''
+    Write the synthetic inputs of size in directory, unless they were already written there with the same parameters.
+
+    Parameters
+    ----------
+    directory: string
+        Folder of the inputs
+    size: string
+        One of the SIZES keys
+
+    Returns
+    -------
+    paths: dict
+        Folders, files and buoys of each data source
+    '''
+    params = SIZES[size]
+    en4 = load_source('en4')
+    paths = dict(
+        pirata_root=os.path.join(directory, 'pirata'),
+        pnboia_dir=os.path.join(directory, 'pnboia'),
+        en4_dir=os.path.join(directory, 'en4'),
+    )
+    paths['pirata_dir'] = os.path.join(
+        paths['pirata_root'],
+        PIRATA_FTP_PATH
+    )
+    paths['pirata_buoys'] = pirata_buoy_names(
+        params['pirata_buoys']
+    )
+    paths['pnboia_buoys'] = params['pnboia_buoys']
+    paths['en4_yms'] = [
+        '{0}{1:02d}'.format(EN4_YEAR, month)
+        for month in range(1, params['en4_months'] + 1)
+    ]
+    paths['en4_months'] = [
+        os.path.join(
+            paths['en4_dir'],
+            en4.en4_month_filename(ym)
+        )
+        for ym in paths['en4_yms']
+    ]
+    manifest = os.path.join(directory, 'fixtures.json')
+
+    if os.path.exists(manifest):
+        with open(manifest) as fp:
+            if json.load(fp) == params:
+                return paths
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    start = time.perf_counter()
+
+    fixtures.make_pirata_buoys(
+        paths['pirata_dir'],
+        paths['pirata_buoys'],
+        blocks=params['pirata_blocks'],
+        rows=params['pirata_rows']
+    )
+    fixtures.make_pnboia_buoys(
+        paths['pnboia_dir'],
+        params['pnboia_buoys'],
+        params['pnboia_rows']
+    )
+    fixtures.make_en4_year(
+        paths['en4_dir'],
+        EN4_YEAR,
+        range(1, params['en4_months'] + 1),
+        en4.en4_zip_filename,
+        en4.en4_month_filename,
+        params['en4_profiles'],
+        params['en4_levels']
+    )
+
+    with open(manifest, 'w') as fp:
+        json.dump(params, fp)
+
+    print((
+        '>> {0} inputs written in {1:.1f} s').format(
+            size,
+            time.perf_counter() - start
+    ))
+
+    return paths
+
+def measure(func, repeat=3):
+    '''
+    Run func repeat times.
+
+    Returns
+    -------
+    timing: dict
+        min, median and max wall time in seconds, and repeat
+    result:
+        The return of the last run
+    '''
+    times = list()
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+
+    return dict(
+        min=min(times),
+        median=statistics.median(times),
+        max=max(times),
+        repeat=repeat,
+    ), result
+
+def middle_window(index, fraction):
+    '''
+    Time limits holding the middle fraction of a DatetimeIndex span.
+    '''
+    first, last = index.min(), index.max()
+    margin = (last - first) * (1 - fraction) / 2
+
+    return first + margin, last - margin
+
+def benchmark_cases(
+    paths,
+    scratch,
+    base_url,
+    ftp_port,
+    repeat=3,
+    cases=None):
+    '''
+    Time each benchmark case on the inputs of one size.
+
+    Parameters
+    ----------
+    paths: dict
+        The return of build_fixtures
+    scratch: string
+        Folder for the files written by the scripts
+    base_url: string
+        Address of the HTTP stand-in, serving the inputs folder
+    ftp_port: integer or None
+        Port of the FTP stand-in, or None to skip the cases that need it
+    repeat: integer
+        Runs of each case
+    cases: list or None
+        Run only the cases starting with one of these names. The default is to run all cases.
+
+    Yields
+    ------
+    case: string
+        Case name, <data source>.<function>[.<variant>]
+    timing: dict
+        The return of measure
+    '''
+    def wanted(case):
+        return cases is None or case.startswith(tuple(cases))
+
+    pirata = load_source('pirata')
+    pnboia = load_source('pnboia')
+    en4 = load_source('en4')
+
+    ############################################
+    # PIRATA ###################################
+    ############################################
+    # Largest file: the deepest variable of the
+    # first buoy
+    filepath = os.path.join(
+        paths['pirata_dir'],
+        't{0}_hr.ascii.gz'.format(paths['pirata_buoys'][0])
+    )
+    content = pirata.read_pirata_file(filepath)
+    meta = pirata.handle_pirata_metadata(filepath, content)
+
+    if wanted('pirata.read_pirata_file'):
+        yield 'pirata.read_pirata_file', measure(
+            lambda: pirata.read_pirata_file(filepath),
+            repeat
+        )[0]
+
+    if wanted('pirata.handle_pirata_metadata'):
+        yield 'pirata.handle_pirata_metadata', measure(
+            lambda: pirata.handle_pirata_metadata(filepath, content),
+            repeat
+        )[0]
+
+    if wanted('pirata.handle_pirata_data'):
+        timing, data = measure(
+            lambda: pirata.handle_pirata_data(filepath, meta, content),
+            repeat
+        )
+        yield 'pirata.handle_pirata_data', timing
+
+        timemin, timemax = middle_window(data.index, 0.1)
+
+        yield 'pirata.handle_pirata_data.window', measure(
+            lambda: pirata.handle_pirata_data(
+                filepath,
+                meta,
+                content,
+                timemin,
+                timemax
+            ),
+            repeat
+        )[0]
+
+        yield 'pirata.handle_pirata_data.flags', measure(
+            lambda: pirata.handle_pirata_data(
+                filepath,
+                meta,
+                content,
+                flags='uint8'
+            ),
+            repeat
+        )[0]
+
+    if wanted('pirata.join_frames'):
+        # All variables of the first buoy, as
+        # get_weather_data joins them
+        variables = list()
+
+        for var_name in fixtures.PIRATA_VARIABLES:
+            var_filepath = os.path.join(
+                paths['pirata_dir'],
+                '{0}{1}_hr.ascii.gz'.format(
+                    var_name,
+                    paths['pirata_buoys'][0]
+            ))
+            df = pirata.handle_pirata_data(
+                var_filepath,
+                pirata.handle_pirata_metadata(var_filepath)
+            )
+            variables.append((df, {
+                column: column + '_' + var_name
+                for column in df.columns
+            }))
+
+        yield 'pirata.join_frames', measure(
+            lambda: join_frames(list(variables)),
+            repeat
+        )[0]
+
+    if ftp_port is not None and (
+        wanted('pirata.get_weather_data') or
+        wanted('pirata.time_filter')):
+
+        database = pd.DataFrame(dict(
+            short_name=paths['pirata_buoys']
+        ))
+        localpath = os.path.join(scratch, 'pirata')
+        os.makedirs(localpath, exist_ok=True)
+
+        timing, (weather_data, _) = measure(
+            lambda: pirata.get_weather_data(
+                database,
+                'user',
+                'password',
+                localpath,
+                workers=4,
+                server='127.0.0.1',
+                ftp_path=PIRATA_FTP_PATH,
+                port=ftp_port
+            ),
+            repeat if wanted('pirata.get_weather_data') else 1
+        )
+
+        if wanted('pirata.get_weather_data'):
+            yield 'pirata.get_weather_data', timing
+
+        if wanted('pirata.time_filter'):
+            timemin, timemax = middle_window(
+                next(iter(weather_data.values())).index,
+                0.5
+            )
+            yield 'pirata.time_filter', measure(
+                lambda: pirata.time_filter(
+                    weather_data,
+                    timemin,
+                    timemax
+                ),
+                repeat
+            )[0]
+
+    ############################################
+    # PNBOIA ###################################
+    ############################################
+    if wanted('pnboia'):
+        database = fixtures.pnboia_stations(
+            base_url + '/pnboia',
+            paths['pnboia_buoys']
+        )
+        timing, weather_data = measure(
+            lambda: pnboia.get_weather_data(
+                database,
+                workers=8
+            ),
+            repeat
+        )
+        timemin, timemax = middle_window(
+            next(iter(weather_data.values())).index,
+            0.5
+        )
+
+        if wanted('pnboia.get_weather_data'):
+            yield 'pnboia.get_weather_data', timing
+
+            yield 'pnboia.get_weather_data.window', measure(
+                lambda: pnboia.get_weather_data(
+                    database,
+                    workers=8,
+                    timemin=timemin,
+                    timemax=timemax
+                ),
+                repeat
+            )[0]
+
+        if wanted('pnboia.time_filter'):
+            yield 'pnboia.time_filter', measure(
+                lambda: pnboia.time_filter(
+                    weather_data,
+                    timemin,
+                    timemax
+                ),
+                repeat
+            )[0]
+
+    ############################################
+    # EN4 ######################################
+    ############################################
+    limits = (
+        -60.,
+        0.,
+        -40.,
+        10.,
+        pd.Timestamp(EN4_YEAR, 1, 1),
+        pd.Timestamp(EN4_YEAR, 12, 31, 23, 59)
+    )
+
+    if wanted('en4.extract_argo_en4'):
+        yield 'en4.extract_argo_en4', measure(
+            lambda: en4.extract_argo_en4(
+                paths['en4_months'],
+                *limits
+            ),
+            repeat
+        )[0]
+
+    if wanted('en4.get_argo_en4_data'):
+        localpath = os.path.join(scratch, 'en4')
+        os.makedirs(localpath, exist_ok=True)
+
+        # Download of the yearly zip file from
+        # the HTTP stand-in included
+        yield 'en4.get_argo_en4_data', measure(
+            lambda: en4.get_argo_en4_data(
+                base_url + '/en4',
+                localpath,
+                *limits,
+                workers=2,
+                months_by_year={EN4_YEAR: paths['en4_yms']}
+            ),
+            repeat
+        )[0]
+
+    if wanted('en4.get_argo_en4_data.index'):
+        localpath = os.path.join(scratch, 'en4')
+        index_dir = os.path.join(scratch, 'en4_index')
+        os.makedirs(localpath, exist_ok=True)
+        # Build the profile index once
+        en4.get_argo_en4_data(
+            base_url + '/en4',
+            localpath,
+            *limits,
+            workers=2,
+            months_by_year={EN4_YEAR: paths['en4_yms']},
+            index_dir=index_dir
+        )
+
+        yield 'en4.get_argo_en4_data.index', measure(
+            lambda: en4.get_argo_en4_data(
+                base_url + '/en4',
+                localpath,
+                *limits,
+                workers=2,
+                months_by_year={EN4_YEAR: paths['en4_yms']},
+                index_dir=index_dir
+            ),
+            repeat
+        )[0]
+
+        # No profile inside the area: answered
+        # by the index alone
+        yield 'en4.get_argo_en4_data.index_empty', measure(
+            lambda: en4.get_argo_en4_data(
+                base_url + '/en4',
+                localpath,
+                10.,
+                10.001,
+                10.,
+                10.001,
+                *limits[4:],
+                workers=2,
+                months_by_year={EN4_YEAR: paths['en4_yms']},
+                index_dir=index_dir
+            ),
+            repeat
+        )[0]
+
+def compare(results, baseline, tolerance):
+    '''
+    Compare the median times of results with the ones of baseline.
+
+    Parameters
+    ----------
+    results, baseline: dict
+        Sizes as keys and dicts with cases as keys and timings as values
+    tolerance: float
+        Allowed slowdown, e.g. 0.25 for 25%
+
+    Returns
+    -------
+    regressions: list
+        Tuples (size, case, ratio) of the cases slower than the baseline by more than tolerance
+    '''
+    regressions = list()
+
+    for size, cases in results.items():
+        for case, timing in cases.items():
+            reference = baseline.get(size, dict()).get(case)
+
+            if reference is None:
+                continue
+
+            ratio = timing['median'] / max(reference['median'], 1e-9)
+            print((
+                '{0:<8} {1:<36} {2:6.2f}x baseline').format(
+                    size,
+                    case,
+                    ratio
+            ))
+
+            if ratio > 1 + tolerance:
+                regressions.append((size, case, ratio))
+
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Time the download scripts on synthetic data served locally.'
+    )
+    parser.add_argument(
+        '--sizes',
+        nargs='+',
+        choices=list(SIZES),
+        default=['small'],
+        help='Sizes of the inputs (default: small)'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        help='Runs of each case. The median is compared (default: 3)'
+    )
+    parser.add_argument(
+        '--cases',
+        nargs='+',
+        default=None,
+        help='Run only the cases starting with these names (e.g. pirata en4.extract)'
+    )
+    parser.add_argument(
+        '--workdir',
+        default=None,
+        help='Folder where the inputs are kept between runs. By default they are written to a temporary folder and deleted at the end'
+    )
+    parser.add_argument(
+        '--output',
+        default=None,
+        help='JSON file where the results are saved'
+    )
+    parser.add_argument(
+        '--baseline',
+        default=None,
+        help='JSON file of a previous run (see --output) to compare with'
+    )
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.25,
+        help='Slowdown over the baseline reported as a regression (default: 0.25)'
+    )
+    parser.add_argument(
+        '--metrics',
+        default=None,
+        help='Also write the stages of the scripts as JSON lines in this file (see PONTO_METRICS)'
+    )
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.metrics:
+        os.environ['PONTO_METRICS'] = os.path.abspath(
+            args.metrics
+        )
+
+    workdir = args.workdir or tempfile.mkdtemp(
+        prefix='ponto-benchmark-'
+    )
+    results = dict()
+
+    try:
+        for size in args.sizes:
+            inputs = os.path.join(workdir, size)
+            paths = build_fixtures(inputs, size)
+            scratch = tempfile.mkdtemp(dir=workdir)
+            results[size] = dict()
+
+            with ExitStack() as stack:
+                base_url = stack.enter_context(
+                    servers.http_server(inputs)
+                )
+                ftp_port = None
+
+                if servers.has_ftp_server():
+                    ftp_port = stack.enter_context(
+                        servers.ftp_server(paths['pirata_root'])
+                    )
+                else:
+                    print('>> pyftpdlib is not installed: PIRATA FTP cases skipped')
+
+                for case, timing in benchmark_cases(
+                    paths,
+                    scratch,
+                    base_url,
+                    ftp_port,
+                    args.repeat,
+                    args.cases):
+
+                    results[size][case] = timing
+                    print((
+                        '{0:<8} {1:<36} min {2:8.3f} s' +
+                        '  median {3:8.3f} s').format(
+                            size,
+                            case,
+                            timing['min'],
+                            timing['median']
+                    ))
+
+            shutil.rmtree(scratch, ignore_errors=True)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(
+                dict(
+                    results,
+                    environment=dict(
+                        python=platform.python_version(),
+                        numpy=np.__version__,
+                        pandas=pd.__version__,
+                        machine=platform.machine(),
+                        cpus=os.cpu_count(),
+                    )
+                ),
+                fp,
+                indent=4
+            )
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+
+        regressions = compare(
+            results,
+            baseline,
+            args.tolerance
+        )
+
+        for size, case, ratio in regressions:
+            print((
+                '>> Regression: {0} {1} is {2:.2f}x' +
+                ' slower than the baseline').format(
+                    size,
+                    case,
+                    ratio
+            ))
+
+        if regressions:
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
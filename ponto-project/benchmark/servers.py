@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Local HTTP and FTP servers standing
+#            in for the PNBOIA, EN4 and PMEL
+#            servers while benchmarking
+
+import os
+import logging
+import email.utils
+import multiprocessing
+
+from contextlib import contextmanager
+from http.server import (
+    SimpleHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    '''
+    Static files handler with the headers the download scripts rely on: Content-Length, Last-Modified, ETag and Accept-Ranges, 206 answers to single byte range requests and 304 answers to conditional requests (If-None-Match or If-Modified-Since) of unchanged files.
+    '''
+
+    def log_message(self, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+
+        stat = os.stat(path)
+        size = stat.st_size
+        start, end = 0, size - 1
+        etag = '"{0:x}-{1:x}"'.format(stat.st_mtime_ns, size)
+        modified = email.utils.formatdate(
+            stat.st_mtime,
+            usegmt=True
+        )
+        if_none_match = self.headers.get('If-None-Match')
+        if_modified_since = self.headers.get('If-Modified-Since')
+
+        if if_none_match is not None:
+            not_modified = if_none_match == etag
+        else:
+            not_modified = if_modified_since is not None and (
+                email.utils.parsedate_to_datetime(if_modified_since).timestamp() >=
+                int(stat.st_mtime)
+            )
+
+        if not_modified:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return None
+
+        byte_range = self.headers.get('Range')
+
+        if byte_range and byte_range.startswith('bytes='):
+            first, last = byte_range[6:].split('-')
+            start = int(first) if first else 0
+            end = min(int(last), size - 1) if last else size - 1
+
+            self.send_response(206)
+            self.send_header(
+                'Content-Range',
+                'bytes {0}-{1}/{2}'.format(start, end, size)
+            )
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Last-Modified', modified)
+        self.send_header('ETag', etag)
+        self.end_headers()
+
+        fh = open(path, 'rb')
+        fh.seek(start)
+        self.remaining = end - start + 1
+
+        return fh
+
+    def copyfile(self, source, outputfile):
+        while self.remaining > 0:
+            chunk = source.read(min(2**20, self.remaining))
+
+            if not chunk:
+                break
+
+            outputfile.write(chunk)
+            self.remaining -= len(chunk)
+
+@contextmanager
+def server_process(target, *args):
+    '''
+    Run a server in a separate process while the context is open.
+
+    The servers must not run in the benchmark process: the worker processes forked by the scripts would inherit the sockets of open transfers, so closing them on the server side would not end the transfers.
+
+    Parameters
+    ----------
+    target: function
+        Called as target(*args, conn) in the new process. It starts the server and sends its port through conn.
+
+    Yields
+    ------
+    port: integer
+        Port of the server on 127.0.0.1
+    '''
+    conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=target,
+        args=args + (child_conn,),
+        daemon=True
+    )
+    process.start()
+    # The pipe breaks if the server fails
+    # to start
+    child_conn.close()
+
+    try:
+        yield conn.recv()
+    finally:
+        process.terminate()
+        process.join()
+        conn.close()
+
+def serve_http(directory, conn):
+    '''
+    Serve directory over HTTP, sending the port through conn.
+    '''
+    handler = lambda *args: RangeRequestHandler(
+        *args,
+        directory=directory
+    )
+    server = ThreadingHTTPServer(
+        ('127.0.0.1', 0),
+        handler
+    )
+    conn.send(server.server_address[1])
+    server.serve_forever()
+
+@contextmanager
+def http_server(directory):
+    '''
+    Serve directory over HTTP on a free local port while the context is open.
+
+    Yields
+    ------
+    base_url: string
+        Address of directory, like http://127.0.0.1:<port>
+    '''
+    with server_process(serve_http, directory) as port:
+        yield 'http://127.0.0.1:{0}'.format(port)
+
+def has_ftp_server():
+    '''
+    Test if pyftpdlib, needed by the FTP stand-in, is installed.
+    '''
+    try:
+        import pyftpdlib
+    except ImportError:
+        return False
+
+    return True
+
+def serve_ftp(directory, user, password, conn):
+    '''
+    Serve directory over FTP, read only, sending the port through conn.
+    '''
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+
+    authorizer = DummyAuthorizer()
+    authorizer.add_user(
+        user,
+        password,
+        directory,
+        perm='elr'
+    )
+    handler = type(
+        'BenchmarkFTPHandler',
+        (FTPHandler,),
+        dict(authorizer=authorizer)
+    )
+    server = ThreadedFTPServer(
+        ('127.0.0.1', 0),
+        handler
+    )
+    # pyftpdlib logs every command to stderr
+    # when its logger has no handler
+    logger = logging.getLogger('pyftpdlib')
+
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+        logger.propagate = False
+
+    conn.send(server.address[1])
+    server.serve_forever(handle_exit=False)
+
+@contextmanager
+def ftp_server(directory, user='user', password='password'):
+    '''
+    Serve directory over FTP, read only, on a free local port while the context is open. Needs pyftpdlib.
+
+    Yields
+    ------
+    port: integer
+        Port of the server on 127.0.0.1
+    '''
+    with server_process(serve_ftp, directory, user, password) as port:
+        yield port
@@ -6,181 +6,1137 @@
 # OBJECTIVE: Download ARGO data from EN4
 
 import os
+import sys
+import shutil
+import zipfile
 import requests
 import warnings
-import subprocess
 
+import netCDF4
+import numpy as np
 import xarray as xr
 import pandas as pd
 
+from concurrent.futures import ProcessPoolExecutor
+
+# Make the ponto_utils package, shared by all
+# data types, importable
+sys.path.append(
+    os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)
+)))
+
+from ponto_utils.cache import FileCache
+from ponto_utils.processes import process_context
+from ponto_utils.transfer import (
+    download_file,
+    remote_file_info
+)
+from ponto_utils.metrics import (
+    stage,
+    count,
+    path_size,
+)
+from ponto_utils.catalogue import load_en4_path
+from ponto_utils.profile_index import (
+    ProfileIndex,
+    profile_columns,
+)
+from ponto_utils.settings import (
+    read_limits,
+    cache_path,
+    union_limits,
+)
+
 ############################################
 # CONFIG PARAMETERS AND GLOBAL VARIABLES ###
 ############################################
-def get_argo_en4_global_files(
-    dir2get,
-    dir2save,
+def get_months_by_year(
     start_time,
     end_time
 ):
     """
-    
+    Get the EN4 months (as YYYYMM strings) needed for each year of the desired time.
+
+    Every month that overlaps [start_time, end_time] is included, even if the period starts or ends in the middle of it.
+
+    Returns
+    -------
+    months_by_year: dict
+        Years (int) as keys and lists of YYYYMM strings as values
     """
 
-    months = pd.date_range(
+    months = pd.period_range(
         start_time,
         end_time,
         freq='M'
     )
+    months_by_year = dict()
 
-    if months.empty:
-        months = pd.date_range(
-            start_time,
-            end_time,
-            periods=1
+    for year in range(start_time.year, end_time.year+1):
+        months_by_year[year] = list(
+            months[months.year == year].strftime('%Y%m')
         )
 
-    unziped_files = list()
+    return months_by_year
 
-    for year in range(start_time.year, end_time.year+1):
-        zip_filename = (
-            'EN.4.2.2.profiles.g10.' +
-            str(year) +
-            '.zip'
+def en4_zip_filename(year):
+    """
+    Name of the EN4 yearly zip file.
+    """
+    return (
+        'EN.4.2.2.profiles.g10.' +
+        str(year) +
+        '.zip'
+    )
+
+def en4_month_filename(ym):
+    """
+    Name of the EN4 monthly file inside the yearly zip.
+    """
+    return (
+        'EN.4.2.2.f.profiles.g10.' +
+        '{0}.nc'.format(
+            ym
+    ))
+
+def en4_index_filename(year):
+    """
+    Name of the local profile index of an EN4 year (see ponto_utils.profile_index).
+    """
+    return (
+        'EN.4.2.2.profiles.g10.' +
+        str(year) +
+        '.index.npz'
+    )
+
+def download_en4_year(
+    dir2get,
+    dir2save,
+    year,
+    segments=4,
+    info=None
+):
+    """
+    Download the EN4 yearly zip file.
+
+    The file is downloaded in parallel byte ranges and an interrupted download is resumed in the next call (see ponto_utils.transfer.download_file).
+
+    Parameters
+    ----------
+    dir2get: string
+        EN4 url where the yearly zip files are located
+    dir2save: string
+        Folder where the file is saved
+    year: integer
+        Year of the file
+    segments: integer
+        Maximum number of byte ranges downloaded at the same time. The default value is 4.
+    info: tuple
+        Result of ponto_utils.transfer.remote_file_info for the zip file, when already known
+
+    Returns
+    -------
+    local_filepath: string
+        Path of the downloaded zip file
+
+    Raises
+    ------
+    ponto_utils.transfer.DownloadError
+        If the file could not be completely downloaded
+    """
+    zip_filename = en4_zip_filename(year)
+    en4_filepath = os.path.join(
+        dir2get,
+        zip_filename
+    )
+    local_filepath = os.path.join(
+        dir2save,
+        zip_filename
+    )
+
+    with stage('en4.download', year=year):
+        return download_file(
+            en4_filepath,
+            local_filepath,
+            segments=segments,
+            info=info
         )
-        en4_filepath = os.path.join(
-            dir2get,
-            zip_filename
+
+def read_en4_month(
+    local_filepath,
+    ym
+):
+    """
+    Read one monthly file straight out of the EN4 yearly zip file.
+
+    Nothing is written to disk: the member is decompressed into memory.
+
+    Returns
+    -------
+    content: bytes or None
+        Monthly NetCDF file content, or None if the month is not in the zip file
+    """
+    with zipfile.ZipFile(local_filepath) as archive:
+        try:
+            return archive.read(
+                en4_month_filename(ym)
+            )
+        except KeyError:
+            return None
+
+def open_en4_file(file):
+    """
+    Lazily open an EN4 monthly file from a path or from its content in memory.
+
+    Returns
+    -------
+    nc: xarray.Dataset
+    """
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        store = xr.backends.NetCDF4DataStore(
+            netCDF4.Dataset(
+                'en4_month.nc',
+                mode='r',
+                memory=file
+        ))
+
+        return xr.open_dataset(store)
+
+    return xr.open_dataset(
+        file,
+        engine='netcdf4'
+    )
+
+def select_argo_profiles(
+    nc,
+    lonmin,
+    lonmax,
+    latmin,
+    latmax,
+    timemin,
+    timemax
+):
+    """
+    Get the indices of ARGO profiles inside desired area and time.
+
+    Just LONGITUDE, LATITUDE, JULD and PROJECT_NAME are read from nc.
+
+    Parameters
+    ----------
+    nc: xarray.Dataset
+        An EN4 profiles file lazily opened
+    lonmin, lonmax, latmin, latmax: float
+        Desired area limits
+    timemin, timemax: datetime
+        Desired time limits
+
+    Returns
+    -------
+    profiles: numpy.ndarray
+        Indices along N_PROF of the selected profiles
+    """
+    lon = nc['LONGITUDE'].values
+    lat = nc['LATITUDE'].values
+    juld = nc['JULD'].values
+
+    # The symbol inside astype func means get
+    # just the first four values in the string
+    project = nc['PROJECT_NAME'].values.astype('|S4')
+
+    mask = (
+        (lon >= lonmin) &
+        (lon <= lonmax) &
+        (lat >= latmin) &
+        (lat <= latmax) &
+        (juld >= np.datetime64(timemin)) &
+        (juld <= np.datetime64(timemax)) &
+        (project == b'ARGO')
+    )
+
+    return np.flatnonzero(mask)
+
+def extract_argo_en4_file(
+    file,
+    lonmin,
+    lonmax,
+    latmin,
+    latmax,
+    timemin,
+    timemax,
+    ym=None,
+    profiles=None,
+    index=False
+):
+    """
+    Extract ARGO profiles inside desired area and time from one EN4 file.
+
+    file can be a path or the file content in memory. The file is opened lazily, the profiles to keep are found using only the position, time and project variables, and then just those profiles are read from the heavy variables.
+
+    ym (YYYYMM) just labels the metrics of the file (see ponto_utils.metrics).
+
+    Parameters
+    ----------
+    profiles: numpy.ndarray or None
+        Indices along N_PROF of the profiles to read, already found in a profile index. The default is to find them in the file.
+    index: bool
+        If True the position, time and project of all profiles of the file are also returned, to be added to a profile index (see ponto_utils.profile_index.profile_columns)
+
+    Returns
+    -------
+    nc: xarray.Dataset or None
+        Selected profiles loaded in memory, or None if no profile was found
+    columns: dict
+        Only if index is True
+    """
+    columns = None
+
+    with stage('en4.extract', month=ym), \
+        open_en4_file(file) as month:
+
+        # Drop N_HISTORY dimension and
+        # associated variables because its
+        # shape (empty) caused a lot of
+        # trouble to select data
+        month = month.drop_dims(
+            'N_HISTORY'
         )
-        local_filepath = os.path.join(
+
+        if profiles is None:
+            with stage('en4.select'):
+                profiles = select_argo_profiles(
+                    month,
+                    lonmin,
+                    lonmax,
+                    latmin,
+                    latmax,
+                    timemin,
+                    timemax
+                )
+                count(rows=profiles.size)
+
+                # The variables are already in
+                # memory after the selection
+                if index:
+                    columns = profile_columns(month)
+
+        nc = None
+
+        if profiles.size:
+            with stage('en4.load'):
+                nc = month.isel(
+                    N_PROF=profiles
+                ).load()
+
+    if index:
+        return nc, columns
+
+    return nc
+
+def merge_argo_en4(selected):
+    """
+    Concatenate the profiles selected in each file along N_PROF.
+
+    Returns
+    -------
+    nc: xarray.Dataset or None
+        Merged profiles, or None if there is nothing to merge
+    """
+    selected = [
+        nc for nc in selected
+        if nc is not None
+    ]
+
+    if not selected:
+        return None
+
+    return xr.concat(
+        selected,
+        dim='N_PROF'
+    )
+
+def extract_argo_en4(
+    files,
+    lonmin,
+    lonmax,
+    latmin,
+    latmax,
+    timemin,
+    timemax
+):
+    """
+    Extract ARGO profiles inside desired area and time from EN4 files.
+
+    Memory is proportional to the number of selected profiles, not to the size of the global files.
+
+    Parameters
+    ----------
+    files: list
+        Paths of EN4 monthly profiles files
+    lonmin, lonmax, latmin, latmax: float
+        Desired area limits
+    timemin, timemax: datetime
+        Desired time limits
+
+    Returns
+    -------
+    nc: xarray.Dataset or None
+        Selected profiles concatenated along N_PROF, or None if no profile was found
+    """
+    selected = list()
+
+    for file in files:
+        selected.append(
+            extract_argo_en4_file(
+                file,
+                lonmin,
+                lonmax,
+                latmin,
+                latmax,
+                timemin,
+                timemax
+        ))
+
+    return merge_argo_en4(selected)
+
+def is_cache_fresh(entry, remote_mtime):
+    """
+    Test if a cache entry still matches the remote yearly zip file.
+
+    When the remote modification time is unknown (e.g. offline) the cached file is trusted.
+    """
+    if entry is None:
+        return False
+
+    if remote_mtime is None:
+        return True
+
+    return entry['metadata'].get('source_mtime') == remote_mtime
+
+def get_en4_year(
+    dir2get,
+    dir2save,
+    year,
+    cache=None,
+    remote_info=None,
+    segments=4
+):
+    """
+    Get the EN4 yearly zip file, from the cache if possible.
+
+    remote_info is the result of ponto_utils.transfer.remote_file_info for the zip file, or None if unknown. It and segments are passed to download_en4_year.
+
+    Returns
+    -------
+    local_filepath: string
+        Path of the zip file
+    source_mtime: float or None
+        Modification time of the zip file on the EN4 server
+    temporary: bool
+        True if the file is not kept by the cache and must be deleted after use
+    """
+    remote_mtime = None
+
+    if remote_info is not None:
+        remote_mtime = remote_info[2]
+
+    if cache is None:
+        local_filepath = download_en4_year(
+            dir2get,
             dir2save,
-            zip_filename
+            year,
+            segments,
+            remote_info
         )
-        months2unzip = months[
-            months.year == year
-        ]
-        months2unzip = list(
-            months2unzip.strftime('%Y%m')
-        )
-        subprocess.run([
-            'wget',
-            '--quiet',
-            '--https-only',
-            '-N',
-            '-P',
-            dir2save,
-            en4_filepath
-        ])
-        for ym in months2unzip:
-            file2unzip = (
-                'EN.4.2.2.f.profiles.g10.' +
-                '{0}.nc'.format(
-                    ym
-            ))
-            subprocess.run([
-                'unzip',
-                '-q',
-                '-o',
-                '-d',
-                dir2save,
-                local_filepath,
-                file2unzip,
+        return local_filepath, remote_mtime, True
 
-            ])
-            unziped_files.append(
-                os.path.join(
+    key = en4_zip_filename(year)
+    entry = cache.lookup(key)
+
+    if is_cache_fresh(entry, remote_mtime):
+        return (
+            cache.object_path(entry['sha256']),
+            entry['metadata'].get('source_mtime'),
+            False
+        )
+
+    local_filepath = download_en4_year(
+        dir2get,
+        dir2save,
+        year,
+        segments,
+        remote_info
+    )
+
+    # The downloaded file gets the Last-Modified
+    # time of the server as modification time
+    source_mtime = os.path.getmtime(
+        local_filepath
+    )
+    cached_filepath = cache.put(
+        key,
+        local_filepath,
+        source_mtime=source_mtime
+    )
+
+    return cached_filepath, source_mtime, False
+
+def process_en4_month(
+    local_filepath,
+    ym,
+    lonmin,
+    lonmax,
+    latmin,
+    latmax,
+    timemin,
+    timemax,
+    cache=None,
+    source_mtime=None,
+    profiles=None,
+    index=False
+):
+    """
+    Read, filter and reduce one EN4 month from the yearly zip file. Used as a worker process task.
+
+    If cache is given the extracted monthly file is also stored in it, so next requests for the same month do not need the zip file.
+
+    profiles and index are passed to extract_argo_en4_file.
+
+    Returns
+    -------
+    nc: xarray.Dataset or None
+        Selected profiles of the month, or None if no profile was found
+    columns: dict or None
+        Only if index is True. None if the month is not in the zip file.
+    """
+    with stage('en4.unzip', month=ym):
+        content = read_en4_month(
+            local_filepath,
+            ym
+        )
+
+        if content is None:
+            return (None, None) if index else None
+
+        count(bytes=len(content))
+
+    if cache is not None:
+        cache.put_bytes(
+            en4_month_filename(ym),
+            content,
+            source_mtime=source_mtime
+        )
+
+    return extract_argo_en4_file(
+        content,
+        lonmin,
+        lonmax,
+        latmin,
+        latmax,
+        timemin,
+        timemax,
+        ym,
+        profiles,
+        index
+    )
+
+def get_argo_en4_data(
+    dir2get,
+    dir2save,
+    lonmin,
+    lonmax,
+    latmin,
+    latmax,
+    timemin,
+    timemax,
+    workers=4,
+    cache=None,
+    months_by_year=None,
+    segments=4,
+    index_dir=None
+):
+    """
+    Get ARGO profiles from EN4 for desired area and time.
+
+    Each month is read straight out of the yearly zip file, filtered and reduced in its own worker process, while the next yearly zip file is being downloaded. No monthly file is written to disk. The small partial results are merged once at the end.
+
+    When a cache is given, months and yearly zip files already cached, and not changed on the EN4 server since, are not downloaded again. The cache is trimmed to its size limit at the end.
+
+    When index_dir is given, a profile index of each year (see ponto_utils.profile_index) is kept there. Months already indexed are queried first: months without profiles inside the limits are not downloaded nor read at all, and just the indexed profiles of the other ones are read. Months not indexed yet are indexed while they are read.
+
+    The workers are started by a fork server and import the main script again (see ponto_utils.processes), so a script calling this function must do it under if __name__ == '__main__'. Otherwise the reading fails with concurrent.futures.process.BrokenProcessPool.
+
+    Parameters
+    ----------
+    dir2get: string
+        EN4 url where the yearly zip files are located
+    dir2save: string
+        Folder where files are temporarily saved
+    lonmin, lonmax, latmin, latmax: float
+        Desired area limits
+    timemin, timemax: datetime
+        Desired time limits
+    workers: integer
+        Number of months processed at the same time. The default workers value is 4.
+    cache: ponto_utils.cache.FileCache or None
+        Cache of EN4 yearly zip files and monthly files. The default is not to use a cache.
+    months_by_year: dict or None
+        Months to read (see get_months_by_year). The default is all months between timemin and timemax.
+    segments: integer
+        Maximum number of byte ranges of a yearly zip file downloaded at the same time. The default value is 4.
+    index_dir: string or None
+        Folder of the profile indices of the EN4 years. The default is not to use an index.
+
+    Returns
+    -------
+    nc: xarray.Dataset or None
+        Selected profiles concatenated along N_PROF, or None if no profile was found
+    """
+    if months_by_year is None:
+        months_by_year = get_months_by_year(
+            timemin,
+            timemax
+        )
+    limits = (
+        lonmin,
+        lonmax,
+        latmin,
+        latmax,
+        timemin,
+        timemax
+    )
+    # Months futures of each year, with the
+    # zip file to delete when they are done and
+    # the profile index to update
+    futures = list()
+
+    with ProcessPoolExecutor(
+        max(1, int(workers)),
+        mp_context=process_context(
+            'numpy',
+            'pandas',
+            'xarray',
+            'netCDF4',
+            'requests'
+        )
+    ) as executor:
+        for year, months2read in months_by_year.items():
+            year_futures = dict()
+            remote_info = None
+            remote_mtime = None
+            index = None
+            hits = dict()
+
+            # The same answer is reused by the
+            # download of the zip file
+            if cache is not None or index_dir is not None:
+                try:
+                    remote_info = remote_file_info(
+                        os.path.join(
+                            dir2get,
+                            en4_zip_filename(year)
+                    ))
+                    remote_mtime = remote_info[2]
+                except requests.RequestException:
+                    pass
+
+            if index_dir is not None:
+                with stage('en4.query', year=year):
+                    index = ProfileIndex.load(
+                        os.path.join(
+                            index_dir,
+                            en4_index_filename(year)
+                        ),
+                        remote_mtime
+                    )
+
+                    for ym in months2read:
+                        if ym in index:
+                            hits[ym] = index.query(
+                                ym,
+                                *limits
+                            )
+
+                    count(rows=sum(
+                        profiles.size
+                        for profiles in hits.values()
+                    ))
+
+            # Months indexed without profiles inside
+            # the limits are skipped, and the other
+            # ones are indexed when not yet
+            months2get = [
+                ym for ym in months2read
+                if ym not in hits or hits[ym].size
+            ]
+            month_options = {
+                ym: dict(
+                    profiles=hits.get(ym),
+                    index=index is not None and ym not in hits
+                )
+                for ym in months2get
+            }
+
+            if cache is not None:
+                # Months already extracted in
+                # the cache are read directly
+                for ym in months2get:
+                    entry = cache.lookup(
+                        en4_month_filename(ym)
+                    )
+
+                    if is_cache_fresh(entry, remote_mtime):
+                        year_futures[ym] = executor.submit(
+                            extract_argo_en4_file,
+                            cache.object_path(entry['sha256']),
+                            *limits,
+                            ym=ym,
+                            **month_options[ym]
+                        )
+
+            missing = [
+                ym for ym in months2get
+                if ym not in year_futures
+            ]
+            local_filepath = None
+            temporary = False
+
+            if missing:
+                local_filepath, source_mtime, temporary = get_en4_year(
+                    dir2get,
                     dir2save,
-                    file2unzip
+                    year,
+                    cache,
+                    remote_info,
+                    segments
+                )
+
+                if index is not None and index.source_mtime is None:
+                    index.source_mtime = source_mtime
+
+                for ym in missing:
+                    year_futures[ym] = executor.submit(
+                        process_en4_month,
+                        local_filepath,
+                        ym,
+                        *limits,
+                        cache=cache,
+                        source_mtime=source_mtime,
+                        **month_options[ym]
+                    )
+
+            futures.append((
+                year,
+                [
+                    (ym, year_futures[ym], month_options[ym]['index'])
+                    for ym in months2get
+                ],
+                local_filepath if temporary else None,
+                index
             ))
-        subprocess.run([
-            'rm',
-            local_filepath
-        ])
-
-    return unziped_files
-
-obsdir = os.environ[
-    'DATATYPE_DIR'
-]
-en4_dir = requests.get((
-    'https://raw.githubusercontent.com/' +
-    'douglasnehme/data-misc/main/' +
-    'en4_path.txt'
-))
-en4_dir = en4_dir.content.decode(
-    'utf-8'
-)
-# Desired area
-lonmin = float(
-    os.environ[
-      'LON_MIN'
-])
-lonmax = float(
-    os.environ[
-      'LON_MAX'
-])
-latmin = float(
-    os.environ[
-      'LAT_MIN'
-])
-latmax = float(
-    os.environ[
-      'LAT_MAX'
-])
-# Desired time
-timemin = pd.to_datetime(
-    os.environ[
-        'DATETIME_MIN'],
-    format='%d-%m-%Y %H:%M:%S'
-)
-timemax = pd.to_datetime(
-    os.environ[
-        'DATETIME_MAX'],
-    format='%d-%m-%Y %H:%M:%S'
-)
-############################################
-# IMPORTING AND MANIPULATING DATA ##########
-############################################
-argo_files = get_argo_en4_global_files(
-    en4_dir,
+
+        selected = list()
+
+        # Keep months in chronological order,
+        # delete each temporary zip file when all
+        # its months are done and save the months
+        # newly indexed
+        for year, months, local_filepath, index in futures:
+            indexed = False
+
+            for ym, future, to_index in months:
+                nc = future.result()
+
+                if to_index:
+                    nc, columns = nc
+
+                    if columns is not None:
+                        index.add(ym, columns)
+                        indexed = True
+
+                selected.append(nc)
+
+            if local_filepath and os.path.exists(local_filepath):
+                os.remove(local_filepath)
+
+            if indexed:
+                with stage('en4.index', year=year):
+                    index.save(os.path.join(
+                        index_dir,
+                        en4_index_filename(year)
+                    ))
+
+    if cache is not None:
+        cache.evict()
+
+    with stage('en4.merge'):
+        nc = merge_argo_en4(selected)
+
+        if nc is not None:
+            count(rows=nc['N_PROF'].size)
+
+    return nc
+
+def en4_encoding(
+    nc,
+    fmt='netcdf',
+    chunk_profiles=512,
+    complevel=4
+):
+    """
+    Get the encoding that chunks and compresses each variable of nc.
+
+    Chunks are aligned to N_PROF: each one holds whole profiles (all levels), so reading a profile touches a single chunk.
+
+    Parameters
+    ----------
+    nc: xarray.Dataset
+        EN4 profiles
+    fmt: string
+        Output format, "netcdf" or "zarr"
+    chunk_profiles: integer
+        Number of profiles per chunk. The default value is 512.
+    complevel: integer
+        zlib compression level of NetCDF files. The default value is 4.
+
+    Returns
+    -------
+    encoding: dict
+        Variables name as keys and their encoding as values
+    """
+    encoding = dict()
+
+    for name, var in nc.data_vars.items():
+        chunks = tuple(
+            min(chunk_profiles, max(size, 1))
+            if dim == 'N_PROF' else size
+            for dim, size in zip(var.dims, var.shape)
+        )
+
+        if fmt == 'zarr':
+            encoding[name] = {'chunks': chunks}
+            continue
+
+        encoding[name] = {
+            'zlib': True,
+            'complevel': complevel,
+        }
+
+        # Fixed-size strings gain an extra char
+        # dimension on disk, so their chunks are
+        # left to the NetCDF library
+        if var.dtype.kind != 'S':
+            encoding[name]['chunksizes'] = chunks
+
+    return encoding
+
+def append_argo_en4_netcdf(nc, filepath):
+    """
+    Append profiles of nc along the unlimited N_PROF dimension of an existing NetCDF file written by write_argo_en4.
+    """
+    with netCDF4.Dataset(filepath, 'a') as out:
+        start = out.dimensions['N_PROF'].size
+
+        for name, out_var in out.variables.items():
+            if name not in nc or out_var.dimensions[:1] != ('N_PROF',):
+                continue
+
+            var = nc[name].variable.copy(deep=False)
+
+            # Encode values just as they were
+            # encoded in the existing file
+            var.encoding = {
+                attr: out_var.getncattr(attr)
+                for attr in ('units', 'calendar', '_FillValue')
+                if attr in out_var.ncattrs()
+            }
+            var = xr.conventions.encode_cf_variable(var)
+
+            if var.dtype.kind == 'S':
+                var = xr.coding.strings.CharacterArrayCoder().encode(var)
+
+            values = var.values
+
+            # Char arrays must fill the string
+            # dimension of the file
+            if values.ndim < out_var.ndim:
+                values = values[..., np.newaxis]
+
+            out_var.set_auto_maskandscale(False)
+            out_var[start:start + values.shape[0]] = values
+
+def argo_en4_shape(nc):
+    """
+    Get the dimension sizes, but N_PROF, and the string widths of EN4 profiles.
+
+    Returns
+    -------
+    sizes: dict
+        Dimensions name as keys and their sizes as values
+    widths: dict
+        Fixed-size string variables name as keys and their number of characters as values
+    """
+    sizes = {
+        dim: size
+        for dim, size in nc.sizes.items()
+        if dim != 'N_PROF'
+    }
+    widths = {
+        name: var.dtype.itemsize
+        for name, var in nc.variables.items()
+        if var.dtype.kind == 'S'
+    }
+
+    return sizes, widths
+
+def pad_argo_en4(nc, sizes, widths):
+    """
+    Pad EN4 profiles to larger dimension sizes and string widths (see argo_en4_shape), so they can be stored with profiles of that shape.
+
+    Padded levels are missing values (NaN, NaT or empty strings). The encoding of each variable is reduced to its units, calendar and fill value, so the padded profiles are written with the new shape.
+
+    Returns
+    -------
+    nc: xarray.Dataset
+    """
+    variables = dict()
+
+    for name, var in nc.variables.items():
+        values = var.values
+
+        if widths.get(name, 0) > values.dtype.itemsize and values.dtype.kind == 'S':
+            values = values.astype('S{0}'.format(widths[name]))
+
+        pads = [
+            (0, max(0, sizes.get(dim, size) - size))
+            if dim != 'N_PROF' else (0, 0)
+            for dim, size in zip(var.dims, var.shape)
+        ]
+
+        if any(after for _, after in pads):
+            if values.dtype.kind == 'f':
+                fill = np.nan
+            elif values.dtype.kind == 'M':
+                fill = np.datetime64('NaT')
+            elif values.dtype.kind == 'S':
+                fill = b''
+            else:
+                fill = var.encoding.get('_FillValue', 0)
+
+            values = np.pad(
+                values,
+                pads,
+                constant_values=fill
+            )
+
+        padded = xr.Variable(
+            var.dims,
+            values,
+            attrs=var.attrs
+        )
+        padded.encoding = {
+            attr: var.encoding[attr]
+            for attr in ('units', 'calendar', '_FillValue')
+            if attr in var.encoding
+        }
+
+        # Strings of the same width share their
+        # char dimension on disk
+        if values.dtype.kind == 'S':
+            padded.encoding['char_dim_name'] = 'STRING{0}'.format(
+                values.dtype.itemsize
+            )
+
+        variables[name] = padded
+
+    return xr.Dataset(
+        {name: variables[name] for name in nc.data_vars},
+        coords={name: variables[name] for name in nc.coords},
+        attrs=nc.attrs
+    )
+
+def profile_keys(nc):
+    """
+    Get the platform, time and position of each profile, to find profiles already saved.
+
+    Returns
+    -------
+    keys: list
+        Tuples (platform, time, latitude, longitude)
+    """
+    platform = nc['PLATFORM_NUMBER'].values.astype(str)
+
+    return list(zip(
+        np.char.strip(platform).tolist(),
+        nc['JULD'].values.tolist(),
+        nc['LATITUDE'].values.tolist(),
+        nc['LONGITUDE'].values.tolist()
+    ))
+
+def write_argo_en4(
+    nc,
+    path,
+    fmt='netcdf',
+    chunk_profiles=512,
+    append=False
+):
+    """
+    Save EN4 profiles as a chunked and compressed NetCDF4 file or Zarr store.
+
+    Parameters
+    ----------
+    nc: xarray.Dataset
+        EN4 profiles
+    path: string
+        Output path, without extension
+    fmt: string
+        "netcdf" (default) or "zarr"
+    chunk_profiles: integer
+        Number of profiles per chunk. The default value is 512.
+    append: bool
+        If True and the output already exists, the profiles not saved yet (the ones from the last saved time on, but the ones already saved) are appended to it. Profiles with fewer levels or shorter strings than the saved ones are padded. When they have more levels or longer strings, the output is written again with all profiles padded to the new shape.
+
+    Returns
+    -------
+    filepath: string
+        Path of the written file or store
+    """
+    filepath = path + ('.zarr' if fmt == 'zarr' else '.nc')
+
+    if append and os.path.exists(filepath):
+        if fmt == 'zarr':
+            saved = xr.open_zarr(filepath)
+        else:
+            saved = xr.open_dataset(filepath)
+
+        with saved:
+            juld = saved['JULD'].values
+            saved_shape = argo_en4_shape(saved)
+            saved_keys = set()
+
+            if juld.size:
+                last_time = juld.max()
+                # Profiles at the last saved time
+                # may share it with new ones
+                saved_keys = set(profile_keys(saved.isel(
+                    N_PROF=np.flatnonzero(juld == last_time)
+                )))
+                nc = nc.isel(
+                    N_PROF=np.flatnonzero(nc['JULD'].values >= last_time)
+                )
+
+            nc = nc.isel(N_PROF=[
+                i for i, key in enumerate(profile_keys(nc))
+                if key not in saved_keys
+            ])
+
+            if nc['N_PROF'].size == 0:
+                return filepath
+
+            sizes, widths = argo_en4_shape(nc)
+            fits = all(
+                size <= saved_shape[0].get(dim, -1)
+                for dim, size in sizes.items()
+            ) and all(
+                width <= saved_shape[1].get(name, -1)
+                for name, width in widths.items()
+            )
+
+            if not fits:
+                # New profiles are larger: all of
+                # them are written again
+                sizes = {
+                    dim: max(size, saved_shape[0].get(dim, 0))
+                    for dim, size in {**saved_shape[0], **sizes}.items()
+                }
+                widths = {
+                    name: max(width, saved_shape[1].get(name, 0))
+                    for name, width in {**saved_shape[1], **widths}.items()
+                }
+                nc = merge_argo_en4([
+                    pad_argo_en4(saved.load(), sizes, widths),
+                    pad_argo_en4(nc, sizes, widths),
+                ])
+
+        if not fits:
+            # Written beside the output and moved
+            # over it at once
+            tmp_path = write_argo_en4(
+                nc,
+                path + '.tmp',
+                fmt,
+                chunk_profiles
+            )
+
+            if fmt == 'zarr':
+                shutil.rmtree(filepath)
+
+            os.replace(tmp_path, filepath)
+
+            return filepath
+
+        nc = pad_argo_en4(nc, *saved_shape)
+
+        if fmt == 'zarr':
+            nc.to_zarr(
+                filepath,
+                append_dim='N_PROF',
+                consolidated=True
+            )
+        else:
+            append_argo_en4_netcdf(nc, filepath)
+
+        return filepath
+
+    encoding = en4_encoding(
+        nc,
+        fmt,
+        chunk_profiles
+    )
+
+    if fmt == 'zarr':
+        nc.to_zarr(
+            filepath,
+            mode='w',
+            encoding=encoding,
+            consolidated=True
+        )
+    else:
+        # Unlimited N_PROF allows later appends
+        nc.to_netcdf(
+            filepath,
+            format='NETCDF4',
+            engine='netcdf4',
+            encoding=encoding,
+            unlimited_dims=['N_PROF']
+        )
+
+    return filepath
+
+def save_argo_en4(
+    nc,
     obsdir,
-    timemin,
-    timemax
-)
-nc = xr.open_mfdataset(
-    argo_files,
-    concat_dim='N_PROF',
-    combine='nested',
-    engine='netcdf4'
-)
-# Drop N_HISTORY dimension and associated
-# variables because its shape (empty) caused
-# a lot of trouble to use the where function
-nc = nc.drop_dims(
-    'N_HISTORY'
-)
-# Select data inside desired area and time
-# and drop all outside of it
-nc = nc.where(
-    (nc.LONGITUDE >= lonmin) &
-    (nc.LONGITUDE <= lonmax) &
-    (nc.LATITUDE >= latmin) &
-    (nc.LATITUDE <= latmax) &
-    (nc.JULD >= timemin) &
-    (nc.JULD <= timemax),
-    drop=True
-)
-# Mask all data from other than ARGO project
-# The symbol inside astype func means get
-# just the first four values in the string
-argo_mask = nc['PROJECT_NAME'].astype('|S4') == b'ARGO'
-
-# Select just data from ARGO. Descided to
-# mask the dataset by N_PROF dimension
-# because it is the PROJECT_NAME dim
-nc = nc.sel(
-    N_PROF = argo_mask
-)
-if nc['N_PROF'].size > 0:
+    output_format='netcdf',
+    chunk_profiles=512,
+    append=False
+):
+    """
+    Save EN4 profiles as argo_en4 in obsdir (see write_argo_en4).
+
+    Returns
+    -------
+    filepaths: list
+        Paths of the written files
+    """
+    if nc is None or nc['N_PROF'].size == 0:
+        print((
+            '>>>> Not available ARGO data' +
+            ' from EN4 for the desired area ' +
+            'and time'
+        ))
+
+        return list()
+
     print((
         '>>>> Getting ARGO data from EN4' +
         ' for {0} profiles').format(
@@ -191,26 +1147,285 @@ if nc['N_PROF'].size > 0:
         "ignore",
         category=xr.SerializationWarning
     )
-    nc.to_netcdf(
-        os.path.join(
-            obsdir,
-            'argo_en4.nc'
-    ))
-else:
-    print((
-        '>>>> Not available ARGO data' +
-        ' from EN4 for the desired area ' +
-        'and time'
-    ))
+    with stage('en4.write'):
+        filepath = write_argo_en4(
+            nc,
+            os.path.join(
+                obsdir,
+                'argo_en4'
+            ),
+            output_format,
+            chunk_profiles,
+            append
+        )
+        count(
+            rows=nc['N_PROF'].size,
+            bytes=path_size(filepath)
+        )
+
+    return [filepath]
+
+def run_batch(
+    regions,
+    workers=4,
+    cache_dir=None,
+    cache_size_gb=20,
+    output_format='netcdf',
+    chunk_profiles=512,
+    catalogue_dir=None,
+    download_segments=4,
+    index_dir=None,
+    append=False
+):
+    """
+    Download ARGO profiles from EN4 of many regions at once and save the profiles of each region in its own folder.
+
+    Each EN4 month needed by any region is downloaded and read just once. The profiles inside the smallest area and time holding all regions are kept in memory, and then each region is cut from them.
+
+    Parameters
+    ----------
+    regions: dict
+        Regions name as keys and dicts as values, with obsdir (folder where the region files are saved) and the region limits: lonmin, lonmax, latmin, latmax, timemin and timemax
+    workers: integer
+        Number of months processed at the same time. The default workers value is 4.
+    cache_dir: string or None
+        Folder of the cache of EN4 files. The default is cache/en4 inside the data folder of the first region.
+    cache_size_gb: float
+        Maximum size of the cache, in GB. 0 disables the cache. The default value is 20.
+    output_format: string
+        "netcdf" (default) or "zarr"
+    chunk_profiles: integer
+        Number of profiles per chunk. The default value is 512.
+    catalogue_dir: string or None
+        Folder of the EN4 path cache. The default is cache/catalogue inside the data folder of the first region.
+    download_segments: integer
+        Maximum number of byte ranges of a yearly zip file downloaded at the same time. The default value is 4.
+    index_dir: string or None
+        Folder of the EN4 profile indices. The default is cache/en4_index inside the data folder of the first region.
+    append: bool
+        If True the profiles are appended to the argo_en4 output already saved in each region folder, instead of replacing it (see write_argo_en4). The default is False.
 
-# Delete global files
-for file in argo_files:
-    try:
-        os.remove(
-            file
+    Returns
+    -------
+    filepaths: dict
+        Regions name as keys and the paths of their written files as values
+    """
+    # Temporary zip files are kept in the folder
+    # of the first region
+    dir2save = next(iter(regions.values()))['obsdir']
+    cache = None
+
+    if cache_size_gb > 0:
+        cache = FileCache(
+            cache_dir or cache_path(dir2save, 'en4'),
+            max_size=int(cache_size_gb * 2**30)
         )
-    except:
-        print(
-            "Error while deleting file : ",
-            file
+    en4_dir = load_en4_path(
+        catalogue_dir or cache_path(dir2save, 'catalogue')
+    )
+    index_dir = index_dir or cache_path(dir2save, 'en4_index')
+    # Months needed by any region. Months in
+    # gaps between regions are not read
+    months_by_year = dict()
+
+    for region in regions.values():
+        for year, months in get_months_by_year(
+            region['timemin'],
+            region['timemax']).items():
+
+            months_by_year.setdefault(year, set()).update(months)
+
+    months_by_year = {
+        year: sorted(months_by_year[year])
+        for year in sorted(months_by_year)
+    }
+    union = union_limits(
+        regions.values()
+    )
+    ############################################
+    # IMPORTING AND MANIPULATING DATA ##########
+    ############################################
+    nc = get_argo_en4_data(
+        en4_dir,
+        dir2save,
+        union['lonmin'],
+        union['lonmax'],
+        union['latmin'],
+        union['latmax'],
+        union['timemin'],
+        union['timemax'],
+        workers,
+        cache,
+        months_by_year,
+        download_segments,
+        index_dir
+    )
+    filepaths = dict()
+
+    for name, region in regions.items():
+        region_nc = None
+
+        if nc is not None:
+            region_nc = nc.isel(
+                N_PROF=select_argo_profiles(
+                    nc,
+                    region['lonmin'],
+                    region['lonmax'],
+                    region['latmin'],
+                    region['latmax'],
+                    region['timemin'],
+                    region['timemax']
+            ))
+
+        filepaths[name] = save_argo_en4(
+            region_nc,
+            region['obsdir'],
+            output_format,
+            chunk_profiles,
+            append
         )
+
+    return filepaths
+
+def run(
+    obsdir,
+    lonmin,
+    lonmax,
+    latmin,
+    latmax,
+    timemin,
+    timemax,
+    **options
+):
+    """
+    Download ARGO profiles from EN4 of desired area and time and save them in obsdir.
+
+    Parameters
+    ----------
+    obsdir: string
+        Folder where files are saved
+    lonmin, lonmax, latmin, latmax: float
+        Desired area limits
+    timemin, timemax: datetime
+        Desired time limits
+    options:
+        workers, cache_dir, cache_size_gb, output_format, chunk_profiles, catalogue_dir, download_segments, index_dir and append (see run_batch)
+
+    Returns
+    -------
+    filepaths: list
+        Paths of the written files
+    """
+    region = dict(
+        obsdir=obsdir,
+        lonmin=lonmin,
+        lonmax=lonmax,
+        latmin=latmin,
+        latmax=latmax,
+        timemin=timemin,
+        timemax=timemax
+    )
+
+    return run_batch(
+        {obsdir: region},
+        **options
+    )[obsdir]
+
+def env_options(datadir, environ=None):
+    """
+    Read the options of run and run_batch from the environment variables set by the ponto.input file.
+
+    Parameters
+    ----------
+    datadir: string
+        Data folder, where the local caches are kept by default
+    environ: dict or None
+        Environment variables. The default is os.environ.
+
+    Returns
+    -------
+    options: dict
+        Keyword arguments of run_batch, but regions
+    """
+    if environ is None:
+        environ = os.environ
+
+    return dict(
+        # Months processed at the same time
+        workers=int(
+            environ.get(
+              'EN4_WORKERS',
+              4
+        )),
+        # Cache of EN4 yearly zip files and
+        # monthly files. A size of 0 disables it
+        cache_dir=environ.get(
+            'EN4_CACHE_DIR',
+            os.path.join(datadir, 'cache', 'en4')
+        ),
+        cache_size_gb=float(
+            environ.get(
+              'EN4_CACHE_SIZE_GB',
+              20
+        )),
+        # Output format ("netcdf" or "zarr") and
+        # number of profiles per chunk
+        output_format=environ.get(
+            'EN4_OUTPUT_FORMAT',
+            'netcdf'
+        ),
+        chunk_profiles=int(
+            environ.get(
+              'EN4_CHUNK_PROFILES',
+              512
+        )),
+        # Append new profiles to the saved
+        # output instead of replacing it
+        append=environ.get(
+            'EN4_APPEND',
+            'no'
+        ) == 'yes',
+        # Parallel byte ranges of each yearly zip
+        # file download
+        download_segments=int(
+            environ.get(
+              'EN4_DOWNLOAD_SEGMENTS',
+              4
+        )),
+        catalogue_dir=os.path.join(
+            datadir,
+            'cache',
+            'catalogue'
+        ),
+        # Profile index of each EN4 year, to
+        # skip months without profiles inside
+        # the limits
+        index_dir=os.path.join(
+            datadir,
+            'cache',
+            'en4_index'
+        ),
+    )
+
+def env_params(obsdir, environ=None):
+    """
+    Read the arguments of run from the environment variables set by the ponto.input file.
+
+    Returns
+    -------
+    params: dict
+        Keyword arguments of run
+    """
+    return dict(
+        obsdir=obsdir,
+        **read_limits(environ),
+        **env_options(
+            os.path.dirname(obsdir),
+            environ
+        )
+    )
+
+if __name__ == '__main__':
+    run(**env_params(
+        os.environ['DATATYPE_DIR']
+    ))
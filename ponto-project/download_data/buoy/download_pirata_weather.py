@@ -7,13 +7,57 @@
 #            desired area and time
 
 import os
+import io
+import re
+import sys
+import bisect
 import gzip
 import json
+import queue
+import ftplib
+import shutil
+import threading
+import zlib
 
+import numpy as np
 import pandas as pd
 import ftputil as ftp
+import ftputil.session
 
 from datetime import datetime
+from concurrent.futures import (
+    as_completed,
+    ThreadPoolExecutor,
+    ProcessPoolExecutor
+)
+
+# Make the ponto_utils package, shared by all
+# data types, importable
+sys.path.append(
+    os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)
+)))
+
+from ponto_utils.sync import (
+    TAIL_OVERLAP,
+    SyncManifest,
+    tail_marker,
+    split_appended,
+)
+from ponto_utils.metrics import stage, count
+from ponto_utils.processes import process_context
+from ponto_utils.catalogue import load_stations
+from ponto_utils.storage import write_output
+from ponto_utils.settings import (
+    read_limits,
+    cache_path,
+    union_limits,
+)
+from ponto_utils.frames import (
+    join_frames,
+    stack_frames,
+    downcast_floats,
+)
 
 ############################################
 # SET SOME FUNCTIONS AND/OR VARIABLES ######
@@ -23,7 +67,8 @@ def spatial_filter(
     lonmax=8.,
     latmin=-63.,
     latmax=21.,
-    responsible='PIRATA'
+    responsible='PIRATA',
+    cache_dir=None
     ):
     '''
     Select weather buoys in expanded South Atlantic by area and institution of responsability.
@@ -44,6 +89,8 @@ def spatial_filter(
         Maximum value of latitude for the weather buoy search area. The default latmax value is 21.0.
     responsible: string
         Institution responsible by buoy maintenance. This value must be in agreement with one of the values of the responsible column of database (https://github.com/douglasnehme/data-misc/blob/main/ocean_fixed_stations.csv).
+    cache_dir: string or None
+        Folder where the database is kept between runs, so it is downloaded again only when changed. The default None downloads it on every call.
 
     Returns
     -------
@@ -51,26 +98,16 @@ def spatial_filter(
         Database rows of buoys that was inside desired area and are maintained by chosen institution
     '''
     
-    database_path = (
-        'https://raw.githubusercontent' +
-        '.com/douglasnehme/data-misc/' +
-        'main/ocean_fixed_stations.csv'
+    stations = load_stations(
+        cache_dir
     )
-    database = pd.read_csv(
-        database_path,
-        sep=',',
-        header=0,
-        na_values=-9999.00
+    database = stations.query(
+        lonmin,
+        lonmax,
+        latmin,
+        latmax,
+        responsible
     )
-    database = database[
-        database.responsible == responsible
-    ]
-    database = database[
-        (database.lon >= lonmin) &
-        (database.lon <= lonmax) &
-        (database.lat >= latmin) &
-        (database.lat <= latmax)
-    ]
 
     return database
 
@@ -124,17 +161,260 @@ def drop_QSID(columns_names):
 
     return cols2stay
 
-def handle_pirata_metadata(filepath):
+def QSID_kind(name):
     '''
-    
+    Kind of a quality, source or instrument column name ('Q', 'S' or 'ID'), or None for other columns.
+    '''
+    for kind in ('ID', 'Q', 'S'):
+        if name == kind * (len(name) // len(kind)):
+            return kind
+
+    return None
+
+def unpack_QSID(df, depths, flags='uint8'):
+    '''
+    Split the packed quality, source and instrument columns of a data block into one column per depth.
+
+    In PIRATA files the codes of all depths are packed in a single field (e.g. '22' for two depths with quality 2), so Q and S columns are split in one digit per depth. ID columns are split in equal parts, one per depth, when possible.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        Data block read with Q, S and ID columns as strings. It is changed in place.
+    depths: tuple
+        Depths of the block, used as columns suffix
+    flags: string
+        'uint8' to keep Q and S codes as nullable 8-bit integers (pandas UInt8) or 'category' to keep them as categoricals of the code characters ('0' to '9'). ID codes are always categoricals.
+
+    Returns
+    -------
+    df: pandas.DataFrame
+        Block with Q_<depth>, S_<depth> and ID_<depth> columns in place of the packed ones
+    '''
+    for column in list(df.columns):
+        kind = QSID_kind(column)
+
+        if kind is None:
+            continue
+
+        values = df.pop(column).fillna('').to_numpy(
+            dtype=str
+        )
+        missing = values == ''
+        ndepths = len(column) // len(kind)
+
+        if len(depths) == ndepths:
+            suffixes = depths
+        else:
+            suffixes = [
+                str(i + 1) for i in range(ndepths)
+            ]
+
+        if kind == 'ID':
+            lengths = np.char.str_len(values)
+            width = lengths.max(initial=0) // ndepths
+
+            # Codes that can not be split
+            # by depth are kept together
+            if not width or np.any(
+                lengths[lengths > 0] != width * ndepths):
+                df['ID'] = pd.Categorical(
+                    np.where(missing, None, values)
+                )
+                continue
+
+            for i, suffix in enumerate(suffixes):
+                df['ID_' + suffix] = pd.Categorical([
+                    value[i*width:(i+1)*width] or None
+                    for value in values
+                ])
+            continue
+
+        # Drop decimals erroneously inserted
+        # and restore the leading zeros
+        codes = np.char.partition(
+            values.astype(bytes),
+            b'.'
+        )[:, 0]
+        codes = np.char.zfill(codes, ndepths).astype(
+            'S{0}'.format(ndepths)
+        )
+        digits = codes.view(np.uint8).reshape(
+            -1,
+            ndepths
+        ) - ord('0')
+
+        for i, suffix in enumerate(suffixes):
+            # Characters other than digits
+            invalid = (digits[:, i] > 9) | missing
+
+            if flags == 'category':
+                code = pd.Categorical.from_codes(
+                    np.where(invalid, -1, digits[:, i]),
+                    categories=list('0123456789')
+                )
+            else:
+                code = pd.array(
+                    digits[:, i],
+                    dtype='UInt8'
+                )
+                code[invalid] = pd.NA
+
+            df[kind + '_' + suffix] = code
+
+    return df
+
+def read_pirata_file(filepath):
+    '''
+    Decompress a PIRATA .gz file in a single pass.
+
+    The returned buffer can be shared by handle_pirata_metadata and handle_pirata_data, so each file is decompressed only once.
+
+    Parameters
+    ----------
+    filepath: string
+        Path of the PIRATA .gz file
+
+    Returns
+    -------
+    content: bytes
+        Decompressed file content
+    '''
+
+    with gzip.open(filepath, 'rb') as fh:
+        content = fh.read()
+
+    return content
+
+def parse_pirata_time_range(line):
+    '''
+    Get the first and last time steps of a data block from its "Time:" header line.
+
+    Parameters
+    ----------
+    line: string
+        Header line like "Time: 1200 20 Mar 1997 to 1200 2 Jul 1998 (index 1 to 11473, 11473 times)"
+
+    Returns
+    -------
+    time_range: tuple
+        First and last time steps as YYYYMMDDHHMM strings, or an empty tuple if the line could not be parsed
+    '''
+    match = re.search(
+        r'(\d{4}\s+\d{1,2}\s+\w{3}\s+\d{4})\s+to\s+' +
+        r'(\d{4}\s+\d{1,2}\s+\w{3}\s+\d{4})',
+        line
+    )
+
+    if match is None:
+        return ()
+
+    try:
+        return tuple(
+            datetime.strptime(
+                ' '.join(group.split()),
+                '%H%M %d %b %Y'
+            ).strftime('%Y%m%d%H%M')
+            for group in match.groups()
+        )
+    except ValueError:
+        return ()
+
+# Header lines start with one of these words
+# (after blanks)
+PIRATA_HEADER = re.compile(
+    rb'Location:|Units:|Time:|Index:|Depth|Height|YYYYMMDD HHMM'
+)
+
+def find_pirata_headers(content):
+    '''
+    Find the header lines of a PIRATA file without going through its data rows in Python.
+
+    The first non-blank byte of every line is found with numpy. Data rows start with a digit, so only lines starting with an uppercase letter are checked against PIRATA_HEADER.
+
+    Parameters
+    ----------
+    content: bytes
+        Decompressed file content
+
+    Returns
+    -------
+    headers: list
+        Tuples (line number, line) of each header line, with line as a string without the leading blanks
+    line_starts: numpy.ndarray
+        Byte offset where each line starts, plus len(content) as last item
+    '''
+    buf = np.frombuffer(content, dtype=np.uint8)
+    size = len(content)
+
+    line_starts = np.concatenate((
+        [0],
+        np.flatnonzero(buf == ord('\n')) + 1,
+        [size]
+    ))
+    # Offset of the first non-blank byte of
+    # each line, moving forward just the lines
+    # still on a blank
+    blank = np.zeros(256, dtype=bool)
+    blank[list(b' \t\r\f\v')] = True
+
+    first = line_starts[:-1].copy()
+    moving = np.flatnonzero(first < size)
+
+    while moving.size:
+        moving = moving[blank[buf[first[moving]]]]
+        first[moving] += 1
+        moving = moving[first[moving] < size]
+
+    inside = first < size
+    candidates = np.flatnonzero(inside)[
+        (buf[first[inside]] >= ord('A')) &
+        (buf[first[inside]] <= ord('Z'))
+    ]
+
+    headers = list()
+
+    for linenum in candidates.tolist():
+        if PIRATA_HEADER.match(content, first[linenum]):
+            line = content[
+                first[linenum]:
+                line_starts[linenum+1]
+            ]
+            headers.append((
+                linenum,
+                line.rstrip(b'\n').decode('utf-8', errors='replace')
+            ))
+
+    return headers, line_starts
+
+def handle_pirata_metadata(filepath, content=None):
     '''
+    Read the file header and the header of each data block of a PIRATA file.
 
-    fh = gzip.open(
-        filepath,
-        'rt'
-    ).read()
+    Only the header lines found by find_pirata_headers are decoded and parsed, never the data rows.
+
+    Parameters
+    ----------
+    filepath: string
+        Path of the PIRATA .gz file
+    content: bytes or None
+        Decompressed file content. If None the file is read.
+
+    Returns
+    -------
+    meta: dict
+        File metadata (see the comments of each key below)
+    '''
+
+    if content is None:
+        content = read_pirata_file(
+            filepath
+        )
+
+    headers, line_starts = find_pirata_headers(
+        content
+    )
 
-    linenum = 0
     meta = {
         # tuple with line numbers of file header
         'file_header': (),
@@ -146,20 +426,27 @@ def handle_pirata_metadata(filepath):
         'depth': [()],
         # columns name for each data block
         'cols_name': [()],
+        # list of tuples with first and last
+        # time steps (YYYYMMDDHHMM) of each
+        # data block
+        'time_range': [()],
+        # list of tuples with first and last
+        # (exclusive) byte offsets of the data
+        # rows of each block in the
+        # decompressed file
+        'data_offsets': [],
         # data unit
         'units': None,
         # NaN value
         'nan': None,
         # lines in the file
-        'lines': None,
+        'lines': len(line_starts) - 1,
         # list of extra info
         'extra': [],
     }
     
     # Extract metadata
-    for line in fh.split('\n'):
-        line = line.lstrip()
-
+    for linenum, line in headers:
         if line.startswith('Location:'):
             meta['file_header'] += (linenum,)
 
@@ -188,6 +475,9 @@ def handle_pirata_metadata(filepath):
 
         if line.startswith('Time:'):
             meta['block_headers'][-1] += (linenum,)
+            meta['time_range'][-1] = parse_pirata_time_range(
+                line
+            )
 
         if line.startswith('Index:'):
             meta['block_headers'][-1] += (linenum,)
@@ -226,79 +516,726 @@ def handle_pirata_metadata(filepath):
             meta['block_headers'].append(())
             meta['cols_name'].append(())
             meta['depth'].append(())
-
-        linenum += 1
-
-    meta['lines'] = linenum
+            meta['time_range'].append(())
 
     # Remove empty tuples
     meta['block_headers'].pop(-1)
     meta['cols_name'].pop(-1)
     meta['depth'].pop(-1)
+    meta['time_range'].pop(-1)
+
+    # Data rows are the lines between the
+    # columns name line of a block and the
+    # first header line of the next one
+    for i, header in enumerate(meta['block_headers']):
+        if i+1 < len(meta['block_headers']):
+            last_line = meta['block_headers'][i+1][0]
+        else:
+            last_line = meta['lines']
+
+        meta['data_offsets'].append((
+            int(line_starts[header[-1] + 1]),
+            int(line_starts[last_line])
+        ))
 
     return meta
 
-def handle_pirata_data(filepath, meta):
+def pirata_times(dates, hours):
     '''
-    
+    Build the time steps of PIRATA rows from their YYYYMMDD and HHMM fields.
+
+    The time steps are computed with numpy datetime arithmetic instead of parsing a string per row.
+
+    Parameters
+    ----------
+    dates: numpy.ndarray
+        YYYYMMDD field of the rows as integers
+    hours: numpy.ndarray
+        HHMM field of the rows as integers
+
+    Returns
+    -------
+    index: pandas.DatetimeIndex
+        Time steps named datetime
+
+    Raises
+    ------
+    ValueError
+        If a row has an invalid date or time
     '''
-    # Open each data block separatelly and
-    # then concatenate
-    data = pd.DataFrame()
+    dates = np.asarray(dates, dtype='int64')
+    hours = np.asarray(hours, dtype='int64')
+
+    if not dates.size:
+        return pd.DatetimeIndex([], name='datetime')
+
+    months = (
+        (dates // 10000 - 1970) * 12 +
+        dates // 100 % 100 - 1
+    ).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + (dates % 100 - 1)
+
+    # Days out of their month (e.g. 20000230)
+    # would roll over to the next month
+    if (
+        (dates // 100 % 100 < 1).any() or
+        (dates // 100 % 100 > 12).any() or
+        (dates % 100 < 1).any() or
+        (days.astype('datetime64[M]') != months).any() or
+        (hours // 100 > 23).any() or
+        (hours % 100 > 59).any() or
+        (hours < 0).any()):
+
+        raise ValueError('invalid PIRATA date or time')
+
+    return pd.DatetimeIndex(
+        (
+            days.astype('datetime64[m]') +
+            (hours // 100 * 60 + hours % 100)
+        ).astype('datetime64[ns]'),
+        name='datetime'
+    )
 
-    dt_parser = lambda x: datetime.strptime(
-        x,
-        '%Y%m%d %H%M')
+def handle_pirata_data(
+    filepath,
+    meta,
+    content=None,
+    timemin=None,
+    timemax=None,
+    flags=None,
+    downcast=False):
+    '''
+    Read the data blocks of a PIRATA file.
 
-    for i in range(len(meta['block_headers'])):
-        current_block = meta['block_headers'][i]
-        
-        if i+1 < len(meta['block_headers']):
-            next_block = meta['block_headers'][i+1]
-        else:
-            next_block = [meta['lines']]
+    When timemin and/or timemax are given, blocks whose header time range is out of the window are skipped and, as rows are in chronological order, just the rows inside the window are read from each block.
+
+    Parameters
+    ----------
+    filepath: string
+        Path of the PIRATA .gz file
+    meta: dict
+        The return of the function handle_pirata_metadata
+    content: bytes or None
+        Decompressed file content. If None the file is read.
+    timemin: datetime or None
+        First time step of desired data. None means no limit.
+    timemax: datetime or None
+        Last time step of desired data. None means no limit.
+    flags: string or None
+        How to keep quality, source and instrument codes (see unpack_QSID): 'uint8', 'category' or None to drop them. The default is to drop them.
+    downcast: bool
+        If True measurement columns are converted to float32 where no precision is lost
+
+    Returns
+    -------
+    data: pandas.DataFrame
+        File data with datetime index. It has the measurement columns of every block of the file, in file order, even when the blocks holding some of them are out of the time window (their values are NaN). Flag columns, when kept, come after them.
+    '''
+    if content is None:
+        content = read_pirata_file(
+            filepath
+        )
 
-        skip_rows = range(current_block[-1])
-        skip_footer = meta['lines'] - next_block[0]
+    # Desired time as YYYYMMDDHHMM integers,
+    # the same resolution of PIRATA rows
+    key_min, key_max = None, None
+
+    if timemin is not None:
+        key_min = int(
+            pd.Timestamp(timemin).ceil('min').strftime('%Y%m%d%H%M')
+        )
+    if timemax is not None:
+        key_max = int(
+            pd.Timestamp(timemax).floor('min').strftime('%Y%m%d%H%M')
+        )
+
+    def line_key(line_starts, linenum):
+        # First two fields of a data row are
+        # YYYYMMDD and HHMM. Lines that are not
+        # rows (e.g. blank) go after all rows
+        fields = content[
+            line_starts[linenum]:
+            line_starts[linenum] + 32
+        ].split(None, 2)
+
+        try:
+            return int(fields[0] + fields[1])
+        except (IndexError, ValueError):
+            return float('inf')
+
+    time_ranges = meta.get('time_range', [])
+
+    # Open each data block separatelly and
+    # then stack all of them at once
+    blocks = list()
+
+    for i in range(len(meta['block_headers'])):
+        # Data rows of each block are sliced
+        # straight from the decompressed buffer
+        # and read by the C engine
+        start, end = meta['data_offsets'][i]
+
+        # Skip blocks out of desired time using
+        # the time range of their header
+        if i < len(time_ranges) and time_ranges[i]:
+            block_start, block_end = map(int, time_ranges[i])
+
+            if key_max is not None and block_start > key_max:
+                continue
+            if key_min is not None and block_end < key_min:
+                continue
+
+        # Rows are in chronological order, so the
+        # rows inside desired time are found by
+        # binary search on the lines of the block
+        if key_min is not None or key_max is not None:
+            line_starts = start + np.concatenate((
+                [0],
+                np.flatnonzero(np.frombuffer(
+                    content,
+                    dtype=np.uint8,
+                    count=end - start,
+                    offset=start
+                ) == ord('\n')) + 1
+            ))
+            if line_starts[-1] != end:
+                line_starts = np.append(line_starts, end)
+
+            first_line, last_line = 0, len(line_starts) - 1
+
+            if key_min is not None:
+                first_line = bisect.bisect_left(
+                    range(len(line_starts)),
+                    key_min,
+                    lo=first_line,
+                    hi=last_line,
+                    key=lambda j: line_key(line_starts, j)
+                )
+            if key_max is not None:
+                last_line = bisect.bisect_right(
+                    range(len(line_starts)),
+                    key_max,
+                    lo=first_line,
+                    hi=last_line,
+                    key=lambda j: line_key(line_starts, j)
+                )
+
+            start = line_starts[first_line]
+            end = line_starts[last_line]
+
+        block = content[start:end]
+
+        # Blocks without any data row
+        if not block.strip():
+            continue
 
         current_names = meta['cols_name'][i]
-        cols2use = drop_QSID(current_names)
+
+        if flags is None:
+            cols2use = drop_QSID(current_names)
+        else:
+            cols2use = current_names
         
         df = pd.read_csv(
-            filepath,
-            compression='gzip',
-            engine='python',
+            io.BytesIO(block),
+            engine='c',
             sep='\s+',
-            header=0,
+            header=None,
             names=current_names,
             usecols=cols2use,
-            skiprows=skip_rows,
-            skipfooter=skip_footer,
             na_values=meta['nan'],
-            parse_dates={
-                'datetime': [
-                    'YYYYMMDD',
-                    'HHMM'
-            ]},
-            date_parser=dt_parser,
-            index_col='datetime',
+            # Packed codes as strings to keep
+            # their leading zeros
+            dtype={
+                **{
+                    name: str
+                    for name in cols2use
+                    if QSID_kind(name)
+                },
+                'YYYYMMDD': 'int64',
+                'HHMM': 'int64',
+            },
         )
-        data = pd.concat(
-            [data, df],
-            join='outer',
-            axis='index'
+        df.index = pirata_times(
+            df.pop('YYYYMMDD').values,
+            df.pop('HHMM').values
         )
 
+        if flags is not None:
+            unpack_QSID(
+                df,
+                meta['depth'][i],
+                flags
+            )
+
+        blocks.append(df)
+
+    # Measurement columns of all blocks, in file
+    # order, so the columns do not depend on the
+    # blocks skipped by the time window
+    columns = list(dict.fromkeys(
+        name
+        for names in meta['cols_name']
+        for name in drop_QSID(names)
+        if name not in ('YYYYMMDD', 'HHMM')
+    ))
+
+    if not blocks:
+        return pd.DataFrame(
+            index=pd.DatetimeIndex([], name='datetime'),
+            columns=columns,
+            dtype='float64'
+        )
+
+    data = stack_frames(blocks)
+
+    # Flag columns of the blocks read go after
+    # the measurements
+    known = set(columns)
+    columns += [
+        column for column in data.columns
+        if column not in known
+    ]
+
+    if list(data.columns) != columns:
+        data = data.reindex(columns=columns)
+
+    if downcast:
+        downcast_floats(data)
+
     return data
 
+def handle_pirata_tail(content, meta):
+    '''
+    Read the headers of the bytes appended to a PIRATA file.
+
+    Rows before the first header continue the last data block of the file. Any header line starts a new block, but the file header (Location and Units lines) means the file was rewritten.
+
+    Parameters
+    ----------
+    content: bytes
+        Decompressed appended bytes
+    meta: dict
+        The return of the function handle_pirata_metadata for the file before the bytes were appended
+
+    Returns
+    -------
+    tail_meta: dict
+        Metadata of content, to be read by handle_pirata_data: its first block holds the rows that continue the last block of the file
+    new_meta: dict
+        meta updated with the appended lines and blocks, as if the whole file was read
+
+    Raises
+    ------
+    ValueError
+        If content does not look like lines appended to the file
+    '''
+    headers, line_starts = find_pirata_headers(
+        content
+    )
+    appended = handle_pirata_metadata(
+        None,
+        content
+    )
+
+    if appended['file_header']:
+        raise ValueError('PIRATA file was rewritten')
+
+    # Bytes of the rows continuing the last
+    # block of the file
+    end = len(content)
+
+    if headers:
+        end = int(line_starts[headers[0][0]])
+
+    rows = content[:end].split()
+    names = meta['cols_name'][-1]
+
+    # Appended lines must start at a line
+    # boundary, with whole rows of the last
+    # block
+    if rows and (
+        len(rows) % len(names) or
+        not re.fullmatch(rb'\d{8}', rows[0]) or
+        not re.fullmatch(rb'\d{4}', rows[1])):
+
+        raise ValueError('PIRATA file did not just grow')
+
+    tail_meta = dict(
+        meta,
+        block_headers=[()] + appended['block_headers'],
+        cols_name=[names] + appended['cols_name'],
+        depth=[meta['depth'][-1]] + appended['depth'],
+        time_range=[()] + appended['time_range'],
+        data_offsets=[(0, end)] + appended['data_offsets'],
+        lines=appended['lines'],
+    )
+
+    # Files end with a line break, so the first
+    # appended line takes the place of the last
+    # (empty) line of the file
+    line_shift = meta['lines'] - 1
+    byte_shift = meta['data_offsets'][-1][1]
+    time_range = list(meta['time_range'])
+
+    if rows and time_range[-1]:
+        last_row = rows[-len(names):]
+        time_range[-1] = (
+            time_range[-1][0],
+            (last_row[0] + last_row[1]).decode()
+        )
+
+    new_meta = dict(
+        meta,
+        block_headers=meta['block_headers'] + [
+            tuple(linenum + line_shift for linenum in header)
+            for header in appended['block_headers']
+        ],
+        cols_name=meta['cols_name'] + appended['cols_name'],
+        depth=meta['depth'] + appended['depth'],
+        time_range=time_range + appended['time_range'],
+        data_offsets=meta['data_offsets'][:-1] + [(
+            meta['data_offsets'][-1][0],
+            byte_shift + end
+        )] + [
+            (start + byte_shift, stop + byte_shift)
+            for start, stop in appended['data_offsets']
+        ],
+        lines=line_shift + appended['lines'],
+    )
+
+    return tail_meta, new_meta
+
+class FTPHostPool:
+    '''
+    Bounded pool of authenticated FTP sessions.
+
+    Sessions are opened on demand, up to size, and handed to one thread at a time, since a ftputil.FTPHost must not be shared between threads.
+
+    Parameters
+    ----------
+    server: string
+        FTP server address
+    user: string
+        User to access the ftp server
+    password: string
+        Password to access the ftp server
+    size: integer
+        Maximum number of simultaneous sessions
+    port: integer
+        FTP server port. The default port value is 21.
+    '''
+
+    def __init__(self, server, user, password, size, port=21):
+        self.server = server
+        self.user = user
+        self.password = password
+        self.size = size
+        self.session_factory = ftputil.session.session_factory(
+            base_class=ftplib.FTP,
+            port=port
+        )
+        self._idle = queue.LifoQueue()
+        self._opened = list()
+        self._slots = threading.Semaphore(size)
+
+    def acquire(self):
+        # Wait for a free slot and reuse an idle
+        # session if there is one
+        self._slots.acquire()
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        try:
+            host = ftp.FTPHost(
+                self.server,
+                self.user,
+                self.password,
+                session_factory=self.session_factory
+            )
+        except Exception:
+            self._slots.release()
+            raise
+
+        self._opened.append(host)
+
+        return host
+
+    def release(self, host):
+        self._idle.put(host)
+        self._slots.release()
+
+    def close(self):
+        for host in self._opened:
+            try:
+                host.close()
+            except ftp.error.FTPError:
+                pass
+
+        self._opened = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def download_pirata_file(pool, ftp_filename, local_filename):
+    '''
+    Download one file using a session borrowed from pool.
+    '''
+    host = pool.acquire()
+
+    try:
+        with stage(
+            'pirata.download',
+            file=os.path.basename(ftp_filename)):
+
+            host.download(
+                ftp_filename,
+                local_filename
+            )
+            count(bytes=os.path.getsize(local_filename))
+    finally:
+        pool.release(host)
+
+    return local_filename
+
+def download_pirata_tail(pool, ftp_filename, offset, local_filename):
+    '''
+    Download the bytes of a file from offset on (FTP REST command), using a session borrowed from pool.
+    '''
+    host = pool.acquire()
+
+    try:
+        with stage(
+            'pirata.download',
+            file=os.path.basename(ftp_filename),
+            offset=offset):
+
+            with host.open(ftp_filename, 'rb', rest=offset) as remote, \
+                open(local_filename, 'wb') as fh:
+
+                shutil.copyfileobj(remote, fh)
+
+            count(bytes=os.path.getsize(local_filename))
+    finally:
+        pool.release(host)
+
+    return local_filename
+
+def local_tail(local_filename, offset=0):
+    '''
+    Get the size and the tail marker (see ponto_utils.sync.tail_marker) of a downloaded file, or of the end of a remote file downloaded from offset on.
+
+    Returns
+    -------
+    tail: tuple
+        Size of the remote file read and tail marker
+    '''
+    size = os.path.getsize(local_filename)
+
+    with open(local_filename, 'rb') as fh:
+        fh.seek(max(0, size - TAIL_OVERLAP))
+        end = fh.read()
+
+    return offset + size, tail_marker(end)
+
+def parse_pirata_file(
+    local_filename,
+    timemin=None,
+    timemax=None,
+    flags=None,
+    downcast=False):
+    '''
+    Read metadata and data of a downloaded PIRATA file and delete it.
+
+    timemin, timemax, flags and downcast are passed to handle_pirata_data.
+
+    Returns
+    -------
+    df: pandas.DataFrame
+        File data with datetime index
+    meta: dict
+        The return of the function handle_pirata_metadata
+    '''
+    with stage(
+        'pirata.parse',
+        file=os.path.basename(local_filename)):
+
+        # Decompress just once and share the
+        # buffer
+        with stage('pirata.gunzip'):
+            content = read_pirata_file(
+                local_filename
+            )
+            count(bytes=len(content))
+
+        with stage('pirata.metadata'):
+            meta = handle_pirata_metadata(
+                local_filename,
+                content
+            )
+            count(blocks=len(meta['block_headers']))
+
+        with stage('pirata.read'):
+            df = handle_pirata_data(
+                local_filename,
+                meta,
+                content,
+                timemin,
+                timemax,
+                flags,
+                downcast
+            )
+            count(rows=len(df))
+
+    os.remove(local_filename)
+
+    return df, meta
+
+def parse_pirata_tail(
+    local_filename,
+    marker,
+    meta,
+    flags=None,
+    downcast=False):
+    '''
+    Read the rows appended to a PIRATA file, from its end downloaded by download_pirata_tail, and delete the downloaded end.
+
+    PIRATA files are gzip files, so appended bytes can be read only if they are whole gzip members, as written by appending a new .gz to the file.
+
+    Parameters
+    ----------
+    local_filename: string
+        Downloaded end of the file
+    marker: string
+        Tail marker of the file already read (see ponto_utils.sync.tail_marker)
+    meta: dict
+        The return of the function handle_pirata_metadata for the file already read
+    flags, downcast:
+        Passed to handle_pirata_data
+
+    Returns
+    -------
+    result: tuple or None
+        The appended rows (pandas.DataFrame) and the metadata of the whole file, or None if the file was not just appended to and must be fully downloaded again
+    '''
+    with stage(
+        'pirata.parse',
+        file=os.path.basename(local_filename)):
+
+        with open(local_filename, 'rb') as fh:
+            fetched = fh.read()
+
+        os.remove(local_filename)
+
+        appended = split_appended(
+            fetched,
+            marker
+        )
+
+        # New gzip members start with the gzip
+        # magic number
+        if appended is None or not appended.startswith(b'\x1f\x8b'):
+            return None
+
+        try:
+            with stage('pirata.gunzip'):
+                content = gzip.decompress(appended)
+                count(bytes=len(content))
+
+            with stage('pirata.metadata'):
+                tail_meta, new_meta = handle_pirata_tail(
+                    content,
+                    meta
+                )
+                count(blocks=len(tail_meta['block_headers']))
+        except (OSError, EOFError, zlib.error, ValueError):
+            return None
+
+        with stage('pirata.read'):
+            df = handle_pirata_data(
+                local_filename,
+                tail_meta,
+                content,
+                flags=flags,
+                downcast=downcast
+            )
+            count(rows=len(df))
+
+    return df, new_meta
+
+def window_rows(df, timemin=None, timemax=None):
+    '''
+    Cut the rows of df inside desired time.
+
+    A sorted index is cut by binary search, without comparing every row.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        Data with datetime index
+    timemin, timemax: datetime or None
+        Desired time limits. None means no limit.
+
+    Returns
+    -------
+    df: pandas.DataFrame
+        Rows of df inside desired time
+    '''
+    if timemin is None and timemax is None:
+        return df
+
+    if not df.index.is_monotonic_increasing:
+        mask = np.ones(len(df), dtype=bool)
+
+        if timemin is not None:
+            mask &= df.index >= timemin
+        if timemax is not None:
+            mask &= df.index <= timemax
+
+        return df[mask]
+
+    start, stop = 0, len(df)
+
+    if timemin is not None:
+        start = df.index.searchsorted(
+            pd.Timestamp(timemin),
+            side='left'
+        )
+    if timemax is not None:
+        stop = df.index.searchsorted(
+            pd.Timestamp(timemax),
+            side='right'
+        )
+
+    return df.iloc[start:max(start, stop)]
+
 def get_weather_data(
     database,
     user,
     password,
-    localpath):
+    localpath,
+    workers=4,
+    server='ftp.pmel.noaa.gov',
+    ftp_path='./high_resolution/ascii/hr',
+    port=21,
+    sync=None,
+    timemin=None,
+    timemax=None,
+    flags=None,
+    downcast=False):
     '''
     Get PIRATA weather buoys data.
 
+    Files are downloaded by a pool of FTP sessions and, as soon as each download finishes, parsed by a pool of worker processes, so the transfer of the next files overlaps the parsing of the previous ones.
+
+    The workers are started by a fork server and import the main script again (see ponto_utils.processes), so a script calling this function must do it under if __name__ == '__main__'. Otherwise the parsing fails with concurrent.futures.process.BrokenProcessPool.
+
     Parameters
     ----------
     database: pandas.DataFrame
@@ -307,83 +1244,285 @@ def get_weather_data(
         User to access PMEL ftp server
     password: string
         Password to access PMEL ftp server
+    localpath: string
+        Folder where files are temporarily saved
+    workers: integer
+        Number of simultaneous FTP sessions and of parsing processes. The default workers value is 4.
+    server: string
+        FTP server address. The default is the PMEL ftp server.
+    ftp_path: string
+        Path of the hourly files inside the ftp server
+    port: integer
+        FTP server port. The default port value is 21.
+    sync: ponto_utils.sync.SyncManifest or None
+        Local store of already parsed files. Files whose remote size and modification time did not change since they were stored are not downloaded again. Files that just grew since are downloaded from where they were read on (FTP REST command), and only their new rows are parsed and added to the stored data. The store keeps the full history of each file, so the files not stored yet (or rewritten) are parsed whole, whatever timemin and timemax are. The default is not to use a store.
+    timemin: datetime or None
+        First time step of desired data. Without a sync store just rows from timemin on are parsed. The stored files always keep their full history, so with a sync store each file is cut after it is parsed or loaded, before the variables of a buoy are joined.
+    timemax: datetime or None
+        Last time step of desired data. See timemin.
+    flags: string or None
+        How to keep quality, source and instrument codes: 'uint8', 'category' or None to drop them (see handle_pirata_data). The default is to drop them.
+    downcast: bool
+        If True measurement columns are converted to float32 where no precision is lost. The default is False.
     
     Returns
     -------
     buoys_weather_data: dict
         A dict with the buoys name (str) as keys and buoys data (pandas.DataFrame) as values.
+    metadata: dict
+        A dict with the buoys name (str) as keys and a dict with the metadata of each variable file as values.
     '''
 
-    server = 'ftp.pmel.noaa.gov'
-    ftp_path = './high_resolution/ascii/hr'
     local_path = localpath
     metadata = dict()
     buoys_weather_data = dict()
+    workers = max(1, int(workers))
 
-    with ftp.FTPHost(
+    with FTPHostPool(
         server,
         user,
-        password) as host:
-
-        files = host.listdir(ftp_path)
-
-        for buoy in database.short_name:
-            
-            buoy_vars = list()
-            metadata[buoy] = dict()
-            
-            for file in files:
-                if buoy in file:
-                    ftp_filename = os.path.join(
-                        ftp_path,
-                        file
-                    )
-                    local_filename = os.path.join(
-                        local_path,
-                        file
-                    )
-                    var_name = file.split(buoy)[0]
+        password,
+        workers,
+        port) as pool:
+
+        # List of (buoy, var_name, file) to get,
+        # keeping the order of the original loop
+        tasks = list()
+        # Remote (size, mtime) of each file
+        remote_stats = dict()
+
+        host = pool.acquire()
+        try:
+            files = host.listdir(ftp_path)
+
+            for buoy in database.short_name:
+                for file in files:
+                    if buoy in file:
+                        var_name = file.split(buoy)[0]
+                        tasks.append((buoy, var_name, file))
+
+                        # The stat info is cached by
+                        # ftputil when the folder is
+                        # listed, so it does not cost
+                        # a new request
+                        if sync is not None:
+                            stat = host.stat(
+                                os.path.join(ftp_path, file)
+                            )
+                            remote_stats[file] = (
+                                stat.st_size,
+                                stat.st_mtime
+                            )
+        finally:
+            pool.release(host)
+
+        parsed = dict()
+
+        # Time window pushed down to the parsers.
+        # Stored files must keep the full history
+        window = (timemin, timemax)
+
+        if sync is not None:
+            window = (None, None)
+
+        # Files not changed since the last run are
+        # read from the local store, and the end of
+        # the files that grew is downloaded
+        tails = dict()
+
+        if sync is not None:
+            for task in tasks:
+                file = task[2]
+
+                if sync.is_current(file, *remote_stats[file]):
+                    parsed[task] = sync.load(file)
+                    continue
+
+                tail = sync.appended_since(
+                    file,
+                    remote_stats[file][0]
+                )
+
+                # Offset and marker of the download,
+                # and stored data and metadata
+                if tail is not None:
+                    tails[task] = tail + sync.load(file)
+
+        # Parsers do not inherit the connections
+        # of the download threads (see
+        # ponto_utils.processes)
+        with ThreadPoolExecutor(workers) as downloader, \
+            ProcessPoolExecutor(
+                workers,
+                mp_context=process_context(
+                    'numpy',
+                    'pandas',
+                    'ftputil'
+                )
+            ) as parser:
+
+            def fetch(todo):
+                # Download todo files and hand each
+                # one to the parsers as soon as its
+                # download is finished
+                downloads = dict()
+                parses = dict()
+                local_tails = dict()
+
+                for task in todo:
+                    file = task[2]
+
+                    if task in tails:
+                        future = downloader.submit(
+                            download_pirata_tail,
+                            pool,
+                            os.path.join(ftp_path, file),
+                            tails[task][0],
+                            os.path.join(local_path, file + '.tail')
+                        )
+                    else:
+                        future = downloader.submit(
+                            download_pirata_file,
+                            pool,
+                            os.path.join(ftp_path, file),
+                            os.path.join(local_path, file)
+                        )
+                    downloads[future] = task
+
+                for future in as_completed(downloads):
+                    local_filename = future.result()
+                    task = downloads[future]
 
-                    host.download(
-                        ftp_filename,
-                        local_filename
-                    )
                     # Test if the file was
                     # effectively downloaded
-                    if os.path.exists(local_filename):
+                    if not os.path.exists(local_filename):
+                        continue
 
-                        meta = handle_pirata_metadata(
-                            local_filename
+                    if task in tails:
+                        offset, marker, _, meta = tails[task]
+                        local_tails[task] = local_tail(
+                            local_filename,
+                            offset
                         )
-                        df = handle_pirata_data(
+                        parses[task] = parser.submit(
+                            parse_pirata_tail,
                             local_filename,
-                            meta
+                            marker,
+                            meta,
+                            flags,
+                            downcast
                         )
-                        os.remove(local_filename)
-
-                        # Rename the vars with
-                        # the filename preffix
-                        # to avoid repeated cols
-                        # on final DataFrame
-                        for column in df.columns:
-                            df.rename(
-                                columns={
-                                    column: (
-                                        column +
-                                        '_' +
-                                        var_name
-                                    )},
-                                inplace=True
+                    else:
+                        if sync is not None:
+                            local_tails[task] = local_tail(
+                                local_filename
                             )
+                        parses[task] = parser.submit(
+                            parse_pirata_file,
+                            local_filename,
+                            *window,
+                            flags,
+                            downcast
+                        )
+
+                return parses, local_tails
+
+            parses, local_tails = fetch([
+                task for task in tasks
+                if task not in parsed
+            ])
+            # Files that did not just grow are
+            # downloaded again from the start
+            rewritten = list()
+
+            for task, future in parses.items():
+                result = future.result()
+
+                if task in tails:
+                    stored = tails[task][2]
+
+                    if (result is None or (
+                        len(result[0]) and len(stored) and
+                        result[0].index[0] <= stored.index[-1])):
+
+                        rewritten.append(task)
+                        continue
+
+                    result = (
+                        stack_frames([stored, result[0]]),
+                        result[1]
+                    )
 
-                        buoy_vars.append(df)
-                        metadata[buoy][var_name] = meta
-            
-            buoys_weather_data[buoy] = pd.concat(
-                buoy_vars,
-                axis='columns',
-                join='outer'
+                parsed[task] = result
+
+                if sync is not None:
+                    file = task[2]
+                    sync.store(
+                        file,
+                        *remote_stats[file],
+                        *parsed[task],
+                        tail=local_tails[task]
+                    )
+
+            for task in rewritten:
+                del tails[task]
+
+            if rewritten:
+                parses, local_tails = fetch(rewritten)
+
+                for task, future in parses.items():
+                    parsed[task] = future.result()
+                    file = task[2]
+                    sync.store(
+                        file,
+                        *remote_stats[file],
+                        *parsed[task],
+                        tail=local_tails[task]
+                    )
+
+        if sync is not None:
+            sync.save()
+
+    for buoy in database.short_name:
+        
+        buoy_vars = list()
+        metadata[buoy] = dict()
+
+        for task in tasks:
+            if task not in parsed or task[0] != buoy:
+                continue
+
+            var_name = task[1]
+            # Taken out of parsed so each file
+            # frame is released as soon as it is
+            # copied to the buoy frame
+            df, meta = parsed.pop(task)
+            # Stored files hold the full history
+            df = window_rows(
+                df,
+                timemin,
+                timemax
             )
+
+            # Rename the vars with
+            # the filename preffix
+            # to avoid repeated cols
+            # on final DataFrame
+            names = {
+                column: column + '_' + var_name
+                for column in df.columns
+            }
+
+            buoy_vars.append((df, names))
+            metadata[buoy][var_name] = meta
+            del df
+        
+        if buoy_vars:
+            with stage('pirata.join', buoy=buoy):
+                buoys_weather_data[buoy] = join_frames(
+                    buoy_vars
+                )
+                count(rows=len(buoys_weather_data[buoy]))
     
     return buoys_weather_data, metadata
 
@@ -422,98 +1561,351 @@ def time_filter(
 
     return weather_data_time_filtered
 
-obsdir = os.environ[
-    'DATATYPE_DIR'
-]
-user = os.environ[
-      'PMEL_USER'
-]
-password = os.environ[
-      'PMEL_PASSWORD'
-]
-# Desired area
-lonmin = float(
-    os.environ[
-      'LON_MIN'
-])
-lonmax = float(
-    os.environ[
-      'LON_MAX'
-])
-latmin = float(
-    os.environ[
-      'LAT_MIN'
-])
-latmax = float(
-    os.environ[
-      'LAT_MAX'
-])
-# Desired time
-timemin = pd.to_datetime(
-    os.environ[
-        'DATETIME_MIN'],
-    format='%d-%m-%Y %H:%M:%S'
-)
-timemax = pd.to_datetime(
-    os.environ[
-        'DATETIME_MAX'],
-    format='%d-%m-%Y %H:%M:%S'
-)
-buoys_spatial_filtered = spatial_filter(
+def save_weather_data(
+    weather_data,
+    metadata,
+    obsdir,
+    output_format='csv',
+    output_partition=None):
+    '''
+    Save one file per buoy and a metadata file in obsdir.
+
+    Parameters
+    ----------
+    weather_data: dict
+        The return of the function time_filter
+    metadata: dict
+        Metadata of the buoys (see get_weather_data)
+    obsdir: string
+        Folder where files are saved
+    output_format: string
+        Format of the files (see ponto_utils.storage). The default is csv.
+    output_partition: string or None
+        'year' to save a file per year of each buoy. The default is a single file.
+
+    Returns
+    -------
+    filepaths: list
+        Paths of the written files
+    '''
+    filepaths = list()
+    ############################################
+    # IMPORT AND MANIPULATE DATA ###############
+    ############################################
+    # Test if the weather_data dict is empty
+    # or not
+    if weather_data:
+        for buoy, df in weather_data.items():
+        
+            # Station
+            print((
+                '>>>> Getting PIRATA weather' +
+                ' buoy data from {0}').format(
+                    buoy
+            ))
+            # Save data file
+            with stage('pirata.save', buoy=buoy):
+                written = write_output(
+                    df,
+                    os.path.join(
+                        obsdir,
+                        'weather_pirata_{0}'.format(
+                            buoy)),
+                    output_format,
+                    output_partition
+                )
+                count(
+                    rows=len(df),
+                    bytes=sum(map(os.path.getsize, written))
+                )
+
+            filepaths += written
+        # Save metadata file
+        metapath = os.path.join(
+            obsdir,
+            'weather_pirata_metadata.json'
+        )
+        with open(metapath, 'w') as fp:
+            json.dump(
+                metadata,
+                fp,
+                indent=4
+            )
+        filepaths.append(metapath)
+    
+    else:
+        print((
+            '>>>> Not available PIRATA' +
+            ' weather buoy data for the' +
+            ' desired area and time'
+        ))
+
+    return filepaths
+
+def run_batch(
+    regions,
+    user,
+    password,
+    workers=4,
+    sync_dir=None,
+    flags=None,
+    downcast=False,
+    output_format='csv',
+    output_partition=None,
+    catalogue_dir=None):
+    '''
+    Download PIRATA weather buoys data of many regions at once and save the data of each region in its own folder.
+
+    The files of the buoys of all regions are downloaded and parsed just once, in a single set of FTP sessions, for the union of the regions time. Then each region is cut from the shared data.
+
+    Parameters
+    ----------
+    regions: dict
+        Regions name as keys and dicts as values, with obsdir (folder where the region files are saved) and the region limits: lonmin, lonmax, latmin, latmax, timemin and timemax
+    user: string
+        User to access PMEL ftp server
+    password: string
+        Password to access PMEL ftp server
+    workers: integer
+        Number of simultaneous FTP sessions and of parsing processes. The default workers value is 4.
+    sync_dir: string or None
+        Folder of the local store of already parsed files (see get_weather_data). The default is not to use a store.
+    flags: string or None
+        How to keep quality, source and instrument codes (see handle_pirata_data). The default is to drop them.
+    downcast: bool
+        If True measurements are kept as float32 where no precision is lost
+    output_format: string
+        Format of the files (see ponto_utils.storage). The default is csv.
+    output_partition: string or None
+        'year' to save a file per year of each buoy. The default is a single file.
+    catalogue_dir: string or None
+        Folder of the stations catalogue cache. The default is cache/catalogue inside the data folder of the first region.
+
+    Returns
+    -------
+    filepaths: dict
+        Regions name as keys and the paths of their written files as values
+    '''
+    # Downloaded files are kept, just while they
+    # are parsed, in the folder of the first
+    # region
+    localpath = next(iter(regions.values()))['obsdir']
+
+    if catalogue_dir is None:
+        catalogue_dir = cache_path(
+            localpath,
+            'catalogue'
+        )
+
+    sync = None
+
+    if sync_dir is not None:
+        sync = SyncManifest(
+            sync_dir,
+            options={
+                'flags': flags,
+                'downcast': downcast,
+        })
+
+    # Buoys of each region
+    stations = {
+        name: spatial_filter(
+            region['lonmin'],
+            region['lonmax'],
+            region['latmin'],
+            region['latmax'],
+            cache_dir=catalogue_dir
+        )
+        for name, region in regions.items()
+    }
+    union = union_limits(
+        regions.values()
+    )
+    buoys_weather_data, metadata = get_weather_data(
+        pd.concat(
+            stations.values()
+        ).drop_duplicates('short_name'),
+        user,
+        password,
+        localpath,
+        workers,
+        sync=sync,
+        timemin=union['timemin'],
+        timemax=union['timemax'],
+        flags=flags,
+        downcast=downcast
+    )
+    filepaths = dict()
+
+    for name, region in regions.items():
+        buoys = [
+            buoy for buoy in stations[name].short_name
+            if buoy in buoys_weather_data
+        ]
+        filepaths[name] = save_weather_data(
+            time_filter(
+                {buoy: buoys_weather_data[buoy] for buoy in buoys},
+                region['timemin'],
+                region['timemax']
+            ),
+            {buoy: metadata[buoy] for buoy in buoys},
+            region['obsdir'],
+            output_format,
+            output_partition
+        )
+
+    return filepaths
+
+def run(
+    obsdir,
     lonmin,
     lonmax,
     latmin,
-    latmax
-)
-buoys_weather_data, metadata = get_weather_data(
-    buoys_spatial_filtered,
+    latmax,
+    timemin,
+    timemax,
     user,
     password,
-    obsdir
-)
-weather_data_time_filtered = time_filter(
-    buoys_weather_data,
-    timemin,
-    timemax
-)
-############################################
-# IMPORT AND MANIPULATE DATA ###############
-############################################
-# Test if the weather_data_time_filtered 
-# dict is empty or not
-if weather_data_time_filtered:
-    for buoy, df in weather_data_time_filtered.items():
-        
-        # Station
-        print((
-            '>>>> Getting PIRATA weather' +
-            ' buoy data from {0}').format(
-                buoy
-        ))
-        # Save data file
-        df.to_csv(
-            os.path.join(
-                obsdir,
-                ('weather_pirata_{0}' +
-                '.csv').format(
-                    buoy)),
-            na_rep='NaN'
+    **options):
+    '''
+    Download PIRATA weather buoys data of desired area and time and save one file per buoy, and a metadata file, in obsdir.
+
+    Parameters
+    ----------
+    obsdir: string
+        Folder where files are saved
+    lonmin, lonmax, latmin, latmax: float
+        Desired area limits
+    timemin, timemax: datetime
+        Desired time limits
+    user: string
+        User to access PMEL ftp server
+    password: string
+        Password to access PMEL ftp server
+    options:
+        workers, sync_dir, flags, downcast, output_format, output_partition and catalogue_dir (see run_batch)
+
+    Returns
+    -------
+    filepaths: list
+        Paths of the written files
+    '''
+    region = dict(
+        obsdir=obsdir,
+        lonmin=lonmin,
+        lonmax=lonmax,
+        latmin=latmin,
+        latmax=latmax,
+        timemin=timemin,
+        timemax=timemax
+    )
+
+    return run_batch(
+        {obsdir: region},
+        user,
+        password,
+        **options
+    )[obsdir]
+
+def env_options(datadir, environ=None):
+    '''
+    Read the options of run and run_batch from the environment variables set by the ponto.input file.
+
+    Parameters
+    ----------
+    datadir: string
+        Data folder, where the local caches are kept by default
+    environ: dict or None
+        Environment variables. The default is os.environ.
+
+    Returns
+    -------
+    options: dict
+        Keyword arguments of run_batch, but regions
+    '''
+    if environ is None:
+        environ = os.environ
+
+    # Output file format (csv, parquet or
+    # feather) and partition (none or year)
+    output_partition = environ.get(
+        'OUTPUT_PARTITION',
+        'none'
+    )
+
+    if output_partition == 'none':
+        output_partition = None
+    # Quality, source and instrument codes
+    # (none, uint8 or category)
+    flags = environ.get(
+        'PIRATA_FLAGS',
+        'none'
+    )
+
+    if flags == 'none':
+        flags = None
+    # Local store of already parsed files, to
+    # download just the ones changed on PMEL
+    # server since the last run. Files not
+    # stored yet are parsed whole, so it is
+    # opt-in
+    sync_dir = None
+
+    if environ.get('PIRATA_SYNC', 'no') == 'yes':
+        sync_dir = environ.get(
+            'PIRATA_SYNC_DIR',
+            os.path.join(datadir, 'cache', 'pirata')
         )
-    # Save metadata file
-    metapath = os.path.join(
-        obsdir,
-        'weather_pirata_metadata.json'
+
+    return dict(
+        user=environ['PMEL_USER'],
+        password=environ['PMEL_PASSWORD'],
+        output_format=environ.get(
+            'OUTPUT_FORMAT',
+            'csv'
+        ),
+        output_partition=output_partition,
+        # Simultaneous FTP sessions and parsing
+        # processes
+        workers=int(
+            environ.get(
+              'PIRATA_WORKERS',
+              4
+        )),
+        sync_dir=sync_dir,
+        flags=flags,
+        # Measurements as float32 where no
+        # precision is lost
+        downcast=environ.get(
+            'PIRATA_FLOAT32',
+            'no'
+        ) == 'yes',
+        catalogue_dir=os.path.join(
+            datadir,
+            'cache',
+            'catalogue'
+        ),
     )
-    with open(metapath, 'w') as fp:
-        json.dump(
-            metadata,
-            fp,
-            indent=4
+
+def env_params(obsdir, environ=None):
+    '''
+    Read the arguments of run from the environment variables set by the ponto.input file.
+
+    Returns
+    -------
+    params: dict
+        Keyword arguments of run
+    '''
+    return dict(
+        obsdir=obsdir,
+        **read_limits(environ),
+        **env_options(
+            os.path.dirname(obsdir),
+            environ
         )
-    
-else:
-    print((
-        '>>>> Not available PIRATA' +
-        ' weather buoy data for the' +
-        ' desired area and time'
+    )
+
+if __name__ == '__main__':
+    run(**env_params(
+        os.environ['DATATYPE_DIR']
     ))
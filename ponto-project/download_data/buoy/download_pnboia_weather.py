@@ -7,20 +7,48 @@
 #            Navy) buoy data for desired
 #            area and time
 
+import io
 import os
+import sys
 import urllib3
 
+import numpy as np
 import pandas as pd
 
+from concurrent.futures import ThreadPoolExecutor
+
+# Make the ponto_utils package, shared by all
+# data types, importable
+sys.path.append(
+    os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)
+)))
+
+from ponto_utils.storage import write_output
+from ponto_utils.metrics import stage, count
+from ponto_utils.settings import (
+    read_limits,
+    cache_path,
+    union_limits,
+)
+from ponto_utils.catalogue import load_stations
+
 ############################################
 # SET SOME FUNCTIONS AND/OR VARIABLES ######
 ############################################
+# Already identified suffixes in PNBOIA
+# data paths. New elements can be add
+# to the list, but old elements should
+# not be deleted
+SUFFIXES = ['', '1', '_0', '_1']
+
 def spatial_filter(
     lonmin=-66.,
     lonmax=8.,
     latmin=-63.,
     latmax=21.,
-    responsible='PNBOIA'
+    responsible='PNBOIA',
+    cache_dir=None
     ):
     '''
     Select weather buoys in expanded South Atlantic by area and institution of responsability.
@@ -41,6 +69,8 @@ def spatial_filter(
         Maximum value of latitude for the weather buoy search area. The default latmax value is 21.0.
     responsible: string
         Institution responsible by buoy maintenance. This value must be in agreement with one of the values of the responsible column of database (https://github.com/douglasnehme/data-misc/blob/main/ocean_fixed_stations.csv).
+    cache_dir: string or None
+        Folder where the database is kept between runs, so it is downloaded again only when changed. The default None downloads it on every call.
 
     Returns
     -------
@@ -48,39 +78,304 @@ def spatial_filter(
         Database rows of buoys that was inside desired area and are maintained by chosen institution
     '''
     
-    database_path = (
-        'https://raw.githubusercontent' +
-        '.com/douglasnehme/data-misc/' +
-        'main/ocean_fixed_stations.csv'
+    stations = load_stations(
+        cache_dir
+    )
+    database = stations.query(
+        lonmin,
+        lonmax,
+        latmin,
+        latmax,
+        responsible
     )
-    database = pd.read_csv(
-        database_path,
+
+    return database
+
+def probe_url(http, url):
+    '''
+    Get the HTTP status of url without downloading its body.
+
+    A HEAD request is used and, if the server does not accept it, a GET of just the first byte.
+
+    Parameters
+    ----------
+    http: urllib3.PoolManager
+        Pool of connections shared by all requests
+    url: string
+        Address to be tested
+
+    Returns
+    -------
+    status: integer
+        HTTP status code
+    '''
+    response = http.request(
+        'HEAD',
+        url
+    )
+
+    # 405 (Method Not Allowed) and 501 (Not
+    # Implemented) mean that the server does
+    # not accept HEAD requests
+    if response.status in (405, 501):
+        response = http.request(
+            'GET',
+            url,
+            headers={'Range': 'bytes=0-0'}
+        )
+
+    return response.status
+
+def read_weather_csv(
+    content,
+    timemin=None,
+    timemax=None,
+    chunksize=50000):
+    '''
+    Read a PNBOIA csv already downloaded to memory.
+
+    When timemin and/or timemax are given the csv is read in chunks and only rows inside the window are kept, so memory is proportional to the window and not to the whole file. Rows are in chronological order, so the reading stops at the first chunk that goes past timemax. Rows whose time could not be parsed are skipped.
+
+    Parameters
+    ----------
+    content: bytes
+        Body of the csv file
+    timemin: datetime or None
+        First time step of desired data. None means no limit.
+    timemax: datetime or None
+        Last time step of desired data. None means no limit.
+    chunksize: integer
+        Rows read at a time when a window is given
+
+    Returns
+    -------
+    data: pandas.DataFrame
+        Buoy data with datetime index
+    '''
+    read_kwargs = dict(
         sep=',',
         header=0,
-        na_values=-9999.00
+        na_values=[-9999, -9999.0],
+        parse_dates=True
     )
-    database = database[
-        database.responsible == responsible
-    ]
-    database = database[
-        (database.lon >= lonmin) &
-        (database.lon <= lonmax) &
-        (database.lat >= latmin) &
-        (database.lat <= latmax)
-    ]
+    data_idx = [0]
 
-    return database
+    # The first rows are enough to find the
+    # datetime column
+    sample = pd.read_csv(
+        io.BytesIO(content),
+        index_col=data_idx,
+        nrows=100,
+        **read_kwargs
+    )
+    # Test if the index has a datetime format
+    if not isinstance(sample.index, pd.DatetimeIndex):
+        for column in sample.columns:
+            # As in some wrong tables the
+            # datetime column could be 
+            # capitalized or not this was
+            # a way to get the corret
+            # index column
+            if 'atetime' in column:
+                data_idx = column
+
+    if timemin is None and timemax is None:
+        return pd.read_csv(
+            io.BytesIO(content),
+            index_col=data_idx,
+            **read_kwargs
+        )
+
+    chunks = list()
+
+    for chunk in pd.read_csv(
+        io.BytesIO(content),
+        index_col=data_idx,
+        chunksize=chunksize,
+        **read_kwargs):
+
+        # Chunks with some invalid time are not
+        # parsed as dates. Their invalid times
+        # become NaT and are out of any window
+        times = chunk.index
+
+        if not isinstance(times, pd.DatetimeIndex):
+            times = pd.to_datetime(
+                times,
+                errors='coerce'
+            )
+            chunk.index = times
+
+        mask = times.notna()
+
+        if timemin is not None:
+            mask &= times >= timemin
+        if timemax is not None:
+            mask &= times <= timemax
 
-def get_weather_data(database):
+        chunks.append(chunk[mask])
+
+        # Next chunks are later in time
+        if timemax is not None and (times > timemax).any():
+            break
+
+    return pd.concat(chunks)
+
+def first_data_path(paths):
+    '''
+    Get the first path of a data paths database column (e.g. "[url1, url2]"), or an empty string if there is none.
+    '''
+    # Remove leading and trailing square
+    # brackets
+    return paths[1:-1].split(', ')[0]
+
+def find_data_url(http, weather_path, suffixes):
+    '''
+    Find which data path suffix of a PNBOIA file exists on the server.
+
+    Parameters
+    ----------
+    http: urllib3.PoolManager
+        Pool of connections shared by all requests
+    weather_path: string
+        Data path of the database
+    suffixes: list
+        Data path suffixes to be tested
+
+    Returns
+    -------
+    url: string or None
+        Data path with the found suffix, or None if no path was found
+    '''
+    for suffix in suffixes:
+        wpath_suffix = (
+            weather_path[:-4] +
+            suffix +
+            weather_path[-4:]
+        )
+        status = probe_url(
+            http,
+            wpath_suffix
+        )
+
+        # HTTP successful codes are
+        # between 200 and 299
+        if status in range(200, 300):
+            return wpath_suffix
+        
+        # HTTP client error codes are
+        # between 400 and 499
+        elif status in range(400, 500):
+            pass
+        
+        # HTTP informational codes are
+        # between 100 and 199, HTTP
+        # redirect codes are between
+        # 300 and 399, and HTTP server
+        # error codes are between 500
+        # and 599
+        else:
+            raise urllib3.exceptions.HTTPError(
+                '{0} returned status {1}'.format(
+                    wpath_suffix,
+                    status
+            ))
+
+    return None
+
+def get_buoy_data(
+    http,
+    row,
+    suffixes,
+    timemin=None,
+    timemax=None):
+    '''
+    Get the data of one PNBOIA buoy testing each data path suffix.
+
+    Parameters
+    ----------
+    http: urllib3.PoolManager
+        Pool of connections shared by all requests
+    row: pandas.Series
+        Database row of the buoy
+    suffixes: list
+        Data path suffixes to be tested
+    timemin, timemax: datetime or None
+        Time window passed to read_weather_csv
+
+    Returns
+    -------
+    data: pandas.DataFrame or None
+        Buoy data or None if no path was found
+    '''
+    weather_path = first_data_path(
+        row.historical_data_path
+    )
+
+    # Check if weather_path is an empty
+    # string (best way to do this
+    # according PEP8)
+    if not weather_path:
+        weather_path = first_data_path(
+            row.operational_data_path
+        )
+
+    wpath_suffix = find_data_url(
+        http,
+        weather_path,
+        suffixes
+    )
+
+    if wpath_suffix is None:
+        return None
+
+    # Just the found path is fully
+    # downloaded, and only once
+    with stage('pnboia.download', buoy=row.short_name):
+        response = http.request(
+            'GET',
+            wpath_suffix
+        )
+
+        if response.status not in range(200, 300):
+            raise urllib3.exceptions.HTTPError(
+                '{0} returned status {1}'.format(
+                    wpath_suffix,
+                    response.status
+            ))
+
+        count(bytes=len(response.data))
+
+    with stage('pnboia.read', buoy=row.short_name):
+        data = read_weather_csv(
+            response.data,
+            timemin,
+            timemax
+        )
+        count(rows=len(data))
+
+    return data
+
+def get_weather_data(
+    database,
+    workers=8,
+    timemin=None,
+    timemax=None):
     '''
     Get PNBOIA weather buoys data.
 
-    All PNBOIA's data path suffixes already identified by me are tested here to access weather buoy data.
+    All PNBOIA's data path suffixes already identified by me are tested here to access weather buoy data. Buoys are fetched concurrently sharing one pool of connections.
 
     Parameters
     ----------
     database: pandas.DataFrame
         The return of the function spatial_filter or a pandas.DataFrame with my weather buoys' database pattern (access https://github.com/douglasnehme/data-misc/blob/main/ocean_fixed_stations.csv).
+    workers: integer
+        Number of buoys fetched at the same time. The default workers value is 8.
+    timemin: datetime or None
+        First time step of desired data. Rows before it are dropped while each file is read. None means no limit.
+    timemax: datetime or None
+        Last time step of desired data. See timemin.
     
     Returns
     -------
@@ -89,93 +384,31 @@ def get_weather_data(database):
     '''
 
     buoys_weather_data = dict()
+    workers = max(1, int(workers))
 
-    # Already identified suffixes in PNBOIA
-    # data paths. New elements can be add
-    # to the list, but old elements should
-    # not be deleted
-    suffixes = ['', '1', '_0', '_1']
-
-    for _, row in database.iterrows():
-        # Get the string with data paths
-        # with leading and trailing square
-        # brackets removed
-        paths = row.historical_data_path[1:-1]
-
-        weather_path = paths.split(', ')[0]
-
-        http = urllib3.PoolManager()
-
-        # Check if weather_path is an empty
-        # string (best way to do this
-        # according PEP8)
-        if not weather_path:
-            paths = row.operational_data_path[1:-1]
-
-            weather_path = paths.split(', ')[0]
-            
-        for suffix in suffixes:
-            wpath_suffix = (
-                weather_path[:-4] +
-                suffix +
-                weather_path[-4:]
-            )
-            response = http.request(
-                'GET',
-                wpath_suffix
-            )
+    # One pool, with a connection per worker,
+    # shared by all buoys and suffixes
+    http = urllib3.PoolManager(
+        maxsize=workers
+    )
+    rows = [row for _, row in database.iterrows()]
 
-            # HTTP successful codes are
-            # between 200 and 299
-            if response.status in range(200, 300):
-                data = pd.read_csv(
-                    wpath_suffix,
-                    sep=',',
-                    header=0,
-                    na_values=[-9999, -9999.0],
-                    parse_dates=True,
-                    index_col=[0],
-                    infer_datetime_format=True
-                )
-                # Test if the index has a datetime format
-                if not isinstance(data.index, pd.DatetimeIndex):
-                    for column in data.columns:
-                        # As in some wrong tables the
-                        # datetime column could be 
-                        # capitalized or not this was
-                        # a way to get the corret
-                        # index column
-                        if 'atetime' in column:
-                            data_idx = column
-                
-                            data = pd.read_csv(
-                                wpath_suffix,
-                                sep=',',
-                                header=0,
-                                na_values=[-9999, -9999.0],
-                                parse_dates=True,
-                                index_col=data_idx,
-                                infer_datetime_format=True
-                            )
+    with ThreadPoolExecutor(workers) as executor:
+        results = executor.map(
+            lambda row: get_buoy_data(
+                http,
+                row,
+                SUFFIXES,
+                timemin,
+                timemax
+            ),
+            rows
+        )
 
+        for row, data in zip(rows, results):
+            if data is not None:
                 buoys_weather_data[row.short_name] = data
 
-                break
-            
-            # HTTP client error codes are
-            # between 400 and 499
-            elif response.status in range(400, 500):
-                pass
-            
-            # HTTP informational codes are
-            # between 100 and 199, HTTP
-            # redirect codes are between
-            # 300 and 399, and HTTP server
-            # error codes are between 500
-            # and 599
-            else:
-                raise
-
     return buoys_weather_data
 
 def time_filter(
@@ -213,79 +446,262 @@ def time_filter(
 
     return weather_data_time_filtered
 
-obsdir = os.environ[
-    'DATATYPE_DIR'
-]
-# Desired area
-lonmin = float(
-    os.environ[
-      'LON_MIN'
-])
-lonmax = float(
-    os.environ[
-      'LON_MAX'
-])
-latmin = float(
-    os.environ[
-      'LAT_MIN'
-])
-latmax = float(
-    os.environ[
-      'LAT_MAX'
-])
-# Desired time
-timemin = pd.to_datetime(
-    os.environ[
-        'DATETIME_MIN'],
-    format='%d-%m-%Y %H:%M:%S'
-)
-timemax = pd.to_datetime(
-    os.environ[
-        'DATETIME_MAX'],
-    format='%d-%m-%Y %H:%M:%S'
-)
-buoys_spatial_filtered = spatial_filter(
+def save_weather_data(
+    weather_data,
+    obsdir,
+    output_format='csv',
+    output_partition=None):
+    '''
+    Save one file per buoy in obsdir.
+
+    Parameters
+    ----------
+    weather_data: dict
+        The return of the function time_filter
+    obsdir: string
+        Folder where files are saved
+    output_format: string
+        Format of the files (see ponto_utils.storage). The default is csv.
+    output_partition: string or None
+        'year' to save a file per year of each buoy. The default is a single file.
+
+    Returns
+    -------
+    filepaths: list
+        Paths of the written files
+    '''
+    filepaths = list()
+    ############################################
+    # IMPORT AND MANIPULATE DATA ###############
+    ############################################
+    # Test if the weather_data dict is empty
+    # or not
+    if weather_data:
+        for buoy, df in weather_data.items():
+        
+            # Station
+            print((
+                '>>>> Getting PNBOIA weather' +
+                ' buoy data from {0}').format(
+                    buoy
+            ))
+            # Rename index column
+            df.index.name = 'datetime'
+        
+            # Save file
+            with stage('pnboia.save', buoy=buoy):
+                written = write_output(
+                    df,
+                    os.path.join(
+                        obsdir,
+                        'weather_pnboia_{0}'.format(
+                            buoy)),
+                    output_format,
+                    output_partition
+                )
+                count(
+                    rows=len(df),
+                    bytes=sum(map(os.path.getsize, written))
+                )
+
+            filepaths += written
+    else:
+        print((
+            '>>>> Not available PNBOIA' +
+            ' weather buoy data for the' +
+            ' desired area and time'
+        ))
+
+    return filepaths
+
+def run_batch(
+    regions,
+    workers=8,
+    output_format='csv',
+    output_partition=None,
+    catalogue_dir=None):
+    '''
+    Download PNBOIA weather buoys data of many regions at once and save the data of each region in its own folder.
+
+    The buoys of all regions are downloaded just once, for the union of the regions time, and then each region is cut from the shared data.
+
+    Parameters
+    ----------
+    regions: dict
+        Regions name as keys and dicts as values, with obsdir (folder where the region files are saved) and the region limits: lonmin, lonmax, latmin, latmax, timemin and timemax
+    workers: integer
+        Number of buoys fetched at the same time. The default workers value is 8.
+    output_format: string
+        Format of the files (see ponto_utils.storage). The default is csv.
+    output_partition: string or None
+        'year' to save a file per year of each buoy. The default is a single file.
+    catalogue_dir: string or None
+        Folder of the stations catalogue cache. The default is cache/catalogue inside the data folder of the first region.
+
+    Returns
+    -------
+    filepaths: dict
+        Regions name as keys and the paths of their written files as values
+    '''
+    if catalogue_dir is None:
+        catalogue_dir = cache_path(
+            next(iter(regions.values()))['obsdir'],
+            'catalogue'
+        )
+
+    # Buoys of each region
+    stations = {
+        name: spatial_filter(
+            region['lonmin'],
+            region['lonmax'],
+            region['latmin'],
+            region['latmax'],
+            cache_dir=catalogue_dir
+        )
+        for name, region in regions.items()
+    }
+    union = union_limits(
+        regions.values()
+    )
+    buoys_weather_data = get_weather_data(
+        pd.concat(
+            stations.values()
+        ).drop_duplicates('short_name'),
+        workers,
+        union['timemin'],
+        union['timemax']
+    )
+    filepaths = dict()
+
+    for name, region in regions.items():
+        region_data = {
+            buoy: buoys_weather_data[buoy]
+            for buoy in stations[name].short_name
+            if buoy in buoys_weather_data
+        }
+        filepaths[name] = save_weather_data(
+            time_filter(
+                region_data,
+                region['timemin'],
+                region['timemax']
+            ),
+            region['obsdir'],
+            output_format,
+            output_partition
+        )
+
+    return filepaths
+
+def run(
+    obsdir,
     lonmin,
     lonmax,
     latmin,
-    latmax
-)
-buoys_weather_data = get_weather_data(
-    buoys_spatial_filtered
-)
-weather_data_time_filtered = time_filter(
-    buoys_weather_data,
+    latmax,
     timemin,
-    timemax
-)
-############################################
-# IMPORT AND MANIPULATE DATA ###############
-############################################
-# Test if the weather_data_time_filtered 
-# dict is empty or not
-if weather_data_time_filtered:
-    for buoy, df in weather_data_time_filtered.items():
-        
-        # Station
-        print((
-            '>>>> Getting PNBOIA weather' +
-            ' buoy data from {0}').format(
-                buoy
-        ))
-        # Rename index column
-        df.index.name = 'datetime'
-        
-        # Save file
-        df.to_csv(
-            os.path.join(
-                obsdir,
-                ('weather_pnboia_{0}' +
-                '.csv').format(
-                    buoy)),
-            na_rep='NaN')
-else:
-    print((
-        '>>>> Not available PNBOIA' +
-        ' weather buoy data for the' +
-        ' desired area and time'
+    timemax,
+    **options):
+    '''
+    Download PNBOIA weather buoys data of desired area and time and save one file per buoy in obsdir.
+
+    Parameters
+    ----------
+    obsdir: string
+        Folder where files are saved
+    lonmin, lonmax, latmin, latmax: float
+        Desired area limits
+    timemin, timemax: datetime
+        Desired time limits
+    options:
+        workers, output_format, output_partition and catalogue_dir (see run_batch)
+
+    Returns
+    -------
+    filepaths: list
+        Paths of the written files
+    '''
+    region = dict(
+        obsdir=obsdir,
+        lonmin=lonmin,
+        lonmax=lonmax,
+        latmin=latmin,
+        latmax=latmax,
+        timemin=timemin,
+        timemax=timemax
+    )
+
+    return run_batch(
+        {obsdir: region},
+        **options
+    )[obsdir]
+
+def env_options(datadir, environ=None):
+    '''
+    Read the options of run and run_batch from the environment variables set by the ponto.input file.
+
+    Parameters
+    ----------
+    datadir: string
+        Data folder, where the local caches are kept by default
+    environ: dict or None
+        Environment variables. The default is os.environ.
+
+    Returns
+    -------
+    options: dict
+        Keyword arguments of run_batch, but regions
+    '''
+    if environ is None:
+        environ = os.environ
+
+    # Output file format (csv, parquet or
+    # feather) and partition (none or year)
+    output_partition = environ.get(
+        'OUTPUT_PARTITION',
+        'none'
+    )
+
+    if output_partition == 'none':
+        output_partition = None
+
+    return dict(
+        output_format=environ.get(
+            'OUTPUT_FORMAT',
+            'csv'
+        ),
+        output_partition=output_partition,
+        # Simultaneous buoy downloads
+        workers=int(
+            environ.get(
+              'PNBOIA_WORKERS',
+              8
+        )),
+        catalogue_dir=os.path.join(
+            datadir,
+            'cache',
+            'catalogue'
+        ),
+    )
+
+def env_params(obsdir, environ=None):
+    '''
+    Read the arguments of run from the environment variables set by the ponto.input file.
+
+    Returns
+    -------
+    params: dict
+        Keyword arguments of run
+    '''
+    return dict(
+        obsdir=obsdir,
+        **read_limits(environ),
+        **env_options(
+            os.path.dirname(obsdir),
+            environ
+        )
+    )
+
+if __name__ == '__main__':
+    run(**env_params(
+        os.environ['DATATYPE_DIR']
     ))
@@ -0,0 +1,532 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Poll the operational data of PNBOIA
+#            buoys of desired area and append
+#            just the new rows to the file of
+#            each buoy
+
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import urllib3
+
+import pandas as pd
+
+# Make the ponto_utils package, shared by all
+# data types, importable
+sys.path.append(
+    os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)
+)))
+
+from ponto_utils.storage import append_output
+from ponto_utils.sync import (
+    tail_marker,
+    split_appended,
+)
+from ponto_utils.metrics import stage, count
+from ponto_utils.settings import (
+    read_limits,
+    cache_path,
+)
+from download_pnboia_weather import (
+    SUFFIXES,
+    spatial_filter,
+    first_data_path,
+    find_data_url,
+    read_weather_csv,
+    env_options,
+)
+
+# Name of the file, inside the output folder,
+# where the state of each buoy is kept. It
+# must be deleted with the buoy files
+STATE_FILENAME = 'poll_state.json'
+
+############################################
+# SET SOME FUNCTIONS AND/OR VARIABLES ######
+############################################
+def read_state(filepath):
+    '''
+    Read the polling state of the buoys.
+
+    Returns
+    -------
+    state: dict
+        Buoys name as keys and dicts as values, with url (operational data path with the found suffix), etag, last_modified (validators of the last download), last_time (ISO time of the last appended row), size (bytes of the file already read, up to its last whole line), marker (see ponto_utils.sync.tail_marker), header (columns line of the file) and pending (validators of a download whose last line had no line break and was left unread)
+    '''
+    try:
+        with open(filepath) as fp:
+            return json.load(fp)
+    except (FileNotFoundError, ValueError):
+        return dict()
+
+def write_state(state, filepath):
+    '''
+    Write the polling state of the buoys, replacing the file at once.
+    '''
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(filepath)),
+        suffix='.json'
+    )
+
+    with os.fdopen(fd, 'w') as fp:
+        json.dump(state, fp, indent=4)
+
+    os.replace(tmp_path, filepath)
+
+def conditional_get(
+    http,
+    url,
+    etag=None,
+    last_modified=None,
+    offset=None):
+    '''
+    Download url unless it did not change since the download that gave etag and last_modified.
+
+    Parameters
+    ----------
+    http: urllib3.PoolManager
+        Pool of connections shared by all requests
+    url: string
+        File address
+    etag, last_modified: string or None
+        ETag and Last-Modified headers of the previous download
+    offset: integer or None
+        If given just the bytes from offset on are asked (HTTP Range)
+
+    Returns
+    -------
+    response: urllib3.HTTPResponse
+        Answer of the server. Its status is 304 (Not Modified), with no body, when the file did not change, and 206 (Partial Content) when just the bytes from offset on were sent.
+    '''
+    headers = dict()
+
+    if offset is not None:
+        headers['Range'] = 'bytes={0}-'.format(offset)
+
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    return http.request(
+        'GET',
+        url,
+        headers=headers
+    )
+
+def poll_buoy(
+    http,
+    row,
+    entry,
+    obsdir,
+    timemin=None,
+    output_format='csv',
+    output_partition=None):
+    '''
+    Download the operational file of one PNBOIA buoy if it changed and append its new rows to the buoy file.
+
+    After the first poll just the end of the file is asked, from the last whole line already read on (HTTP Range). The file is downloaded again from the start when the server does not send ranges or when the file was rewritten instead of grown.
+
+    Parameters
+    ----------
+    http: urllib3.PoolManager
+        Pool of connections shared by all requests
+    row: pandas.Series
+        Database row of the buoy
+    entry: dict
+        State of the buoy (see read_state). It is updated in place once the new rows are saved.
+    obsdir: string
+        Folder of the buoy files
+    timemin: datetime or None
+        First time step kept in the first poll of the buoy. None means all rows of the operational file.
+    output_format: string
+        Format of the files (see ponto_utils.storage). The default is csv.
+    output_partition: string or None
+        'year' to keep a file per year of each buoy. The default is a single file.
+
+    Returns
+    -------
+    rows: integer
+        Number of appended rows
+    '''
+    with stage('pnboia.poll', buoy=row.short_name):
+        if not entry.get('url'):
+            weather_path = first_data_path(
+                row.operational_data_path
+            )
+
+            if not weather_path:
+                return 0
+
+            entry['url'] = find_data_url(
+                http,
+                weather_path,
+                SUFFIXES
+            )
+
+            if entry['url'] is None:
+                return 0
+
+        offset = None
+
+        if entry.get('marker'):
+            offset = entry['size'] - len(entry['marker']) // 2
+
+        response = conditional_get(
+            http,
+            entry['url'],
+            entry.get('etag'),
+            entry.get('last_modified'),
+            offset
+        )
+
+        # Unchanged since the last poll
+        if response.status == 304:
+            return 0
+
+        # The suffix is probed again in the next
+        # poll
+        if response.status == 404:
+            entry['url'] = None
+            return 0
+
+        # Range not satisfiable: the file shrank
+        if response.status == 416:
+            response = conditional_get(
+                http,
+                entry['url']
+            )
+
+        if response.status not in range(200, 300):
+            raise urllib3.exceptions.HTTPError(
+                '{0} returned status {1}'.format(
+                    entry['url'],
+                    response.status
+            ))
+
+        count(bytes=len(response.data))
+
+        # Offset of content in the file
+        start = 0
+        content = response.data
+
+        if response.status == 206:
+            appended = split_appended(
+                content,
+                entry['marker']
+            )
+
+            if appended is None:
+                # The file was rewritten
+                response = conditional_get(
+                    http,
+                    entry['url']
+                )
+
+                if response.status not in range(200, 300):
+                    raise urllib3.exceptions.HTTPError(
+                        '{0} returned status {1}'.format(
+                            entry['url'],
+                            response.status
+                    ))
+
+                count(bytes=len(response.data))
+                content = response.data
+            else:
+                start = entry['size']
+                content = appended
+
+        # Just whole lines are read. A last line
+        # still being written is read in the next
+        # poll
+        end = content.rfind(b'\n') + 1
+        validators = [
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified')
+        ]
+        lines = content[:end]
+
+        # A last line without line break that did
+        # not change since the previous poll is
+        # a whole line
+        if ((start or end) and end < len(content) and
+            any(validators) and
+            entry.get('pending') == validators):
+            end = len(content)
+            lines = content + b'\n'
+
+        if start == 0:
+            entry['header'] = content[
+                :content.find(b'\n') + 1
+            ].decode('latin-1')
+            body = lines
+            marker = tail_marker(content[:end])
+        else:
+            body = entry['header'].encode('latin-1') + lines
+            # The fetched bytes start with the
+            # previous marker
+            marker = tail_marker(
+                response.data[:len(response.data) - len(content) + end]
+            )
+
+        data = None
+        last_time = entry.get('last_time')
+
+        if last_time:
+            timemin = pd.Timestamp(last_time)
+
+        if lines.strip() and body.count(b'\n') > 1:
+            data = read_weather_csv(
+                body,
+                timemin
+            )
+
+            if not isinstance(data.index, pd.DatetimeIndex):
+                raise ValueError(
+                    '{0} has no datetime column'.format(
+                        entry['url']
+                ))
+
+            # Rows already appended are dropped
+            if last_time:
+                data = data[data.index > timemin]
+
+        if data is not None and not data.empty:
+            data.index.name = 'datetime'
+
+            append_output(
+                data,
+                os.path.join(
+                    obsdir,
+                    'weather_pnboia_{0}'.format(
+                        row.short_name)),
+                output_format,
+                output_partition
+            )
+            entry['last_time'] = data.index.max().isoformat()
+            count(rows=len(data))
+
+        entry['size'] = start + end
+        entry['marker'] = marker
+        entry['etag'] = None
+        entry['last_modified'] = None
+        entry['pending'] = None
+
+        # A last line left unread must be fetched
+        # again even if the file does not change,
+        # so its validators are not sent as
+        # conditional headers
+        if end == len(content):
+            entry['etag'], entry['last_modified'] = validators
+        else:
+            entry['pending'] = validators
+
+        return 0 if data is None else len(data)
+
+async def poll_weather_data(
+    database,
+    obsdir,
+    interval=300,
+    workers=8,
+    timemin=None,
+    output_format='csv',
+    output_partition=None,
+    cycles=None):
+    '''
+    Poll the operational files of PNBOIA buoys, appending the new rows of each buoy to its file in obsdir.
+
+    Every interval seconds all buoys are polled, up to workers at the same time. Conditional requests (ETag/If-Modified-Since) are used, so an unchanged file costs just a 304 answer, just the end of a grown file is downloaded (see poll_buoy), and only the rows newer than the last appended one are kept from a changed file. The state of each buoy is saved in obsdir after each cycle, so a stopped poller resumes where it was.
+
+    A buoy that fails (e.g. server error) is reported and polled again in the next cycle.
+
+    Parameters
+    ----------
+    database: pandas.DataFrame
+        The return of the function spatial_filter
+    obsdir: string
+        Folder of the buoy files
+    interval: integer or float
+        Seconds between the start of two cycles. The default value is 300.
+    workers: integer
+        Number of buoys polled at the same time. The default workers value is 8.
+    timemin: datetime or None
+        First time step kept in the first poll of each buoy. None means all rows of the operational files.
+    output_format: string
+        Format of the files (see ponto_utils.storage). The default is csv.
+    output_partition: string or None
+        'year' to keep a file per year of each buoy. The default is a single file.
+    cycles: integer or None
+        Number of cycles to run. The default runs until cancelled.
+
+    Returns
+    -------
+    appended: dict
+        Buoys name as keys and the number of rows appended in all cycles as values
+    '''
+    workers = max(1, int(workers))
+    state_path = os.path.join(
+        obsdir,
+        STATE_FILENAME
+    )
+    state = read_state(state_path)
+    http = urllib3.PoolManager(
+        maxsize=workers
+    )
+    semaphore = asyncio.Semaphore(workers)
+    rows = [row for _, row in database.iterrows()]
+    appended = {row.short_name: 0 for row in rows}
+
+    async def poll(row):
+        entry = state.setdefault(row.short_name, dict())
+
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(
+                    poll_buoy,
+                    http,
+                    row,
+                    entry,
+                    obsdir,
+                    timemin,
+                    output_format,
+                    output_partition
+                )
+            except (urllib3.exceptions.HTTPError, OSError, ValueError) as exc:
+                print((
+                    '>>>> Polling PNBOIA buoy' +
+                    ' {0} failed: {1}').format(
+                        row.short_name,
+                        exc
+                ))
+                return 0
+
+    cycle = 0
+
+    while cycles is None or cycle < cycles:
+        start = time.monotonic()
+        results = await asyncio.gather(
+            *(poll(row) for row in rows)
+        )
+        write_state(state, state_path)
+
+        for row, new_rows in zip(rows, results):
+            appended[row.short_name] += new_rows
+
+        print((
+            '>>>> {0}: {1} new PNBOIA rows' +
+            ' from {2} buoys').format(
+                pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'),
+                sum(results),
+                sum(1 for new_rows in results if new_rows)
+        ))
+        cycle += 1
+
+        if cycles is None or cycle < cycles:
+            await asyncio.sleep(max(
+                0,
+                interval - (time.monotonic() - start)
+            ))
+
+    return appended
+
+def run(
+    obsdir,
+    lonmin,
+    lonmax,
+    latmin,
+    latmax,
+    timemin=None,
+    interval=300,
+    workers=8,
+    output_format='csv',
+    output_partition=None,
+    catalogue_dir=None,
+    cycles=None):
+    '''
+    Poll the operational data of the PNBOIA buoys of desired area and append the new rows to one file per buoy in obsdir.
+
+    Parameters
+    ----------
+    obsdir: string
+        Folder where files are saved
+    lonmin, lonmax, latmin, latmax: float
+        Desired area limits
+    catalogue_dir: string or None
+        Folder of the stations catalogue cache. The default is cache/catalogue inside the data folder.
+    timemin, interval, workers, output_format, output_partition, cycles:
+        See poll_weather_data
+
+    Returns
+    -------
+    appended: dict
+        The return of poll_weather_data
+    '''
+    os.makedirs(obsdir, exist_ok=True)
+
+    database = spatial_filter(
+        lonmin,
+        lonmax,
+        latmin,
+        latmax,
+        cache_dir=catalogue_dir or cache_path(obsdir, 'catalogue')
+    )
+
+    return asyncio.run(
+        poll_weather_data(
+            database,
+            obsdir,
+            interval,
+            workers,
+            timemin,
+            output_format,
+            output_partition,
+            cycles
+    ))
+
+def env_params(obsdir, environ=None):
+    '''
+    Read the arguments of run from the environment variables set by the ponto.input file.
+
+    The time limit is just used as the first time step of the first poll. The end of the desired time is ignored.
+
+    Returns
+    -------
+    params: dict
+        Keyword arguments of run
+    '''
+    if environ is None:
+        environ = os.environ
+
+    limits = read_limits(environ)
+
+    return dict(
+        obsdir=obsdir,
+        lonmin=limits['lonmin'],
+        lonmax=limits['lonmax'],
+        latmin=limits['latmin'],
+        latmax=limits['latmax'],
+        timemin=limits['timemin'],
+        # Seconds between two polls
+        interval=float(
+            environ.get(
+              'PNBOIA_POLL_INTERVAL',
+              300
+        )),
+        **env_options(
+            os.path.dirname(obsdir),
+            environ
+        )
+    )
+
+if __name__ == '__main__':
+    run(**env_params(
+        os.environ.get('PNBOIA_POLL_DIR') or
+        os.path.join(
+            os.environ['DATADIR'],
+            'pnboia_operational'
+    )))
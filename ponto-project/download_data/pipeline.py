@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Run the download of different data
+#            sources at the same time, sharing a
+#            single worker budget
+
+import os
+import sys
+import time
+import importlib
+
+from concurrent.futures import ThreadPoolExecutor
+
+from ponto_utils.metrics import stage
+from ponto_utils.settings import read_regions
+
+SCRIPTDIR = os.path.dirname(
+    os.path.abspath(__file__)
+)
+
+# Data source name as keys and its data type
+# (the folder of its script and of its data)
+# and script module name as values
+SOURCES = {
+    'pnboia': ('buoy', 'download_pnboia_weather'),
+    'pirata': ('buoy', 'download_pirata_weather'),
+    'en4': ('argo', 'download_argo_en4'),
+}
+
+def load_source(source):
+    '''
+    Import the download script of a data source.
+
+    Scripts are only imported when needed, so the dependencies of sources not requested (e.g. netCDF4 for en4) do not need to be installed.
+
+    Returns
+    -------
+    module: module
+        Script with the run, run_batch, env_params and env_options functions
+    '''
+    datatype, module_name = SOURCES[source]
+    path = os.path.join(SCRIPTDIR, datatype)
+
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+    return importlib.import_module(module_name)
+
+def split_workers(workers, jobs):
+    '''
+    Split a worker budget among jobs in proportion to the workers each one asks for.
+
+    Each job gets at least one worker and the shares never add up to more than the budget. When the budget is smaller than the number of jobs each one gets a single worker, and run_pipeline runs just as many jobs at a time as the budget allows.
+
+    Parameters
+    ----------
+    workers: integer
+        Total budget of workers
+    jobs: dict
+        Sources name as keys and run keyword arguments as values. The workers argument of each job is its weight. Jobs without it weight 1.
+
+    Returns
+    -------
+    shares: dict
+        Sources name as keys and number of workers (at least 1) as values
+    '''
+    weights = {
+        source: max(1, int(kwargs.get('workers', 1)))
+        for source, kwargs in jobs.items()
+    }
+    total = sum(weights.values())
+    workers = max(1, int(workers))
+
+    shares = {
+        source: max(1, workers * weight // total)
+        for source, weight in weights.items()
+    }
+
+    # The minimum of one worker may go over the
+    # budget: the largest shares give it back
+    while sum(shares.values()) > max(workers, len(shares)):
+        largest = max(shares, key=shares.get)
+        shares[largest] -= 1
+
+    return shares
+
+def run_job(source, kwargs, batch=False):
+    '''
+    Run one data source and time it.
+
+    Errors are reported instead of raised, so a failing source does not stop the others.
+
+    Parameters
+    ----------
+    source: string
+        Data source name (see SOURCES)
+    kwargs: dict
+        Keyword arguments of the run function of the source, or of its run_batch function if batch is True
+    batch: bool
+        If True many regions are run at once (see run_batch of each script)
+
+    Returns
+    -------
+    report: dict
+        seconds spent, filepaths written (list, or dict with regions name as keys if batch is True) and error (string or None)
+    '''
+    start = time.perf_counter()
+    filepaths, error = list(), None
+
+    try:
+        module = load_source(source)
+
+        with stage(source + '.run'):
+            if batch:
+                filepaths = module.run_batch(**kwargs)
+            else:
+                filepaths = module.run(**kwargs)
+    except Exception as exc:
+        error = '{0}: {1}'.format(
+            type(exc).__name__,
+            exc
+        )
+
+    return {
+        'seconds': time.perf_counter() - start,
+        'filepaths': filepaths,
+        'error': error,
+    }
+
+def run_pipeline(jobs, workers=None, batch=False):
+    '''
+    Run data sources at the same time.
+
+    Each source runs in its own thread and spreads its work over its own pool of threads or processes, so the total time is the time of the slowest source and not the sum of all of them. Process pools are started by a fork server, so they do not inherit locks held by the threads of other sources. A script calling it must do it under if __name__ == '__main__' (see ponto_utils.processes).
+
+    Parameters
+    ----------
+    jobs: dict
+        Sources name (see SOURCES) as keys and keyword arguments of their run function as values
+    workers: integer or None
+        Worker budget shared by all sources (see split_workers). The default is to let each source use its own workers argument.
+    batch: bool
+        If True jobs hold the keyword arguments of the run_batch function of each source, which downloads once the data of many regions
+
+    Returns
+    -------
+    reports: dict
+        Sources name as keys and the return of run_job as values
+    '''
+    if not jobs:
+        return dict()
+
+    running = len(jobs)
+
+    if workers is not None:
+        shares = split_workers(workers, jobs)
+        jobs = {
+            source: dict(kwargs, workers=shares[source])
+            for source, kwargs in jobs.items()
+        }
+        # With fewer workers than sources, the
+        # sources wait for their turn
+        running = max(1, min(running, int(workers)))
+
+    with ThreadPoolExecutor(running) as executor:
+        futures = {
+            source: executor.submit(
+                run_job,
+                source,
+                kwargs,
+                batch
+            )
+            for source, kwargs in jobs.items()
+        }
+        reports = {
+            source: future.result()
+            for source, future in futures.items()
+        }
+
+    for source, report in reports.items():
+        print((
+            '>> {0} finished in {1:.1f} s').format(
+                source,
+                report['seconds']
+        ))
+        if report['error'] is not None:
+            print((
+                '>> {0} failed with {1}').format(
+                    source,
+                    report['error']
+            ))
+
+    return reports
+
+def env_jobs(datadir, datatypes, environ=None):
+    '''
+    Build the jobs of all sources of the given data types from the environment variables set by the ponto.input file.
+
+    As in ponto_main.sh, sources whose data type folder is not empty are skipped.
+
+    Parameters
+    ----------
+    datadir: string
+        Data folder, with one folder per data type
+    datatypes: list
+        Data types (e.g. ['buoy', 'argo'])
+
+    Returns
+    -------
+    jobs: dict
+        Sources name as keys and run keyword arguments as values
+    '''
+    jobs = dict()
+
+    for datatype in datatypes:
+        obsdir = os.path.join(
+            datadir,
+            datatype
+        )
+        os.makedirs(obsdir, exist_ok=True)
+
+        if os.listdir(obsdir):
+            print((
+                'Folder {0} is not empty').format(
+                    obsdir
+            ))
+            continue
+
+        for source, (source_type, _) in SOURCES.items():
+            if source_type == datatype:
+                jobs[source] = load_source(source).env_params(
+                    obsdir,
+                    environ
+                )
+
+    return jobs
+
+def env_batch_jobs(datadir, datatypes, regions, environ=None):
+    '''
+    Build the batch jobs of all sources of the given data types from the environment variables set by the ponto.input file.
+
+    The data of each region is saved in the <datadir>/<region name>/<data type> folder. Regions whose folder is not empty are skipped.
+
+    Parameters
+    ----------
+    datadir: string
+        Data folder
+    datatypes: list
+        Data types (e.g. ['buoy', 'argo'])
+    regions: dict
+        The return of ponto_utils.settings.read_regions
+
+    Returns
+    -------
+    jobs: dict
+        Sources name as keys and run_batch keyword arguments as values
+    '''
+    jobs = dict()
+
+    for datatype in datatypes:
+        datatype_regions = dict()
+
+        for name, limits in regions.items():
+            obsdir = os.path.join(
+                datadir,
+                name,
+                datatype
+            )
+            os.makedirs(obsdir, exist_ok=True)
+
+            if os.listdir(obsdir):
+                print((
+                    'Folder {0} is not empty').format(
+                        obsdir
+                ))
+                continue
+
+            datatype_regions[name] = dict(
+                obsdir=obsdir,
+                **limits
+            )
+
+        if not datatype_regions:
+            continue
+
+        for source, (source_type, _) in SOURCES.items():
+            if source_type == datatype:
+                jobs[source] = dict(
+                    regions=datatype_regions,
+                    **load_source(source).env_options(
+                        datadir,
+                        environ
+                ))
+
+    return jobs
+
+if __name__ == '__main__':
+    # Worker budget shared by all sources. If
+    # not set each source uses its own setting
+    workers = os.environ.get(
+        'PONTO_WORKERS'
+    )
+    workers = int(workers) if workers else None
+    datatypes = os.environ['DATATYPE'].split('|')
+    # File with many regions to be downloaded
+    # at once
+    batch_file = os.environ.get(
+        'BATCH_FILE'
+    )
+
+    if batch_file:
+        reports = run_pipeline(
+            env_batch_jobs(
+                os.environ['DATADIR'],
+                datatypes,
+                read_regions(batch_file)
+            ),
+            workers,
+            batch=True
+        )
+    else:
+        reports = run_pipeline(
+            env_jobs(
+                os.environ['DATADIR'],
+                datatypes
+            ),
+            workers
+        )
+
+    if any(report['error'] for report in reports.values()):
+        sys.exit(1)
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Helpers shared by the download
+#            scripts of all data types
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Persistent content-addressed cache
+#            of downloaded files with integrity
+#            checks and LRU eviction
+
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import tempfile
+
+from contextlib import contextmanager
+
+def file_sha256(filepath, block_size=2**20):
+    '''
+    Get the sha256 checksum of a file reading it in blocks.
+    '''
+    sha = hashlib.sha256()
+
+    with open(filepath, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+class FileCache:
+    '''
+    Persistent cache of files addressed by their sha256 checksum.
+
+    Each file is stored once in objects/<sha[:2]>/<sha> and an index.json maps logical keys (e.g. a zip filename) to the checksum, size, modification time, last access time and any extra metadata of the file. The index is protected by a file lock, so the cache can be shared by several processes.
+
+    Eviction is never done implicitly: evict must be called when no stored file is in use.
+
+    Parameters
+    ----------
+    directory: string
+        Folder where the cache is kept. It is created if needed.
+    max_size: integer or None
+        Maximum size of the cache in bytes. None means no limit.
+    verify: bool
+        If True the checksum of a file is recomputed when it is read from the cache and its size or modification time changed since it was stored or last checked. If False just its size is checked.
+    '''
+
+    def __init__(self, directory, max_size=None, verify=True):
+        self.directory = directory
+        self.max_size = max_size
+        self.verify = verify
+
+        os.makedirs(
+            os.path.join(directory, 'objects'),
+            exist_ok=True
+        )
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def object_path(self, sha256):
+        return os.path.join(
+            self.directory,
+            'objects',
+            sha256[:2],
+            sha256
+        )
+
+    @contextmanager
+    def _locked_index(self, write=True):
+        # Exclusive lock over the index while it
+        # is read, changed and written back. With
+        # write False the index is just read
+        with open(os.path.join(self.directory, 'index.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            try:
+                index = self._read_index()
+                yield index
+
+                if write:
+                    self._write_index(index)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as fp:
+                return json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return dict()
+
+    def _write_index(self, index):
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.directory,
+            suffix='.json'
+        )
+
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(index, fp, indent=4)
+
+        os.replace(tmp_path, self.index_path)
+
+    def _is_valid(self, entry):
+        path = self.object_path(entry['sha256'])
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+
+        if stat.st_size != entry['size']:
+            return False
+
+        # The checksum is recomputed only when the
+        # file may have changed since it was
+        # stored or last checked
+        if (
+            self.verify and
+            stat.st_mtime_ns != entry.get('mtime_ns') and
+            file_sha256(path) != entry['sha256']):
+
+            return False
+
+        return True
+
+    def _drop(self, index, key):
+        # Remove the key and its file, unless the
+        # same content is used by other keys
+        entry = index.pop(key)
+        in_use = any(
+            other['sha256'] == entry['sha256']
+            for other in index.values()
+        )
+
+        if not in_use:
+            path = self.object_path(entry['sha256'])
+
+            if os.path.exists(path):
+                os.remove(path)
+
+    def lookup(self, key):
+        '''
+        Get the index entry of key, checking the stored file integrity.
+
+        Corrupted or missing files are removed from the cache.
+
+        Returns
+        -------
+        entry: dict or None
+            The entry with sha256, size, mtime_ns, last_access and metadata, or None if key is not cached
+        '''
+        with self._locked_index(write=False) as index:
+            entry = index.get(key)
+
+        if entry is None:
+            return None
+
+        # The checksum is computed out of the lock,
+        # so other processes are not blocked
+        valid = self._is_valid(entry)
+
+        with self._locked_index() as index:
+            current = index.get(key)
+
+            # Replaced or removed by another
+            # process in the meantime
+            if current is None or current['sha256'] != entry['sha256']:
+                return None
+
+            try:
+                mtime_ns = os.stat(
+                    self.object_path(current['sha256'])
+                ).st_mtime_ns
+            except FileNotFoundError:
+                valid = False
+
+            if not valid:
+                self._drop(index, key)
+                return None
+
+            current['mtime_ns'] = mtime_ns
+            current['last_access'] = time.time()
+
+        return dict(current)
+
+    def get(self, key):
+        '''
+        Get the path of the cached file of key.
+
+        Returns
+        -------
+        path: string or None
+            Path of the cached file, or None if key is not cached
+        '''
+        entry = self.lookup(key)
+
+        if entry is None:
+            return None
+
+        return self.object_path(entry['sha256'])
+
+    def put(self, key, filepath, move=True, **metadata):
+        '''
+        Store a file in the cache under key.
+
+        Parameters
+        ----------
+        key: string
+            Logical name of the file
+        filepath: string
+            File to be stored
+        move: bool
+            If True filepath is moved into the cache, otherwise it is copied
+        metadata:
+            Extra values saved in the index entry
+
+        Returns
+        -------
+        path: string
+            Path of the cached file
+        '''
+        sha256 = file_sha256(filepath)
+        size = os.path.getsize(filepath)
+        path = self.object_path(sha256)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if os.path.exists(path):
+            if move:
+                os.remove(filepath)
+        elif move:
+            shutil.move(filepath, path)
+        else:
+            shutil.copyfile(filepath, path)
+
+        with self._locked_index() as index:
+            if key in index and index[key]['sha256'] != sha256:
+                self._drop(index, key)
+
+            index[key] = {
+                'sha256': sha256,
+                'size': size,
+                'mtime_ns': os.stat(path).st_mtime_ns,
+                'last_access': time.time(),
+                'metadata': metadata,
+            }
+
+        return path
+
+    def put_bytes(self, key, content, **metadata):
+        '''
+        Store content in the cache under key. See put.
+        '''
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.directory
+        )
+
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(content)
+
+        return self.put(key, tmp_path, move=True, **metadata)
+
+    def total_size(self):
+        '''
+        Size in bytes of all files in the cache.
+        '''
+        with self._locked_index(write=False) as index:
+            sizes = {
+                entry['sha256']: entry['size']
+                for entry in index.values()
+            }
+
+        return sum(sizes.values())
+
+    def evict(self, max_size=None):
+        '''
+        Remove least recently accessed files until the cache fits max_size.
+
+        Parameters
+        ----------
+        max_size: integer or None
+            Size limit in bytes. The default is the max_size of the cache.
+
+        Returns
+        -------
+        evicted: list
+            Keys removed from the cache
+        '''
+        if max_size is None:
+            max_size = self.max_size
+
+        evicted = list()
+
+        if max_size is None:
+            return evicted
+
+        with self._locked_index() as index:
+            sizes = {
+                entry['sha256']: entry['size']
+                for entry in index.values()
+            }
+            total = sum(sizes.values())
+            keys = sorted(
+                index,
+                key=lambda k: index[k]['last_access']
+            )
+
+            for key in keys:
+                if total <= max_size:
+                    break
+
+                sha256 = index[key]['sha256']
+                self._drop(index, key)
+                evicted.append(key)
+
+                if not any(
+                    entry['sha256'] == sha256
+                    for entry in index.values()):
+                    total -= sizes[sha256]
+
+        return evicted
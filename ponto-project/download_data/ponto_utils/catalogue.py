@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Local cache of the catalogue files
+#            kept in the data-misc repository
+#            and spatial index of the ocean
+#            fixed stations
+
+import io
+import os
+import json
+import time
+import pickle
+import tempfile
+import requests
+
+import numpy as np
+import pandas as pd
+
+STATIONS_URL = (
+    'https://raw.githubusercontent' +
+    '.com/douglasnehme/data-misc/' +
+    'main/ocean_fixed_stations.csv'
+)
+EN4_PATH_URL = (
+    'https://raw.githubusercontent' +
+    '.com/douglasnehme/data-misc/' +
+    'main/en4_path.txt'
+)
+
+def _write_atomic(filepath, content, mode='wb'):
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(filepath)
+    )
+
+    with os.fdopen(fd, mode) as fh:
+        fh.write(content)
+
+    os.replace(tmp_path, filepath)
+
+def fetch_cached(url, cache_dir, max_age=86400, timeout=60):
+    '''
+    Get the content of url keeping a local copy of it.
+
+    The local copy is used without any request while it is younger than max_age. After that it is revalidated with ETag/If-Modified-Since, so an unchanged file costs just a 304 answer. If the server can not be reached the local copy is used.
+
+    Parameters
+    ----------
+    url: string
+        File address
+    cache_dir: string
+        Folder of the local copies. It is created if needed.
+    max_age: integer or float
+        Seconds a local copy is used without revalidation. The default value is one day.
+    timeout: integer or float
+        Seconds to wait for the server
+
+    Returns
+    -------
+    content: bytes
+        File content
+    changed: bool
+        True if the content was downloaded in this call
+    '''
+    os.makedirs(cache_dir, exist_ok=True)
+
+    data_path = os.path.join(
+        cache_dir,
+        os.path.basename(url)
+    )
+    meta_path = data_path + '.json'
+    meta = dict()
+    cached = None
+
+    if os.path.exists(data_path):
+        with open(data_path, 'rb') as fh:
+            cached = fh.read()
+
+        try:
+            with open(meta_path) as fp:
+                meta = json.load(fp)
+        except (FileNotFoundError, ValueError):
+            meta = dict()
+
+        if time.time() - meta.get('checked_at', 0) < max_age:
+            return cached, False
+
+    headers = dict()
+
+    if cached is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    try:
+        response = requests.get(
+            url,
+            headers=headers,
+            timeout=timeout
+        )
+    except requests.RequestException:
+        if cached is not None:
+            return cached, False
+        raise
+
+    if response.status_code == 304 and cached is not None:
+        meta['checked_at'] = time.time()
+        _write_atomic(meta_path, json.dumps(meta), 'w')
+
+        return cached, False
+
+    response.raise_for_status()
+
+    _write_atomic(data_path, response.content)
+    _write_atomic(
+        meta_path,
+        json.dumps({
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'checked_at': time.time(),
+        }),
+        'w'
+    )
+
+    return response.content, True
+
+class StationIndex:
+    '''
+    Grid index over the longitude and latitude of the ocean fixed stations.
+
+    Stations are grouped in cells of cell x cell degrees, so a bounding box query only looks at the stations of the cells it overlaps.
+
+    Parameters
+    ----------
+    database: pandas.DataFrame
+        Stations with lon and lat columns (https://github.com/douglasnehme/data-misc/blob/main/ocean_fixed_stations.csv)
+    cell: float
+        Cell size in degrees. The default value is 1.
+    '''
+
+    def __init__(self, database, cell=1.):
+        self.database = database
+        self.cell = cell
+        self.grid = dict()
+
+        lon = database.lon.values
+        lat = database.lat.values
+        valid = np.flatnonzero(
+            ~np.isnan(lon) &
+            ~np.isnan(lat)
+        )
+        cells = zip(
+            np.floor(lon[valid] / cell).astype(int),
+            np.floor(lat[valid] / cell).astype(int)
+        )
+
+        for position, key in zip(valid, cells):
+            self.grid.setdefault(key, list()).append(position)
+
+        self.grid = {
+            key: np.array(positions)
+            for key, positions in self.grid.items()
+        }
+
+    def query(
+        self,
+        lonmin,
+        lonmax,
+        latmin,
+        latmax,
+        responsible=None
+        ):
+        '''
+        Select stations inside a bounding box, optionally of a single responsible institution.
+
+        Returns
+        -------
+        database: pandas.DataFrame
+            Database rows of the selected stations, in the database order
+        '''
+        xmin = int(np.floor(lonmin / self.cell))
+        xmax = int(np.floor(lonmax / self.cell))
+        ymin = int(np.floor(latmin / self.cell))
+        ymax = int(np.floor(latmax / self.cell))
+
+        # Visit the occupied cells or the cells
+        # of the box, whichever are fewer
+        if (xmax - xmin + 1) * (ymax - ymin + 1) > len(self.grid):
+            keys = [
+                (x, y) for x, y in self.grid
+                if xmin <= x <= xmax and ymin <= y <= ymax
+            ]
+        else:
+            keys = [
+                (x, y)
+                for x in range(xmin, xmax + 1)
+                for y in range(ymin, ymax + 1)
+                if (x, y) in self.grid
+            ]
+
+        if keys:
+            positions = np.sort(np.concatenate(
+                [self.grid[key] for key in keys]
+            ))
+        else:
+            positions = np.array([], dtype=int)
+
+        database = self.database.iloc[positions]
+        database = database[
+            (database.lon >= lonmin) &
+            (database.lon <= lonmax) &
+            (database.lat >= latmin) &
+            (database.lat <= latmax)
+        ]
+
+        if responsible is not None:
+            database = database[
+                database.responsible == responsible
+            ]
+
+        return database
+
+def read_stations(content):
+    '''
+    Parse the ocean_fixed_stations.csv content.
+    '''
+    return pd.read_csv(
+        io.BytesIO(content),
+        sep=',',
+        header=0,
+        na_values=-9999.00
+    )
+
+def load_stations(cache_dir=None, max_age=86400):
+    '''
+    Get the spatial index of the ocean fixed stations.
+
+    With cache_dir the catalogue is downloaded only when it changed, and the parsed and indexed result is kept there as a pickle file.
+
+    Parameters
+    ----------
+    cache_dir: string or None
+        Folder of the local copies. None means always download.
+    max_age: integer or float
+        Seconds a local copy is used without revalidation. See fetch_cached.
+
+    Returns
+    -------
+    index: StationIndex
+    '''
+    if cache_dir is None:
+        response = requests.get(STATIONS_URL, timeout=60)
+        response.raise_for_status()
+
+        return StationIndex(read_stations(response.content))
+
+    content, changed = fetch_cached(
+        STATIONS_URL,
+        cache_dir,
+        max_age
+    )
+    index_path = os.path.join(
+        cache_dir,
+        'ocean_fixed_stations.pkl'
+    )
+
+    if not changed and os.path.exists(index_path):
+        try:
+            with open(index_path, 'rb') as fh:
+                return pickle.load(fh)
+        except (pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+
+    index = StationIndex(read_stations(content))
+    _write_atomic(index_path, pickle.dumps(index))
+
+    return index
+
+def load_en4_path(cache_dir=None, max_age=86400):
+    '''
+    Get the EN4 url where the yearly zip files are located.
+    '''
+    if cache_dir is None:
+        response = requests.get(EN4_PATH_URL, timeout=60)
+        response.raise_for_status()
+        content = response.content
+    else:
+        content, _ = fetch_cached(
+            EN4_PATH_URL,
+            cache_dir,
+            max_age
+        )
+
+    return content.decode('utf-8')
@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Build one pandas.DataFrame from
+#            many pieces with a single aligned
+#            allocation, instead of growing it
+#            with repeated pandas.concat
+
+import numpy as np
+import pandas as pd
+
+from pandas.api.types import union_categoricals
+
+def result_dtype(dtypes, complete):
+    '''
+    Dtype of a column built from pieces of the given dtypes.
+
+    Parameters
+    ----------
+    dtypes: list
+        Dtypes of the pieces with the column
+    complete: bool
+        If the pieces fill every row of the result
+
+    Returns
+    -------
+    dtype: numpy.dtype or None
+        None when the column can not be held by a numpy array (e.g. categorical) and must be built by pandas
+    '''
+    if any(not isinstance(dtype, np.dtype) for dtype in dtypes):
+        return None
+
+    dtype = np.result_type(*dtypes)
+
+    # Missing rows are NaN, as pandas.concat
+    # does with outer joins
+    if not complete and dtype.kind in 'iu':
+        dtype = np.result_type(dtype, np.float64)
+    if not complete and dtype.kind == 'b':
+        dtype = np.dtype(object)
+
+    if dtype.kind not in 'biuf':
+        dtype = np.dtype(object)
+
+    return dtype
+
+def build_frame(index, columns, pieces):
+    '''
+    Allocate the result once and copy each piece to its place.
+
+    Parameters
+    ----------
+    index: pandas.Index
+        Index of the result
+    columns: dict
+        Result column names as keys and their dtype (see result_dtype) as values, in the result order
+    pieces: iterable
+        Tuples (rows, df, names), where rows are the positions of df rows on index (a slice or an array) and names maps df columns to result columns. Each piece is released as soon as it is copied.
+
+    Returns
+    -------
+    data: pandas.DataFrame
+    '''
+    nrows = len(index)
+
+    # One 2D array per dtype. Arrays are
+    # (columns, rows), the layout of pandas
+    # blocks, so no copy is done when the
+    # DataFrame is created
+    groups = dict()
+    where = dict()
+
+    for name, dtype in columns.items():
+        if dtype is not None:
+            group = groups.setdefault(dtype, list())
+            where[name] = (dtype, len(group))
+            group.append(name)
+
+    arrays = dict()
+
+    for dtype, names in groups.items():
+        fill = np.nan if dtype.kind in 'fO' else 0
+        arrays[dtype] = np.full(
+            (len(names), nrows),
+            fill,
+            dtype=dtype
+        )
+
+    # Columns pandas must handle itself
+    extension = {
+        name: list()
+        for name, dtype in columns.items()
+        if dtype is None
+    }
+
+    for rows, df, names in pieces:
+        for column, name in names.items():
+            if name in where:
+                dtype, j = where[name]
+                arrays[dtype][j, rows] = df[column].to_numpy(
+                    dtype=dtype,
+                    na_value=np.nan if dtype.kind in 'fO' else 0
+                )
+            else:
+                extension[name].append((
+                    np.arange(nrows)[rows],
+                    df[column].reset_index(drop=True)
+                ))
+
+    frames = list()
+
+    for dtype, names in groups.items():
+        frames.append(pd.DataFrame(
+            arrays.pop(dtype).T,
+            index=index,
+            columns=names,
+            copy=False
+        ))
+
+    for name, parts in extension.items():
+        series = [series for _, series in parts]
+
+        # pandas.concat turns categoricals with
+        # different categories into object
+        if all(
+            isinstance(s.dtype, pd.CategoricalDtype)
+            for s in series):
+            values = pd.Series(
+                union_categoricals(series)
+            )
+        else:
+            values = pd.concat(
+                series,
+                ignore_index=True
+            )
+        # Position of each value on the result,
+        # -1 for missing rows
+        indexer = np.full(nrows, -1)
+        indexer[np.concatenate(
+            [positions for positions, _ in parts]
+        )] = np.arange(len(values))
+
+        frames.append(pd.DataFrame(
+            {name: values.array.take(indexer, allow_fill=True)},
+            index=index
+        ))
+
+    if not frames:
+        return pd.DataFrame(index=index)
+
+    if len(frames) == 1:
+        data = frames[0]
+    else:
+        data = pd.concat(
+            frames,
+            axis='columns',
+            copy=False
+        )
+
+    # Mixed dtypes only. A single dtype result
+    # is already in order and is not copied
+    if list(data.columns) != list(columns):
+        data = data[list(columns)]
+
+    return data
+
+def stack_frames(frames):
+    '''
+    Stack frames along the index, as pandas.concat(frames, join='outer', axis='index'), with a single allocation.
+
+    Parameters
+    ----------
+    frames: list
+        pandas.DataFrame to stack. The list is emptied while the result is built.
+
+    Returns
+    -------
+    data: pandas.DataFrame
+    '''
+    if len(frames) == 1:
+        return frames.pop()
+
+    index = frames[0].index.append(
+        [df.index for df in frames[1:]]
+    )
+
+    dtypes = dict()
+    count = dict()
+
+    for df in frames:
+        for column, dtype in df.dtypes.items():
+            dtypes.setdefault(column, list()).append(dtype)
+            count[column] = count.get(column, 0) + 1
+
+    columns = {
+        column: result_dtype(
+            dtypes[column],
+            count[column] == len(frames)
+        )
+        for column in dtypes
+    }
+
+    def pieces():
+        start = 0
+
+        while frames:
+            df = frames.pop(0)
+            rows = slice(start, start + len(df))
+            start += len(df)
+
+            yield rows, df, {
+                column: column
+                for column in df.columns
+            }
+
+    return build_frame(index, columns, pieces())
+
+def strictly_increasing(index):
+    '''
+    Test if index is sorted and unique, comparing neighbour values instead of hashing them.
+    '''
+    if not index.is_monotonic_increasing:
+        return False
+
+    values = index.to_numpy()
+
+    return not (values[1:] == values[:-1]).any()
+
+def sorted_rows(index, other):
+    '''
+    Find the rows of other on index, without hashing. Both must be strictly increasing (see strictly_increasing).
+
+    Parameters
+    ----------
+    index, other: pandas.Index
+
+    Returns
+    -------
+    rows: slice, numpy.ndarray or None
+        Positions of other on index: a slice when other is a run of consecutive rows of index, an array otherwise and None if some value of other is not in index
+    '''
+    if other is index:
+        return slice(None)
+
+    if len(other) > len(index):
+        return None
+
+    start = 0
+
+    if len(other):
+        start = index.searchsorted(other[0])
+
+    stop = start + len(other)
+
+    if stop <= len(index) and index[start:stop].equals(other):
+        return slice(start, stop)
+
+    rows = index.searchsorted(other)
+
+    if rows[-1] >= len(index) or not index.take(rows).equals(other):
+        return None
+
+    return rows
+
+def join_frames(frames):
+    '''
+    Join frames side by side on the union of their index, as pandas.concat(frames, join='outer', axis='columns'), with a single allocation.
+
+    Sorted indexes (e.g. the time axes of the variables of a buoy) are not hashed. When an index holds all the others it is reused as the result index, and each frame is placed by a slice when its index is a run of consecutive rows of the result, or by binary search otherwise.
+
+    Parameters
+    ----------
+    frames: list
+        Tuples (df, names), where names maps df columns to result columns (a rename done on the fly). The list is emptied while the result is built.
+
+    Returns
+    -------
+    data: pandas.DataFrame
+    '''
+    # Frames often share the same index object
+    indexes = {
+        id(df.index): df.index
+        for df, _ in frames
+    }
+    ordered = all(
+        strictly_increasing(index)
+        for index in indexes.values()
+    )
+
+    if not ordered and not all(
+        index.is_unique
+        for index in indexes.values()):
+        # Rows can not be aligned by position
+        data = pd.concat(
+            [df.rename(columns=names) for df, names in frames],
+            axis='columns',
+            join='outer'
+        )
+        frames.clear()
+
+        return data
+
+    index = frames[0][0].index
+    # Index objects as keys and their rows on
+    # the index they were found in as values
+    found = dict()
+
+    for df, _ in frames[1:]:
+        if ordered:
+            rows = sorted_rows(index, df.index)
+
+            if rows is not None:
+                found[id(df.index)] = (index, rows)
+                continue
+
+            if sorted_rows(df.index, index) is not None:
+                index = df.index
+                continue
+        elif df.index.equals(index):
+            continue
+
+        index = index.union(df.index)
+
+    # The union is not sorted when its values
+    # can not be compared
+    ordered = ordered and index.is_monotonic_increasing
+
+    columns = dict()
+
+    for df, names in frames:
+        complete = len(df) == len(index)
+
+        for column, dtype in df.dtypes.items():
+            columns[names[column]] = result_dtype(
+                [dtype],
+                complete
+            )
+
+    def pieces():
+        while frames:
+            df, names = frames.pop(0)
+            where, rows = found.get(
+                id(df.index),
+                (None, None)
+            )
+
+            # Rows already found on the result
+            # index are reused
+            if where is not index:
+                if ordered:
+                    rows = sorted_rows(index, df.index)
+                elif df.index.equals(index):
+                    rows = slice(None)
+                else:
+                    rows = index.get_indexer(df.index)
+
+                found[id(df.index)] = (index, rows)
+
+            yield rows, df, names
+
+    return build_frame(index, columns, pieces())
+
+def downcast_floats(df, max_decimals=6):
+    '''
+    Convert float64 columns to float32 where no precision is lost.
+
+    A column is converted when all its values have at most max_decimals decimal places and are recovered, at that number of decimal places, from float32. Columns with more significant digits than float32 holds are kept as float64.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        Data to be converted. It is changed in place.
+    max_decimals: integer
+        Largest number of decimal places tested
+
+    Returns
+    -------
+    df: pandas.DataFrame
+    '''
+    for column, dtype in df.dtypes.items():
+        if dtype != np.float64:
+            continue
+
+        values = df[column].to_numpy()
+        finite = np.isfinite(values)
+        numbers = values[finite]
+
+        # Decimal places of the source values
+        for decimals in range(max_decimals + 1):
+            if np.array_equal(np.round(numbers, decimals), numbers):
+                break
+        else:
+            continue
+
+        small = values.astype(np.float32)
+
+        if np.array_equal(
+            np.round(small[finite].astype(np.float64), decimals),
+            numbers):
+            df[column] = small
+
+    return df
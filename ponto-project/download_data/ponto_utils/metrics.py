@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Measure each stage of the downloads
+#            (time, CPU, memory, bytes and rows)
+#            and write it as JSON lines, with an
+#            optional profiler hook
+
+import os
+import sys
+import json
+import time
+import itertools
+import threading
+
+from datetime import datetime
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+# Stages open in each thread, innermost last
+_local = threading.local()
+_counter = itertools.count()
+
+def _reset_after_fork():
+    # A process forked by a pool (e.g. the
+    # PIRATA parsers) starts without the stages
+    # and the profiler of the thread that forked
+    # it
+    _local.stack = list()
+    sys.setprofile(None)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(
+        after_in_child=_reset_after_fork
+    )
+
+def metrics_path(environ=None):
+    '''
+    Path of the JSON lines file where stages are written, taken from PONTO_METRICS. None means metrics are off.
+    '''
+    if environ is None:
+        environ = os.environ
+
+    return environ.get('PONTO_METRICS') or None
+
+def peak_rss_mb():
+    '''
+    Peak resident memory of the current process, in MB, or None where it can not be measured.
+    '''
+    if resource is None:
+        return None
+
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(
+        resource.RUSAGE_SELF
+    ).ru_maxrss / 1024
+
+def path_size(path):
+    '''
+    Size in bytes of a file, or of all files inside a folder (e.g. a zarr store).
+    '''
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+def write_record(record, path):
+    '''
+    Append one record to the JSON lines file path.
+
+    The line is written by a single call on a file opened in append mode, so records of different threads and processes are not mixed.
+    '''
+    line = json.dumps(
+        record,
+        default=str
+    ) + '\n'
+
+    fd = os.open(
+        path,
+        os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+        0o644
+    )
+
+    try:
+        os.write(fd, line.encode('utf-8'))
+    finally:
+        os.close(fd)
+
+def start_profiler(environ=None):
+    '''
+    Start a profiler on the current thread if PONTO_PROFILE is set.
+
+    PONTO_PROFILER chooses the profiler: "cprofile" (default) or "pyinstrument", which must be installed.
+
+    Returns
+    -------
+    profiler: cProfile.Profile, pyinstrument.Profiler or None
+    '''
+    if environ is None:
+        environ = os.environ
+
+    if not environ.get('PONTO_PROFILE'):
+        return None
+
+    if environ.get('PONTO_PROFILER', 'cprofile') == 'pyinstrument':
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+    else:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    return profiler
+
+def stop_profiler(profiler, name, environ=None):
+    '''
+    Stop profiler and save its result in the PONTO_PROFILE folder, as <name>-<pid>-<n>.prof (cProfile, readable by pstats or snakeviz) or .html (pyinstrument).
+
+    Returns
+    -------
+    filepath: string
+        Path of the saved profile
+    '''
+    if environ is None:
+        environ = os.environ
+
+    directory = environ['PONTO_PROFILE']
+    os.makedirs(directory, exist_ok=True)
+
+    filepath = os.path.join(
+        directory,
+        '{0}-{1}-{2}'.format(
+            name,
+            os.getpid(),
+            next(_counter)
+    ))
+
+    if hasattr(profiler, 'output_html'):
+        profiler.stop()
+        filepath += '.html'
+
+        with open(filepath, 'w') as fh:
+            fh.write(profiler.output_html())
+    else:
+        profiler.disable()
+        filepath += '.prof'
+        profiler.dump_stats(filepath)
+
+    return filepath
+
+@contextmanager
+def stage(name, **labels):
+    '''
+    Measure a block of code as one stage.
+
+    When PONTO_METRICS is set, a JSON line is appended to that file at the end of the stage with:
+
+    - stage, parent (name of the enclosing stage of the same thread) and error (exception name, if one was raised)
+    - the labels given here and the ones of the enclosing stages (e.g. buoy, variable, month)
+    - start, wall_seconds, cpu_seconds (CPU time of the current thread, so work handed to other threads or processes is measured by their own stages), peak_rss_mb (of the current process) and pid
+    - the counters added with count (e.g. bytes, rows)
+
+    When PONTO_PROFILE is set, the outermost stage of each thread is also profiled (see start_profiler).
+
+    Parameters
+    ----------
+    name: string
+        Stage name, prefixed by the data source (e.g. "pirata.download")
+    labels:
+        Values that identify what is processed
+
+    Yields
+    ------
+    record: dict
+        The record of the stage. More values can be set in it while the stage runs.
+    '''
+    stack = getattr(_local, 'stack', None)
+
+    if stack is None:
+        stack = _local.stack = list()
+
+    parent_labels = dict()
+    parent = None
+
+    if stack:
+        parent, parent_labels = stack[-1]
+
+    labels = dict(parent_labels, **labels)
+    record = dict(
+        stage=name,
+        **labels
+    )
+
+    if parent is not None:
+        record['parent'] = parent['stage']
+
+    path = metrics_path()
+    profiler = None
+
+    # Profilers are set per thread, so nested
+    # stages are covered by the outer one
+    if not stack:
+        profiler = start_profiler()
+
+    stack.append((record, labels))
+    start = datetime.now()
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+
+    try:
+        yield record
+    except BaseException as exc:
+        record['error'] = type(exc).__name__
+        raise
+    finally:
+        stack.pop()
+
+        if profiler is not None:
+            stop_profiler(profiler, name)
+
+        if path is not None:
+            record.update(
+                start=start.isoformat(),
+                wall_seconds=time.perf_counter() - wall,
+                cpu_seconds=time.thread_time() - cpu,
+                peak_rss_mb=peak_rss_mb(),
+                pid=os.getpid(),
+            )
+            write_record(record, path)
+
+def count(**values):
+    '''
+    Add values (e.g. bytes=1024, rows=10) to the counters of the innermost open stage of the current thread. Nothing is done outside a stage.
+    '''
+    stack = getattr(_local, 'stack', None)
+
+    if not stack:
+        return
+
+    record = stack[-1][0]
+
+    for key, value in values.items():
+        record[key] = record.get(key, 0) + value
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Start the process pools of the
+#            download scripts safely while other
+#            threads are running
+
+import threading
+import multiprocessing
+
+# Modules imported by the fork server before it
+# starts any worker
+PRELOAD = set()
+PRELOAD_LOCK = threading.Lock()
+
+def process_context(*preload):
+    '''
+    Get the multiprocessing context of the process pools of the download scripts.
+
+    Workers are started by a fork server instead of forked from the calling process, whose other threads (downloads, or other data sources run by the pipeline) may hold locks or open connections that a forked worker would inherit.
+
+    As with the spawn start method, each worker imports the main module again, so a script that starts the pools must do it under if __name__ == '__main__'. Otherwise the workers fail and the pool raises concurrent.futures.process.BrokenProcessPool.
+
+    Parameters
+    ----------
+    preload: string
+        Names of installed packages imported by the fork server once, so the workers start with them already imported (e.g. pandas). The fork server does not see the folders added to sys.path, so the download scripts themselves are imported by each worker. Packages given after the fork server started are also imported by each worker.
+
+    Returns
+    -------
+    context: multiprocessing.context.ForkServerContext
+        To be passed as mp_context to concurrent.futures.ProcessPoolExecutor
+    '''
+    context = multiprocessing.get_context('forkserver')
+
+    with PRELOAD_LOCK:
+        PRELOAD.update(preload)
+        context.set_forkserver_preload(sorted(PRELOAD))
+
+    return context
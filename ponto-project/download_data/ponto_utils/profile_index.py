@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Persistent index of the position,
+#            time and project of the profiles of
+#            monthly files, to find the profiles
+#            of an area and time without opening
+#            the files
+
+import os
+import zipfile
+import tempfile
+
+import numpy as np
+
+def profile_columns(nc):
+    '''
+    Read the indexed variables of each profile of a profiles file.
+
+    Parameters
+    ----------
+    nc: xarray.Dataset
+        A profiles file (e.g. an EN4 monthly file) with LONGITUDE, LATITUDE, JULD and PROJECT_NAME along N_PROF
+
+    Returns
+    -------
+    columns: dict
+        Variables names as keys and arrays along N_PROF as values
+    '''
+    return dict(
+        LONGITUDE=nc['LONGITUDE'].values,
+        LATITUDE=nc['LATITUDE'].values,
+        JULD=nc['JULD'].values,
+        # Just the first four characters of the
+        # project name are compared
+        PROJECT_NAME=nc['PROJECT_NAME'].values.astype('|S4'),
+    )
+
+class ProfileIndex:
+    '''
+    Index of the profiles of the monthly files of one year.
+
+    For each indexed month the columns of profile_columns are kept in the N_PROF order of the monthly file, so a query gives the N_PROF offsets of the profiles to read. Months not indexed are unknown and must be read.
+
+    The index is tied to the modification time of its source (e.g. a yearly zip file on the server) and is discarded when the source changes. It is saved as an uncompressed npz file, about 20 bytes per profile for EN4, replaced atomically. When many processes update the same index the last one to save wins, and months missing from it are just indexed again later.
+
+    Parameters
+    ----------
+    source_mtime: float or None
+        Modification time of the source of the indexed months
+    '''
+
+    def __init__(self, source_mtime=None):
+        self.source_mtime = source_mtime
+        self.months = dict()
+
+    def __contains__(self, ym):
+        return ym in self.months
+
+    def add(self, ym, columns):
+        '''
+        Index the profiles of a month.
+
+        Parameters
+        ----------
+        ym: string
+            Month as YYYYMM
+        columns: dict
+            The return of profile_columns for the monthly file
+        '''
+        self.months[ym] = columns
+
+    def query(
+        self,
+        ym,
+        lonmin,
+        lonmax,
+        latmin,
+        latmax,
+        timemin,
+        timemax,
+        project=b'ARGO'):
+        '''
+        Get the offsets of the profiles of an indexed month inside desired area and time.
+
+        Parameters
+        ----------
+        ym: string
+            Month as YYYYMM
+        lonmin, lonmax, latmin, latmax: float
+            Desired area limits
+        timemin, timemax: datetime
+            Desired time limits
+        project: bytes
+            First four characters of the desired PROJECT_NAME
+
+        Returns
+        -------
+        profiles: numpy.ndarray
+            Indices along N_PROF of the selected profiles
+        '''
+        columns = self.months[ym]
+        lon = columns['LONGITUDE']
+        lat = columns['LATITUDE']
+        juld = columns['JULD']
+
+        mask = (
+            (lon >= lonmin) &
+            (lon <= lonmax) &
+            (lat >= latmin) &
+            (lat <= latmax) &
+            (juld >= np.datetime64(timemin)) &
+            (juld <= np.datetime64(timemax)) &
+            (columns['PROJECT_NAME'] == project)
+        )
+
+        return np.flatnonzero(mask)
+
+    def save(self, filepath):
+        '''
+        Write the index to filepath.
+        '''
+        months = sorted(self.months)
+        arrays = dict(
+            months=np.array(months, dtype='U6'),
+            counts=np.array(
+                [self.months[ym]['JULD'].size for ym in months],
+                dtype='int64'
+            ),
+            source_mtime=np.array(
+                np.nan if self.source_mtime is None
+                else self.source_mtime
+            ),
+        )
+
+        for name in ('LONGITUDE', 'LATITUDE', 'JULD', 'PROJECT_NAME'):
+            arrays[name] = np.concatenate(
+                [self.months[ym][name] for ym in months]
+            ) if months else np.array([])
+
+        directory = os.path.dirname(os.path.abspath(filepath))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=directory,
+            suffix='.npz'
+        )
+
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                np.savez(fh, **arrays)
+
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, filepath, source_mtime=None):
+        '''
+        Read the index saved in filepath.
+
+        Parameters
+        ----------
+        filepath: string
+            Path of the index file
+        source_mtime: float or None
+            Current modification time of the source. When it differs from the one of the saved index, an empty index is returned. None (unknown, e.g. offline) trusts the saved index.
+
+        Returns
+        -------
+        index: ProfileIndex
+            The saved index, or an empty one if filepath is missing, unreadable or out of date
+        '''
+        try:
+            with np.load(filepath) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+
+            saved_mtime = float(arrays['source_mtime'])
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return cls(source_mtime)
+
+        if np.isnan(saved_mtime):
+            saved_mtime = None
+
+        if source_mtime is not None and saved_mtime != source_mtime:
+            return cls(source_mtime)
+
+        index = cls(saved_mtime)
+        ends = np.cumsum(arrays['counts'])
+
+        for ym, start, end in zip(
+            arrays['months'],
+            ends - arrays['counts'],
+            ends):
+
+            index.add(str(ym), {
+                name: arrays[name][start:end]
+                for name in ('LONGITUDE', 'LATITUDE', 'JULD', 'PROJECT_NAME')
+            })
+
+        return index
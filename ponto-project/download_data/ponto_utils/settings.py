@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Read the settings shared by all data
+#            types from the environment variables
+#            set by the ponto.input file
+
+import os
+import json
+
+import pandas as pd
+
+def read_limits(environ=None):
+    '''
+    Read the desired area and time.
+
+    Parameters
+    ----------
+    environ: dict or None
+        Environment variables. The default is os.environ.
+
+    Returns
+    -------
+    limits: dict
+        lonmin, lonmax, latmin, latmax (float) and timemin, timemax (pandas.Timestamp)
+    '''
+    if environ is None:
+        environ = os.environ
+
+    # Desired area
+    limits = {
+        name: float(environ[variable])
+        for name, variable in (
+            ('lonmin', 'LON_MIN'),
+            ('lonmax', 'LON_MAX'),
+            ('latmin', 'LAT_MIN'),
+            ('latmax', 'LAT_MAX'),
+        )
+    }
+    # Desired time
+    for name, variable in (
+        ('timemin', 'DATETIME_MIN'),
+        ('timemax', 'DATETIME_MAX')):
+
+        limits[name] = pd.to_datetime(
+            environ[variable],
+            format='%d-%m-%Y %H:%M:%S'
+        )
+
+    return limits
+
+def cache_path(obsdir, name):
+    '''
+    Default folder of a local cache: cache/<name> inside the data folder, beside the data type folders.
+
+    The cache is kept out of obsdir because the system only downloads data into empty data type folders.
+    '''
+    return os.path.join(
+        os.path.dirname(obsdir),
+        'cache',
+        name
+    )
+
+def read_regions(filepath):
+    '''
+    Read a batch request file.
+
+    The file is a JSON list of regions. Each one has a "name" and the LON_MIN, LON_MAX, LAT_MIN, LAT_MAX, DATETIME_MIN and DATETIME_MAX settings written as in the ponto.input file, e.g.
+
+        [{"name": "santos", "LON_MIN": -47, "LON_MAX": -45,
+          "LAT_MIN": -26, "LAT_MAX": -24,
+          "DATETIME_MIN": "01-01-2020 00:00:00",
+          "DATETIME_MAX": "31-12-2020 23:00:00"}]
+
+    Returns
+    -------
+    regions: dict
+        Regions name as keys and their limits (see read_limits) as values, in the file order
+    '''
+    with open(filepath) as fp:
+        requests = json.load(fp)
+
+    regions = dict()
+
+    for request in requests:
+        name = str(request['name'])
+
+        if name in regions:
+            raise ValueError(
+                'Region {0} is repeated in {1}'.format(
+                    name,
+                    filepath
+            ))
+
+        regions[name] = read_limits(request)
+
+    return regions
+
+def union_limits(regions):
+    '''
+    Smallest area and time holding all regions.
+
+    Parameters
+    ----------
+    regions: iterable
+        Limits (see read_limits) of each region
+
+    Returns
+    -------
+    limits: dict
+        Same keys of read_limits
+    '''
+    regions = list(regions)
+
+    return dict(
+        lonmin=min(r['lonmin'] for r in regions),
+        lonmax=max(r['lonmax'] for r in regions),
+        latmin=min(r['latmin'] for r in regions),
+        latmax=max(r['latmax'] for r in regions),
+        timemin=min(r['timemin'] for r in regions),
+        timemax=max(r['timemax'] for r in regions),
+    )
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Read and write pandas.DataFrame
+#            in csv and columnar formats
+
+import os
+import csv
+
+import pandas as pd
+
+# File extension of each supported format
+EXTENSIONS = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'feather': '.feather',
+    'pickle': '.pkl',
+}
+
+def has_pyarrow():
+    '''
+    Test if pyarrow, needed by parquet and feather formats, is installed.
+    '''
+    try:
+        import pyarrow
+    except ImportError:
+        return False
+
+    return True
+
+def default_format():
+    '''
+    Best columnar format available: parquet if pyarrow is installed, otherwise pickle.
+    '''
+    if has_pyarrow():
+        return 'parquet'
+
+    return 'pickle'
+
+def write_frame(df, path, fmt):
+    '''
+    Write df to path in format fmt, keeping its index.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        Data to be saved
+    path: string
+        File path, without extension
+    fmt: string
+        One of the EXTENSIONS keys
+
+    Returns
+    -------
+    filepath: string
+        Path of the written file, with extension
+    '''
+    filepath = path + EXTENSIONS[fmt]
+
+    if fmt == 'csv':
+        df.to_csv(
+            filepath,
+            na_rep='NaN'
+        )
+    elif fmt == 'parquet':
+        df.to_parquet(
+            filepath,
+            compression='zstd'
+        )
+    elif fmt == 'feather':
+        # Feather does not keep the index
+        df.reset_index().to_feather(
+            filepath,
+            compression='zstd'
+        )
+    else:
+        df.to_pickle(filepath)
+
+    return filepath
+
+def read_frame(path, fmt, index_col='datetime'):
+    '''
+    Read a file written by write_frame.
+
+    Parameters
+    ----------
+    path: string
+        File path, without extension
+    fmt: string
+        One of the EXTENSIONS keys
+    index_col: string
+        Name of the index column of csv and feather files
+
+    Returns
+    -------
+    df: pandas.DataFrame
+    '''
+    filepath = path + EXTENSIONS[fmt]
+
+    if fmt == 'csv':
+        return pd.read_csv(
+            filepath,
+            index_col=index_col,
+            parse_dates=True
+        )
+
+    if fmt == 'parquet':
+        return pd.read_parquet(filepath)
+
+    if fmt == 'feather':
+        return pd.read_feather(filepath).set_index(index_col)
+
+    return pd.read_pickle(filepath)
+
+def frame_exists(path, fmt):
+    '''
+    Test if a file written by write_frame exists.
+    '''
+    return os.path.exists(path + EXTENSIONS[fmt])
+
+def append_frame(df, path, fmt):
+    '''
+    Append the rows of df to a file written by write_frame, or write it if it does not exist yet.
+
+    A csv file with all the columns of df is appended in place. Otherwise (columnar formats or new columns) the file is read, joined with df and written again.
+
+    Returns
+    -------
+    filepath: string
+        Path of the written file, with extension
+    '''
+    filepath = path + EXTENSIONS[fmt]
+
+    if not os.path.exists(filepath):
+        return write_frame(df, path, fmt)
+
+    if fmt == 'csv':
+        with open(filepath, newline='') as fh:
+            # The first column is the index
+            columns = next(csv.reader(fh))[1:]
+
+        if set(df.columns) <= set(columns):
+            df.reindex(columns=columns).to_csv(
+                filepath,
+                mode='a',
+                header=False,
+                na_rep='NaN'
+            )
+            return filepath
+
+    stored = read_frame(
+        path,
+        fmt,
+        df.index.name or 'datetime'
+    )
+
+    return write_frame(
+        pd.concat([stored, df]),
+        path,
+        fmt
+    )
+
+def write_output(df, path, fmt='csv', partition=None):
+    '''
+    Write a data file with datetime index, optionally split by year.
+
+    With partition as 'year' path becomes a folder with one year=YYYY/data file per year (the hive layout, so a parquet folder can be read at once by pandas.read_parquet and filtered by year).
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        Data with pandas.DatetimeIndex
+    path: string
+        File or folder path, without extension
+    fmt: string
+        One of the EXTENSIONS keys. The default is csv.
+    partition: string or None
+        None to write a single file or 'year' to write a file per year
+
+    Returns
+    -------
+    filepaths: list
+        Paths of the written files
+    '''
+    if partition is None:
+        return [write_frame(df, path, fmt)]
+
+    if partition != 'year':
+        raise ValueError(
+            'Unknown partition: {0}'.format(partition)
+        )
+
+    filepaths = list()
+
+    for year, part in df.groupby(df.index.year):
+        year_dir = os.path.join(
+            path,
+            'year={0}'.format(year)
+        )
+        os.makedirs(year_dir, exist_ok=True)
+        filepaths.append(
+            write_frame(
+                part,
+                os.path.join(year_dir, 'data'),
+                fmt
+        ))
+
+    return filepaths
+
+def append_output(df, path, fmt='csv', partition=None):
+    '''
+    Append the rows of df to the files written by write_output, keeping its layout. Each year of df is appended to its own file when partition is 'year'.
+
+    Returns
+    -------
+    filepaths: list
+        Paths of the changed files
+    '''
+    if partition is None:
+        return [append_frame(df, path, fmt)]
+
+    if partition != 'year':
+        raise ValueError(
+            'Unknown partition: {0}'.format(partition)
+        )
+
+    filepaths = list()
+
+    for year, part in df.groupby(df.index.year):
+        year_dir = os.path.join(
+            path,
+            'year={0}'.format(year)
+        )
+        os.makedirs(year_dir, exist_ok=True)
+        filepaths.append(
+            append_frame(
+                part,
+                os.path.join(year_dir, 'data'),
+                fmt
+        ))
+
+    return filepaths
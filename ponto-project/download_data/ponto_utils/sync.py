@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Keep track of remote files already
+#            downloaded and parsed, so unchanged
+#            files are not fetched again
+
+import os
+import json
+import tempfile
+
+from ponto_utils import storage
+
+# Bytes before the end of a file already read
+# that are downloaded again with the bytes
+# appended to it, to check that the file just
+# grew and was not rewritten
+TAIL_OVERLAP = 64
+
+def tail_marker(content):
+    '''
+    Last TAIL_OVERLAP bytes of a file content as a hex string, kept to later download just the bytes appended to the file (see split_appended).
+    '''
+    return content[-TAIL_OVERLAP:].hex()
+
+def split_appended(fetched, marker):
+    '''
+    Get the bytes appended to a file since marker was taken.
+
+    Parameters
+    ----------
+    fetched: bytes
+        File content from the offset of marker (the end of the file already read minus the marker length) on
+    marker: string
+        The return of tail_marker for the file already read
+
+    Returns
+    -------
+    appended: bytes or None
+        The bytes after the marker, or None if fetched does not start with the marker, meaning the file was rewritten
+    '''
+    overlap = bytes.fromhex(marker)
+
+    if not fetched.startswith(overlap):
+        return None
+
+    return fetched[len(overlap):]
+
+class SyncManifest:
+    '''
+    Local store of parsed remote files and manifest of their remote size and modification time.
+
+    The manifest.json file maps each remote file name to its size, modification time and metadata. The parsed data of each file is kept in the frames folder in a columnar format.
+
+    A file can also be stored with a tail marker (see tail_marker), so when it grows only its appended bytes need to be downloaded (see appended_since).
+
+    Parameters
+    ----------
+    directory: string
+        Folder of the store. It is created if needed.
+    fmt: string or None
+        Format of stored frames (see ponto_utils.storage). The default is the best available.
+    options: dict or None
+        Parsing options of the stored frames. Frames stored with other options are not current.
+    '''
+
+    def __init__(self, directory, fmt=None, options=None):
+        self.directory = directory
+        self.fmt = fmt or storage.default_format()
+        self.options = options or dict()
+        self.frames_dir = os.path.join(directory, 'frames')
+
+        os.makedirs(self.frames_dir, exist_ok=True)
+
+        self.entries = self._read()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, 'manifest.json')
+
+    def _read(self):
+        try:
+            with open(self.manifest_path) as fp:
+                return json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return dict()
+
+    def save(self):
+        '''
+        Write the manifest to disk.
+        '''
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.directory,
+            suffix='.json'
+        )
+
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(self.entries, fp, indent=4)
+
+        os.replace(tmp_path, self.manifest_path)
+
+    def frame_path(self, name):
+        return os.path.join(self.frames_dir, name)
+
+    def is_current(self, name, size, mtime):
+        '''
+        Test if name was already parsed with the same remote size and modification time.
+        '''
+        entry = self.entries.get(name)
+
+        if entry is None or entry.get('fmt') != self.fmt:
+            return False
+
+        if entry.get('options', dict()) != self.options:
+            return False
+
+        return (
+            entry['size'] == size and
+            entry['mtime'] == mtime and
+            storage.frame_exists(self.frame_path(name), self.fmt)
+        )
+
+    def load(self, name):
+        '''
+        Get the stored data of name.
+
+        Returns
+        -------
+        df: pandas.DataFrame
+            Parsed data
+        meta: dict
+            Metadata saved with the data
+        '''
+        df = storage.read_frame(
+            self.frame_path(name),
+            self.fmt
+        )
+
+        return df, self.entries[name]['meta']
+
+    def appended_since(self, name, size):
+        '''
+        Test if name was stored with a tail marker and has grown to size since, so just its end needs to be downloaded.
+
+        Returns
+        -------
+        tail: tuple or None
+            Offset where the download must start and the tail marker to check the downloaded bytes with (see split_appended), or None if the whole file must be downloaded
+        '''
+        entry = self.entries.get(name)
+
+        if entry is None or not entry.get('tail'):
+            return None
+
+        if entry.get('fmt') != self.fmt:
+            return None
+
+        if entry.get('options', dict()) != self.options:
+            return None
+
+        if not storage.frame_exists(self.frame_path(name), self.fmt):
+            return None
+
+        tail = entry['tail']
+
+        if size <= tail['size']:
+            return None
+
+        return (
+            tail['size'] - len(tail['marker']) // 2,
+            tail['marker']
+        )
+
+    def store(self, name, size, mtime, df, meta, tail=None):
+        '''
+        Save the parsed data of name and its remote size and modification time.
+
+        tail is an optional tuple with the size of the file read and its tail marker (see tail_marker).
+
+        save must be called to write the manifest to disk.
+        '''
+        storage.write_frame(
+            df,
+            self.frame_path(name),
+            self.fmt
+        )
+        self.entries[name] = {
+            'size': size,
+            'mtime': mtime,
+            'fmt': self.fmt,
+            'options': self.options,
+            'meta': meta,
+        }
+
+        if tail is not None:
+            self.entries[name]['tail'] = {
+                'size': tail[0],
+                'marker': tail[1],
+            }
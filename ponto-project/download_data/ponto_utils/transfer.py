@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+# CRIATION: oct/2026
+# OBJECTIVE: Resumable HTTP download of large
+#            files in parallel byte ranges, with
+#            retry and size check
+
+import os
+import json
+import time
+import threading
+import email.utils
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+
+from ponto_utils.metrics import count
+
+class DownloadError(Exception):
+    '''
+    A file could not be completely downloaded.
+    '''
+
+def remote_file_info(url, timeout=60):
+    '''
+    Get the size, range support and modification time of url from a HEAD request.
+
+    Returns
+    -------
+    size: integer or None
+        Content-Length, or None if the server did not tell it
+    ranges: bool
+        True if the server accepts byte range requests
+    mtime: float or None
+        POSIX timestamp of the Last-Modified header
+    '''
+    response = requests.head(
+        url,
+        allow_redirects=True,
+        timeout=timeout
+    )
+    response.raise_for_status()
+
+    size = response.headers.get('Content-Length')
+    modified = response.headers.get('Last-Modified')
+    mtime = None
+
+    if modified:
+        mtime = email.utils.parsedate_to_datetime(
+            modified
+        ).timestamp()
+
+    return (
+        int(size) if size is not None else None,
+        response.headers.get('Accept-Ranges', '').lower() == 'bytes',
+        mtime
+    )
+
+def split_ranges(size, segments, min_segment_size):
+    '''
+    Split [0, size) in at most segments byte ranges of at least min_segment_size bytes.
+
+    Returns
+    -------
+    ranges: list
+        Lists [start, end, done], with end inclusive and done the number of bytes already written
+    '''
+    segments = max(1, min(segments, size // max(min_segment_size, 1)))
+    bounds = [
+        size * i // segments
+        for i in range(segments + 1)
+    ]
+
+    return [
+        [bounds[i], bounds[i+1] - 1, 0]
+        for i in range(segments)
+        if bounds[i+1] > bounds[i]
+    ]
+
+class _PartialFile:
+    '''
+    A file being downloaded (<filepath>.part) and the state of its byte ranges (<filepath>.part.json), which allows the download to be resumed.
+    '''
+
+    def __init__(self, filepath, url, size, mtime):
+        self.path = filepath + '.part'
+        self.state_path = filepath + '.part.json'
+        self.lock = threading.Lock()
+        self.saved_at = 0
+
+        self.state = self._read()
+
+        # Resume only a download of the same
+        # version of the remote file
+        if (self.state is None or
+            self.state.get('url') != url or
+            self.state.get('size') != size or
+            self.state.get('mtime') != mtime or
+            not os.path.exists(self.path)):
+
+            self.state = {
+                'url': url,
+                'size': size,
+                'mtime': mtime,
+                'ranges': None,
+            }
+
+        self.fd = os.open(
+            self.path,
+            os.O_RDWR | os.O_CREAT
+        )
+
+    def _read(self):
+        try:
+            with open(self.state_path) as fp:
+                return json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, force=False):
+        # Written at most once a second, the
+        # state may lag behind the file, so a
+        # resume just downloads a bit again
+        now = time.monotonic()
+
+        if not force and now - self.saved_at < 1:
+            return
+
+        self.saved_at = now
+        tmp_path = self.state_path + '.tmp'
+
+        with open(tmp_path, 'w') as fp:
+            json.dump(self.state, fp)
+
+        os.replace(tmp_path, self.state_path)
+
+    def write(self, byte_range, chunk):
+        start, end, done = byte_range
+        chunk = chunk[:end - start + 1 - done]
+
+        os.pwrite(self.fd, chunk, start + done)
+
+        with self.lock:
+            byte_range[2] += len(chunk)
+            self.save()
+
+        return len(chunk)
+
+    def close(self):
+        os.close(self.fd)
+
+def _download_range(
+    url,
+    partial,
+    byte_range,
+    retries,
+    backoff,
+    timeout,
+    chunk_size):
+    '''
+    Download one byte range, resuming it after each failure.
+
+    Returns
+    -------
+    fetched: integer
+        Number of bytes downloaded
+    '''
+    fetched, attempt = 0, 0
+
+    with requests.Session() as session:
+        while byte_range[2] < byte_range[1] - byte_range[0] + 1:
+            start, end, done = byte_range
+
+            try:
+                with session.get(
+                    url,
+                    headers={'Range': 'bytes={0}-{1}'.format(
+                        start + done,
+                        end
+                    )},
+                    stream=True,
+                    timeout=timeout) as response:
+
+                    if response.status_code != 206:
+                        raise DownloadError((
+                            'Range request not honoured by the' +
+                            ' server (status {0})').format(
+                                response.status_code
+                        ))
+
+                    for chunk in response.iter_content(chunk_size):
+                        fetched += partial.write(byte_range, chunk)
+
+                        # Progress was made, so the
+                        # link is alive again
+                        attempt = 0
+
+                    if byte_range[2] < end - start + 1:
+                        raise DownloadError(
+                            'Connection closed before the end of the range'
+                        )
+
+            except (requests.RequestException, DownloadError, OSError) as exc:
+                attempt += 1
+
+                if attempt > retries:
+                    raise DownloadError((
+                        'Could not download bytes {0}-{1} of {2}' +
+                        ' after {3} retries: {4}').format(
+                            start + byte_range[2],
+                            end,
+                            url,
+                            retries,
+                            exc
+                    )) from exc
+
+                time.sleep(backoff * 2**(attempt - 1))
+
+    return fetched
+
+def _download_stream(
+    url,
+    filepath,
+    size,
+    retries,
+    backoff,
+    timeout,
+    chunk_size):
+    '''
+    Download url as a single stream, starting over after each failure. Used when the server does not accept byte ranges.
+
+    Returns
+    -------
+    fetched: integer
+        Number of bytes downloaded
+    '''
+    fetched = 0
+
+    for attempt in range(retries + 1):
+        written = 0
+
+        try:
+            with requests.get(
+                url,
+                stream=True,
+                timeout=timeout) as response:
+
+                response.raise_for_status()
+
+                with open(filepath, 'wb') as fh:
+                    for chunk in response.iter_content(chunk_size):
+                        fh.write(chunk)
+                        written += len(chunk)
+
+            fetched += written
+
+            if size is None or written == size:
+                return fetched
+
+            raise DownloadError((
+                'Got {0} of {1} bytes').format(
+                    written,
+                    size
+            ))
+
+        except (requests.RequestException, DownloadError, OSError) as exc:
+            fetched += written
+
+            if attempt == retries:
+                raise DownloadError((
+                    'Could not download {0} after {1} retries:' +
+                    ' {2}').format(
+                        url,
+                        retries,
+                        exc
+                )) from exc
+
+            time.sleep(backoff * 2**attempt)
+
+def download_file(
+    url,
+    filepath,
+    segments=4,
+    min_segment_size=8 * 2**20,
+    retries=5,
+    backoff=1.,
+    timeout=60,
+    chunk_size=2**20,
+    verbose=True,
+    info=None):
+    '''
+    Download url to filepath, resuming partial downloads.
+
+    The file is split in byte ranges downloaded in parallel into <filepath>.part, and the progress of each range is kept in <filepath>.part.json. A download interrupted (even by the end of the process) is resumed from where it stopped, as long as the remote file did not change. Each range is retried with exponential backoff. The file is moved to filepath only when its size matches the one told by the server, and gets the remote modification time (as wget -N does).
+
+    If filepath already exists with the remote size and modification time nothing is downloaded. Servers that do not accept byte ranges are downloaded in a single stream.
+
+    Parameters
+    ----------
+    url: string
+        File address
+    filepath: string
+        Local path of the file
+    segments: integer
+        Maximum number of ranges downloaded at the same time. The default value is 4.
+    min_segment_size: integer
+        Minimum size of each range, in bytes. The default value is 8 MB.
+    retries: integer
+        Consecutive failures allowed for each range before giving up. The default value is 5.
+    backoff: float
+        Seconds to wait before the first retry. It doubles at each new failure.
+    timeout: integer or float
+        Seconds to wait for the server
+    chunk_size: integer
+        Bytes read at a time
+    verbose: bool
+        If True the throughput is printed at the end. The bytes downloaded are also added to the current stage of ponto_utils.metrics.
+    info: tuple
+        Result of remote_file_info for url, when the caller already has it. If None the server is asked.
+
+    Returns
+    -------
+    filepath: string
+        Path of the downloaded file
+
+    Raises
+    ------
+    DownloadError
+        If the file could not be completely downloaded
+    '''
+    if info is None:
+        try:
+            info = remote_file_info(
+                url,
+                timeout
+            )
+        except requests.RequestException as exc:
+            raise DownloadError((
+                'Could not reach {0}: {1}').format(
+                    url,
+                    exc
+            )) from exc
+
+    size, ranges, mtime = info
+
+    if (os.path.exists(filepath) and
+        mtime is not None and
+        os.path.getsize(filepath) == size and
+        os.path.getmtime(filepath) == mtime):
+        return filepath
+
+    start = time.monotonic()
+
+    if ranges and size:
+        partial = _PartialFile(
+            filepath,
+            url,
+            size,
+            mtime
+        )
+
+        try:
+            if partial.state['ranges'] is None:
+                os.ftruncate(partial.fd, size)
+                partial.state['ranges'] = split_ranges(
+                    size,
+                    segments,
+                    min_segment_size
+                )
+                partial.save(force=True)
+
+            byte_ranges = partial.state['ranges']
+
+            with ThreadPoolExecutor(len(byte_ranges)) as executor:
+                fetched = sum(executor.map(
+                    lambda byte_range: _download_range(
+                        url,
+                        partial,
+                        byte_range,
+                        retries,
+                        backoff,
+                        timeout,
+                        chunk_size
+                    ),
+                    byte_ranges
+                ))
+        finally:
+            partial.save(force=True)
+            partial.close()
+
+        written = sum(
+            done for _, _, done in byte_ranges
+        )
+
+        if written != size or os.path.getsize(partial.path) != size:
+            raise DownloadError((
+                '{0} has {1} bytes instead of {2}').format(
+                    partial.path,
+                    written,
+                    size
+            ))
+
+        os.replace(partial.path, filepath)
+        os.remove(partial.state_path)
+    else:
+        fetched = _download_stream(
+            url,
+            filepath + '.part',
+            size,
+            retries,
+            backoff,
+            timeout,
+            chunk_size
+        )
+        os.replace(filepath + '.part', filepath)
+
+    if mtime is not None:
+        os.utime(filepath, (mtime, mtime))
+
+    # Bytes of this stage (see
+    # ponto_utils.metrics)
+    count(bytes=fetched)
+
+    if verbose:
+        seconds = max(time.monotonic() - start, 1e-6)
+        print((
+            '>>>> Downloaded {0}: {1:.1f} MB in {2:.1f} s' +
+            ' ({3:.1f} MB/s)').format(
+                os.path.basename(filepath),
+                fetched / 2**20,
+                seconds,
+                fetched / 2**20 / seconds
+        ))
+
+    return filepath
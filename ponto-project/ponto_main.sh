@@ -68,77 +68,96 @@ echo -e "\n\nStep: Data Download" |& tee \
 echo "-------------------" |& tee -a \
 "$LOGFILE"
 
-# Check if any data has been downloaded into
-# each above folders
-for name in ${DATATYPE[*]}; do
-    # Add DATATYPE_DIR as a shell environment
-    # variable, which is read by python
-    # scripts as the path to save data
-    export DATATYPE_DIR="$DATADIR/$name"
+if [ "$RUN_PARALLEL" = "yes" ] || [ -n "$BATCH_FILE" ]; then
+    # Run the download of all data sources at
+    # the same time. Data type folders that are
+    # not empty are skipped by the pipeline. A
+    # batch of regions is always run this way
+    echo -e ">> Searching for" \
+    "${DATATYPE[*]} data at the same time" |& \
+    tee -a "$LOGFILE"
+    echo -e ">> Please wait, it can take" \
+    "some minutes" |& tee -a \
+    "$LOGFILE"
+
+    DATATYPE="${DATATYPE[*]}" $PATH_PYTHON \
+    "$SCRIPTDIR/pipeline.py" |& tee -a \
+    "$LOGFILE"
+    echo -e "\n" |& tee -a \
+    "$LOGFILE"
+else
+    # Check if any data has been downloaded into
+    # each above folders
+    for name in ${DATATYPE[*]}; do
+        # Add DATATYPE_DIR as a shell environment
+        # variable, which is read by python
+        # scripts as the path to save data
+        export DATATYPE_DIR="$DATADIR/$name"
     
-    # Check if DATATYPE_DIR is empty
-    # The "| read" command prevent find
-    # function print the path evaluated on
-    # screen
-    if find "$DATATYPE_DIR" -maxdepth 0 \
-    -empty | read; then
+        # Check if DATATYPE_DIR is empty
+        # The "| read" command prevent find
+        # function print the path evaluated on
+        # screen
+        if find "$DATATYPE_DIR" -maxdepth 0 \
+        -empty | read; then
         
-        # Loop to run all download script
-        # on each subfolder of SCRIPTDIR
-        for script in "$SCRIPTDIR/$name/"download*; do
+            # Loop to run all download script
+            # on each subfolder of SCRIPTDIR
+            for script in "$SCRIPTDIR/$name/"download*; do
             
-            echo -e ">> Searching for" \
-            "$name data" |& tee -a \
-            "$LOGFILE"
-            echo -e ">> Please wait, it can take" \
-            "some minutes" |& tee -a \
-            "$LOGFILE"
+                echo -e ">> Searching for" \
+                "$name data" |& tee -a \
+                "$LOGFILE"
+                echo -e ">> Please wait, it can take" \
+                "some minutes" |& tee -a \
+                "$LOGFILE"
             
-            # Get script extension suffix to
-            # properly run it
-            ext="${script:(-2)}"
+                # Get script extension suffix to
+                # properly run it
+                ext="${script:(-2)}"
             
-            if [ "$ext" = "py" ]; then
-                $PATH_PYTHON $script |& \
-                tee -a "$LOGFILE"
-                echo -e "\n" |& tee -a \
-                "$LOGFILE"
+                if [ "$ext" = "py" ]; then
+                    $PATH_PYTHON $script |& \
+                    tee -a "$LOGFILE"
+                    echo -e "\n" |& tee -a \
+                    "$LOGFILE"
                 
-            elif [ "$ext" = "sh" ]; then
-                $script |& tee -a "$LOGFILE"
-                echo -e "\n" |& tee -a \
-                "$LOGFILE"
-            fi
-        done
+                elif [ "$ext" = "sh" ]; then
+                    $script |& tee -a "$LOGFILE"
+                    echo -e "\n" |& tee -a \
+                    "$LOGFILE"
+                fi
+            done
         
-        # Condition to test if process
-        # scripts exist in each SCRIPTDIR
-        # subfolder
-        # The "2>/dev/null" command prevent
-        # find function print an error
-        # message when do not exist a
-        # process script in that path
-        if find "$SCRIPTDIR/$name/"process*.py \
-        2>/dev/null | read; then
-            # Loop to run each process
-            # script individually if more
-            # than one exist
-            for script in "$SCRIPTDIR/$name/"process*; do
-                echo -e "\n>> Processing" \
-                "..." |& tee -a "$LOGFILE"
+            # Condition to test if process
+            # scripts exist in each SCRIPTDIR
+            # subfolder
+            # The "2>/dev/null" command prevent
+            # find function print an error
+            # message when do not exist a
+            # process script in that path
+            if find "$SCRIPTDIR/$name/"process*.py \
+            2>/dev/null | read; then
+                # Loop to run each process
+                # script individually if more
+                # than one exist
+                for script in "$SCRIPTDIR/$name/"process*; do
+                    echo -e "\n>> Processing" \
+                    "..." |& tee -a "$LOGFILE"
 
-                $PATH_PYTHON $script |& \
-                tee -a "$LOGFILE"
+                    $PATH_PYTHON $script |& \
+                    tee -a "$LOGFILE"
                 
-                echo -e "\n" |& tee -a \
-                "$LOGFILE"
-            done
+                    echo -e "\n" |& tee -a \
+                    "$LOGFILE"
+                done
+            fi
+        else
+            echo "Folder $DATATYPE_DIR is" \
+            "not empty" |& tee -a "$LOGFILE"
         fi
-    else
-        echo "Folder $DATATYPE_DIR is" \
-        "not empty" |& tee -a "$LOGFILE"
-    fi
-done
+    done
+fi
 
 conda deactivate
 